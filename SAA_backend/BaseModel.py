@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class CostData(BaseModel):
     small_facility_cf: float
@@ -50,6 +50,17 @@ class ParameterModel(BaseModel):
     graph_methods: List[str]
     max_attempts: int
     calculate_epoch: int
+    # 求解策略，见solve_policy.SolvePolicy.from_dict，例如 {"replication": {"MIPGap": 0.005, "MIPFocus": 1}, "adaptive_gap": true, "exact": {"TimeLimit": 6000},
+    # "backends": {"replication": "highs", "evaluation": "highs"}}
+    solve_policy: Optional[Dict[str, Any]] = None
+    # 序贯停止的gap容差（百分比），见solver_model.solver，None为求解全部MS个样本组
+    gap_tolerance: Optional[float] = None
+    # 序贯抽样选项，见sequential_saa.SampleSizeSchedule.from_dict，例如 {"initial_size": 4, "growth": 2, "max_size": 64}
+    sample_growth: Optional[Dict[str, Any]] = None
+    # 样本组筛选选项，见replication_screening.ReplicationScreening.from_dict，例如 {"top_k": 3, "rank": "quality", "audit": false, "quality_scenarios": 200}
+    screening: Optional[Dict[str, Any]] = None
+    # 启发式搜索选项，见first_stage_search.FirstStageSearch.from_dict，例如 {"chains": 4, "iterations": 5000, "pool_size": 3}
+    first_stage_search: Optional[Dict[str, Any]] = None
 
 # 创建 Pydantic 模型以确保所有数据都是可序列化的
 class SolverResult(BaseModel):
@@ -75,6 +75,7 @@ for IS, NS, MS, SS_SAA in IS_NS_MS_SS_SAA_combinations:
         LS=LS, 
         Food_index=Food_index, 
         Medicine_index=Medicine_index,
+        model_cache=MODEL_CACHE_DIR,
     )
     print(f"gurobi_opt的计算结果是: {gurobi_opt}")
     
@@ -132,7 +133,8 @@ for IS, NS, MS, SS_SAA in IS_NS_MS_SS_SAA_combinations:
                             Medicine_index=Medicine_index,
                             DATA_PROCESS_PARAMS=DATA_PROCESS_PARAMS, 
                             CLUSTER_PARAMS=CLUSTER_PARAMS, 
-                            GRAPH_CONFIG=GRAPH_CONFIG
+                            GRAPH_CONFIG=GRAPH_CONFIG,
+                            candidate_cache=CANDIDATE_CACHE_PATH
                         ) 
                     except Exception as e:
                         print(f"An error occurred while executing the solver with parameters: {e}")
\ No newline at end of file
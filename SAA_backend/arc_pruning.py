@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Arc pruning.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为运输弧预处理模块，删除不可能被使用的运输弧，并可按距离半径进一步稀疏化，模型中只为保留的弧创建q变量
+"""
+import logging
+import numpy as np
+from model_builder import transport_cost_tensor
+from recourse_evaluator import solve_recourse
+
+# 可用的裁剪方式
+ARC_PRUNING_METHODS = ('exact', 'radius')
+
+def build_arc_set(IS, AS, CH, PU, CT, H, method='exact', radius=None):
+    """
+    构建每种物资保留的运输弧集合。
+
+    参数:
+    IS: 城市数量。
+    AS: 资源种类的数量。
+    CH: 持有成本。
+    PU: 缺货惩罚成本。
+    CT: 运输成本。
+    H: 距离矩阵。
+    method: 'exact'只删除被支配的弧，最优值不变；'radius'在此基础上只保留距离不超过radius的弧，为近似方法。
+    radius: 'radius'方式下的距离半径。
+
+    返回:
+    元组 (arcs, report)。arcs为形状 (AS, IS, IS) 的布尔数组，report为包含总弧数、各步删除数与保留数的字典。
+
+    功能:
+    从i运一单位物资a到j，可使i处的剩余减少一单位、j处的缺货减少一单位，收益为 CH[a] + PU[a] - CT[a]*H[i,j]。
+    收益不为正的弧总存在不使用它的最优解，可直接删除（exact）。本地弧 (i, i) 的运输成本为0，始终保留。
+    """
+    if method not in ARC_PRUNING_METHODS:
+        raise ValueError(f'未知的运输弧裁剪方式: {method}')
+    CH = np.asarray(CH, dtype=float)
+    PU = np.asarray(PU, dtype=float)
+    H = np.asarray(H, dtype=float)[:IS, :IS]
+    TC = transport_cost_tensor(CT, H, IS)
+    local = np.broadcast_to(np.eye(IS, dtype=bool), (AS, IS, IS))
+
+    arcs = (TC < (CH + PU)[:, None, None]) | local
+    report = {'arcs': AS * IS * IS, 'dominated': int(AS * IS * IS - arcs.sum())}
+    if method == 'radius':
+        if radius is None:
+            raise ValueError('radius方式需要给定距离半径')
+        within = (H <= radius)[None, :, :] | local
+        report['radius'] = int((arcs & ~within).sum())
+        arcs = arcs & within
+    report['kept'] = int(arcs.sum())
+
+    message = f"Arc pruning ({method}): {report['arcs'] - report['kept']} of {report['arcs']} arcs removed, {report['kept']} kept"
+    print(message)
+    logging.info(message)
+    return arcs, report
+
+def arc_cost_deviation(IS, AS, NS, CH, PU, CT, H, D, pr, new_y, arcs):
+    """
+    计算库存new_y下裁剪运输弧前后期望第二阶段成本的差异，用于评估'radius'方式的近似误差。
+
+    参数:
+    IS, AS, NS, CH, PU, CT, H: 问题规模与成本参数。
+    D: 需求数据。
+    pr: 场景概率。
+    new_y: 库存决策，形状为 (AS, IS)。
+    arcs: 保留的运输弧。
+
+    返回:
+    元组 (deviation, relative)，deviation为裁剪后减去裁剪前的期望第二阶段成本（不小于0），relative为其相对值。
+    """
+    pr = np.asarray(pr, dtype=float)[:NS]
+    full = solve_recourse(IS, AS, NS, CH, PU, CT, H, D, new_y)
+    pruned = solve_recourse(IS, AS, NS, CH, PU, CT, H, D, new_y, arcs)
+    full_cost = pr @ (full['tc'] + full['hc'] + full['wc'])
+    pruned_cost = pr @ (pruned['tc'] + pruned['hc'] + pruned['wc'])
+    deviation = float(pruned_cost - full_cost)
+    return deviation, deviation / full_cost if full_cost else 0.0
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Benchmark.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为性能测试模块，使用随机生成的算例统计各环节耗时，请勿在路由中直接调用
+"""
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from gurobipy import GurobiError, Model, GRB
+from config import AS, LS, Food_index, Medicine_index
+from data_generator import generate_distance_matrix, generate_population, calculate_affected_population
+from model_builder import build_saa_form, SAAGurobiModel, FORMULATIONS
+from warm_start import WarmStartEngine, IncumbentTimer
+from solver_backend import create_model, SOLVER_BACKENDS
+from env_pool import env_pool
+from sample_method import stratified_random_sampling
+from plugins import demand_to_scenarios, DEMAND_INDEX
+
+# 与参考数据一致的设施与物资成本
+FACILITY_COST = {'CF': [19600, 188400, 300000], 'U': [36400, 408200, 780000]}
+RESOURCE_COST = {
+    'V': [144.6, 83.33, 1.16],
+    'CP': [647.7, 5420, 140],
+    'CT': [0.3, 0.04, 0.00058],
+    'CH': [129.54, 1084, 28],
+    'PU': [6477, 54200, 1400],
+}
+
+# 默认测试规模 (IS, NS, SS)
+BENCHMARK_SIZES = [
+    (20, 100, 10),
+    (20, 500, 25),
+    (40, 100, 10),
+    (40, 500, 25),
+]
+
+# Gurobi日志默认写入临时目录，不在运行目录中留下日志文件
+BENCHMARK_LOG = os.path.join(tempfile.gettempdir(), 'saa_benchmark.log')
+
+# 数据处理测试规模 (IS, NS)
+DATA_PATH_SIZES = [
+    (20, 1000),
+    (100, 10000),
+    (500, 100000),
+]
+
+def generate_instance(IS, NS, seed=0):
+    """
+    随机生成一个与read_data_from_redis返回格式相同的算例。
+
+    参数:
+    IS: 城市数量。
+    NS: 场景数量。
+    seed: 随机种子。
+
+    返回:
+    CF, U, H, V, CP, CH, PU, CT, D, pr, demand
+    """
+    np.random.seed(seed)
+    H = generate_distance_matrix(IS, 100, 3000)
+    population = generate_population(IS, 10000, 50000)
+    demand_raw = calculate_affected_population(IS, NS, population, H, realistic=True)
+
+    # 与read_data_from_redis相同的数据处理
+    pr = np.full(NS, 1/NS)
+    demand = np.rint(demand_raw * DEMAND_INDEX)
+    D = demand_to_scenarios(demand_raw, AS, Food_index, Medicine_index)
+
+    return (FACILITY_COST['CF'], FACILITY_COST['U'], H, RESOURCE_COST['V'], RESOURCE_COST['CP'],
+            RESOURCE_COST['CH'], RESOURCE_COST['PU'], RESOURCE_COST['CT'], D, pr, demand)
+
+def build_baseline_model(name, IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y=None):
+    """
+    按矩阵组装之前的方式（逐条addConstrs生成器表达式）构建模型，仅作为benchmark_model_build的对照。
+
+    参数:
+    name: 模型名称。
+    fixed_y: 给定时构建renew模型，第一阶段决策固定为该值，否则构建getsol或two_stage_sp_model的模型。
+    其余参数同build_saa_form。
+
+    返回:
+    已调用update()的gurobipy.Model对象，由调用者释放。
+    """
+    m = Model(name, env=env_pool().get())
+    IS, AS, LS, SS = range(IS), range(AS), range(LS), range(SS)
+    q = m.addVars(SS, AS, IS, IS, vtype=GRB.INTEGER, name="q")
+    z = m.addVars(SS, AS, IS, vtype=GRB.INTEGER, name="z")
+    w = m.addVars(SS, AS, IS, vtype=GRB.INTEGER, name="w")
+    hc = m.addVars(SS, vtype=GRB.CONTINUOUS, name="hc")
+    tc = m.addVars(SS, vtype=GRB.CONTINUOUS, name="tc")
+    wc = m.addVars(SS, vtype=GRB.CONTINUOUS, name="wc")
+    f = m.addVar(vtype=GRB.CONTINUOUS, name='f')
+    m.addConstrs((q[s, a, i, j] >= 0 for s in SS for a in AS for i in IS for j in IS), "q non-negative")
+    m.addConstrs((z[s, a, i] >= 0 for s in SS for a in AS for i in IS), "z non-negative")
+    m.addConstrs((w[s, a, j] >= 0 for s in SS for a in AS for j in IS), "w non-negative")
+    m.addConstr((f >= 0), "f non-negative")
+    m.addConstrs((hc[s] >= 0 for s in SS), "hc non-negative")
+    m.addConstrs((tc[s] >= 0 for s in SS), "tc non-negative")
+    m.addConstrs((wc[s] >= 0 for s in SS), "wc non-negative")
+
+    if fixed_y is None:
+        x = m.addVars(IS, LS, vtype=GRB.BINARY, name="x")
+        y = m.addVars(AS, IS, vtype=GRB.INTEGER, name="y")
+        fc = m.addVar(vtype=GRB.CONTINUOUS, name='fc')
+        pc = m.addVar(vtype=GRB.CONTINUOUS, name='pc')
+        m.addConstrs((y[a, i] >= 0 for a in AS for i in IS), "y non-negative")
+        m.addConstr((fc >= 0), "fc non-negative")
+        m.addConstr((pc >= 0), "pc non-negative")
+        m.addConstrs((sum(y[a, i] * V[a] for a in AS) <= sum(x[i, l] * U[l] for l in LS) for i in IS), "Constraint (2)")
+        m.addConstrs((sum(x[i, l] for l in LS) <= 1 for i in IS), "Constraint (5)")
+    else:
+        y = fixed_y
+    m.addConstrs((z[s, a, i] == y[a, i] - sum(q[s, a, i, j] for j in IS) for a in AS for i in IS for s in SS), "Constraint (3)")
+    m.addConstrs((w[s, a, j] == D[s, a, j] - sum(q[s, a, i, j] for i in IS) for a in AS for j in IS for s in SS), "Constraint (4)")
+    m.addConstrs((wc[s] == sum(PU[a] * w[s, a, j] for a in AS for j in IS) for s in SS), "Shortage Costs")
+    m.addConstrs((hc[s] == sum(CH[a] * z[s, a, i] for a in AS for i in IS) for s in SS), "Surplus Costs")
+    m.addConstrs((tc[s] == sum(CT[a] * H[i, j] * q[s, a, i, j] for a in AS for i in IS for j in IS) for s in SS), "Transportation Costs")
+
+    expected = sum(pr[s] * (tc[s] + hc[s] + wc[s]) for s in SS)
+    if fixed_y is None:
+        m.addConstr((fc == sum(CF[l] * x[i, l] for i in IS for l in LS)), "Fixed Facility Costs")
+        m.addConstr((pc == sum(CP[a] * y[a, i] for a in AS for i in IS)), "Procurement Costs")
+        m.addConstr((f == fc + pc + expected), "Objective Function")
+    else:
+        m.addConstr((f == expected), "Objective Function")
+    m.setObjective(f, GRB.MINIMIZE)
+    m.update()
+    return m
+
+def benchmark_model_build(sizes=BENCHMARK_SIZES, seed=0):
+    """
+    统计getsol、renew与two_stage_sp_model三类模型在不同规模下的构建耗时，并在同一算例上与逐条添加约束的原构建方式（build_baseline_model）对比。
+
+    参数:
+    sizes: (IS, NS, SS) 组合列表。
+    seed: 随机种子。
+
+    返回:
+    DataFrame，每行包含模型名称、规模、变量数、约束数、矩阵组装耗时、Gurobi加载耗时、原构建方式耗时与加速比（原构建耗时 / 构建耗时）。
+    """
+    records = []
+    for IS, NS, SS in sizes:
+        CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+        y_fixed = np.ones((AS, IS))
+        for name, scenarios, fixed_y in (('getsol', SS, None), ('renew', NS, y_fixed), ('two-stage_SP', NS, None)):
+            D_used = D[:scenarios]
+            pr_used = np.ones(scenarios) / scenarios
+
+            tic = time.perf_counter()
+            form = build_saa_form(IS, AS, LS, scenarios, CF, U, V, H, CP, CH, PU, CT, D_used, pr_used, fixed_y=fixed_y)
+            assemble_time = time.perf_counter() - tic
+
+            tic = time.perf_counter()
+            handle = SAAGurobiModel(form, name, env_pool().get())
+            handle.model.update()
+            load_time = time.perf_counter() - tic
+
+            handle.model.dispose()
+
+            tic = time.perf_counter()
+            baseline = build_baseline_model(name, IS, AS, LS, scenarios, CF, U, V, H, CP, CH, PU, CT, D_used, pr_used, fixed_y)
+            baseline_time = time.perf_counter() - tic
+            baseline.dispose()
+
+            build_time = assemble_time + load_time
+            records.append([name, IS, NS, SS, scenarios, form.n_cols, form.n_rows, form.A.nnz,
+                            assemble_time, load_time, build_time, baseline_time, baseline_time / build_time])
+
+    return pd.DataFrame(records, columns=['model', 'IS', 'NS', 'SS', 'scenarios', 'vars', 'constrs', 'nonzeros',
+                                          'assemble_time', 'load_time', 'build_time', 'baseline_time', 'speedup'])
+
+def benchmark_formulation(sizes=BENCHMARK_SIZES, formulations=FORMULATIONS, seed=0):
+    """
+    比较原模型与精简模型的规模与Gurobi预处理耗时。
+
+    参数:
+    sizes: (IS, NS, SS) 组合列表。
+    formulations: 参与比较的模型形式。
+    seed: 随机种子。
+
+    返回:
+    DataFrame，每行包含模型名称、模型形式、规模、变量数、约束数、非零元数、构建耗时与预处理耗时。
+    """
+    records = []
+    for IS, NS, SS in sizes:
+        CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+        y_fixed = np.ones((AS, IS))
+        for name, scenarios, fixed_y in (('getsol', SS, None), ('renew', NS, y_fixed), ('two-stage_SP', NS, None)):
+            D_used = D[:scenarios]
+            pr_used = np.ones(scenarios) / scenarios
+            for formulation in formulations:
+                tic = time.perf_counter()
+                form = build_saa_form(IS, AS, LS, scenarios, CF, U, V, H, CP, CH, PU, CT, D_used, pr_used, fixed_y=fixed_y, formulation=formulation)
+                handle = SAAGurobiModel(form, name, env_pool().get())
+                handle.model.update()
+                build_time = time.perf_counter() - tic
+
+                handle.model.setParam('OutputFlag', 0)
+                tic = time.perf_counter()
+                handle.model.presolve().dispose()
+                presolve_time = time.perf_counter() - tic
+
+                records.append([name, formulation, IS, NS, SS, scenarios, form.n_cols, form.n_rows, form.A.nnz,
+                                build_time, presolve_time])
+                handle.model.dispose()
+
+    return pd.DataFrame(records, columns=['model', 'formulation', 'IS', 'NS', 'SS', 'scenarios', 'vars', 'constrs', 'nonzeros',
+                                          'build_time', 'presolve_time'])
+
+def benchmark_warm_start(sizes=BENCHMARK_SIZES, replications=5, sources=('ev', 'incumbent'), seed=0, log_filename=BENCHMARK_LOG):
+    """
+    比较getsol在有无初始解时找到第一个可行解的时间与总求解时间。
+
+    参数:
+    sizes: (IS, NS, SS) 组合列表。
+    replications: 每个规模求解的样本组数量。
+    sources: 初始解来源。
+    seed: 随机种子。
+    log_filename: Gurobi日志文件路径，默认为临时目录下的BENCHMARK_LOG。
+
+    返回:
+    DataFrame，每行为一个规模与一种设置下各样本组的平均首个可行解时间与平均求解时间。
+    """
+    records = []
+    for IS, NS, SS in sizes:
+        CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+        samples = [np.random.choice(NS, SS, replace=False) for _ in range(replications)]
+        pr_sample = np.ones(SS) / SS
+
+        for mode in ('cold', 'warm'):
+            engine = None
+            if mode == 'warm':
+                engine = WarmStartEngine(sources, IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, store_path=None)
+            first_incumbent, runtime, objective = [], [], []
+            for sample in samples:
+                form = build_saa_form(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D[sample], pr_sample)
+                handle = SAAGurobiModel(form, "getsol", env_pool().get(log_filename))
+                handle.model.setParam('OutputFlag', 0)
+                timer = IncumbentTimer()
+                if engine is not None:
+                    engine.apply(handle)
+                handle.optimize(callback=timer)
+                if engine is not None:
+                    engine.record(handle.values('x'), handle.values('y'), handle.model.ObjVal, timer, handle.model.Runtime)
+                first_incumbent.append(timer.first_incumbent)
+                runtime.append(handle.model.Runtime)
+                objective.append(handle.model.ObjVal)
+                handle.model.dispose()
+
+            records.append([mode, IS, NS, SS, replications, np.mean(first_incumbent), np.mean(runtime), np.mean(objective)])
+
+    return pd.DataFrame(records, columns=['mode', 'IS', 'NS', 'SS', 'replications', 'first_incumbent_time', 'solve_time', 'objective'])
+
+def benchmark_backends(sizes=BENCHMARK_SIZES, backends=SOLVER_BACKENDS, formulation='lean', seed=0, log_filename=BENCHMARK_LOG):
+    """
+    比较各求解器后端求解getsol与renew模型的耗时与目标值。
+
+    参数:
+    sizes: (IS, NS, SS) 组合列表。
+    backends: 参与比较的求解器后端。
+    formulation: 模型形式。
+    seed: 随机种子。
+    log_filename: Gurobi日志文件路径，默认为临时目录下的BENCHMARK_LOG。
+
+    返回:
+    DataFrame，每行包含模型名称、后端、规模、求解耗时、目标值与求解状态。
+    """
+    records = []
+    for IS, NS, SS in sizes:
+        CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+        y_fixed = np.ceil(D.mean(axis=0))
+        for name, scenarios, fixed_y in (('getsol', SS, None), ('renew', NS, y_fixed)):
+            D_used = D[:scenarios]
+            pr_used = np.ones(scenarios) / scenarios
+            form = build_saa_form(IS, AS, LS, scenarios, CF, U, V, H, CP, CH, PU, CT, D_used, pr_used, fixed_y=fixed_y, formulation=formulation)
+            for backend in backends:
+                handle = create_model(form, name, backend, env_pool().get(log_filename) if backend == 'gurobi' else None)
+                m = handle.model
+                m.setParam('OutputFlag', 0)
+                tic = time.perf_counter()
+                try:
+                    handle.optimize()
+                    status = m.status
+                except GurobiError as e:
+                    # 例如受规模限制的许可证无法求解较大的模型
+                    print('Error code ' + str(e.errno) + ": " + str(e))
+                    status = f'error {e.errno}'
+                solve_time = time.perf_counter() - tic
+                objective = m.ObjVal if m.SolCount > 0 else np.nan
+                records.append([name, backend, IS, NS, SS, scenarios, solve_time, objective, status])
+                m.dispose()
+
+    return pd.DataFrame(records, columns=['model', 'backend', 'IS', 'NS', 'SS', 'scenarios', 'solve_time', 'objective', 'status'])
+
+def baseline_stratified_random_sampling(demand, cluster_labels, cluster_num, IS):
+    """
+    向量化之前的分层随机抽样（逐个场景、逐个城市复制需求并计算标准差），仅作为benchmark_data_path的对照。
+
+    参数与返回同sample_method.stratified_random_sampling，固定随机种子时抽样索引应与其相同。
+    """
+    sample = []
+
+    standard = np.zeros((cluster_num, 1))
+    temp_num = np.zeros((cluster_num, 1))
+    for i in np.unique(cluster_labels):
+        cluster_each = np.argwhere(cluster_labels == i)
+        cluster_each = cluster_each.reshape(1, -1).squeeze(0).tolist()
+        demand_sample = np.zeros((len(cluster_each), IS))
+        for s in range(len(cluster_each)):
+            for j in range(IS):
+                demand_sample[s, j] = demand[int(cluster_each[s]), j]
+        mean_sample = np.mean(demand_sample, axis=0)
+        standard[i] = np.sqrt(sum(sum(np.square(demand_sample - mean_sample.T))) / len(cluster_each))
+        temp_num[i] = standard[i] * len(cluster_each)
+
+    for i in np.unique(cluster_labels):
+        cluster_each = np.argwhere(cluster_labels == i)
+        cluster_each = cluster_each.reshape(1, -1).squeeze(0).tolist()
+        pick_num = np.rint(cluster_num * len(cluster_each) * standard[i] / sum(temp_num))
+        pick_num = pick_num.astype(np.int32)[0]
+
+        if pick_num == 0:
+            continue
+        elif pick_num == 1:
+            temp = np.random.choice(len(cluster_each), 1, replace=False)
+            sample.append(cluster_each[temp[0]])
+        else:
+            temp = np.random.choice(len(cluster_each), pick_num, replace=False)
+            for j in range(pick_num):
+                sample.append(cluster_each[temp[j]])
+    return sample, "Stratified"
+
+def baseline_gather_sample(D, demand, sample, AS, IS):
+    """
+    向量化之前solver中逐元素取出样本需求的方式，仅作为benchmark_data_path的对照。
+
+    返回:
+    D_sample: 样本场景的需求，形状为(SS, AS, IS)。
+    sum_sample: 各城市样本需求之和，形状为(IS,)。
+    """
+    SS = len(sample)
+    D_sample = np.zeros((SS, AS, IS))
+    for s in range(SS):
+        for a in range(AS):
+            for j in range(IS):
+                D_sample[s, a, j] = D[sample[s], a, j]
+
+    demand_sample = np.zeros((SS, IS))
+    for s in range(SS):
+        for j in range(IS):
+            demand_sample[s, j] = demand[sample[s], j]
+    sum_sample = np.zeros(IS)
+    for j in range(IS):
+        sum_sample[j] = sum(demand_sample)[j]
+    return D_sample, sum_sample
+
+def benchmark_data_path(sizes=DATA_PATH_SIZES, MS=10, clusters=20, seed=0, baseline_limit=1000000):
+    """
+    统计solver中样本数据处理各环节的耗时：分层抽样、按抽样索引取出样本需求D_sample与各城市样本需求之和，
+    并在同一数据与随机种子下与向量化之前的逐元素实现对比，同时检查两者的抽样索引与样本需求完全相同。
+    不求解模型，可测试较大的IS与NS。
+
+    参数:
+    sizes: (IS, NS) 组合列表，NS=100000、IS=500时需求数据D约占1.2GB内存。
+    MS: 样本组数量。
+    clusters: 聚类数量，聚类标签随机生成。
+    seed: 随机种子。
+    baseline_limit: IS*NS不超过该值时才运行原实现，原实现按元素循环，更大规模下耗时过长，对应的列记为NaN。
+
+    返回:
+    DataFrame，每行包含规模、平均样本数量、各环节在MS个样本组上的总耗时、原实现的总耗时与加速比（原实现耗时 / 总耗时）。
+    """
+    records = []
+    for IS, NS in sizes:
+        rng = np.random.default_rng(seed)
+        demand_raw = rng.gamma(2.0, 5000.0, size=(NS, IS))
+        demand = np.rint(demand_raw * DEMAND_INDEX)
+        D = demand_to_scenarios(demand_raw, AS, Food_index, Medicine_index)
+        cluster_labels = rng.integers(0, clusters, NS)
+        cluster_num = len(np.unique(cluster_labels))
+
+        np.random.seed(seed)
+        samples = []
+        sum_sample = np.zeros((MS, IS))
+        sample_time = gather_time = 0.0
+        for m in range(MS):
+            tic = time.perf_counter()
+            sample, _ = stratified_random_sampling(demand, cluster_labels, cluster_num, IS)
+            sample_time += time.perf_counter() - tic
+
+            tic = time.perf_counter()
+            D_sample = D[sample]
+            sum_sample[m] = demand[sample, :IS].sum(axis=0)
+            gather_time += time.perf_counter() - tic
+            samples.append(sample)
+
+        total_time = sample_time + gather_time
+        baseline_time = np.nan
+        if IS * NS <= baseline_limit:
+            np.random.seed(seed)
+            baseline_time = 0.0
+            for m in range(MS):
+                tic = time.perf_counter()
+                sample, _ = baseline_stratified_random_sampling(demand, cluster_labels, cluster_num, IS)
+                D_baseline, sum_baseline = baseline_gather_sample(D, demand, sample, AS, IS)
+                baseline_time += time.perf_counter() - tic
+                assert sample == samples[m], f'IS={IS}, NS={NS}: 第{m}个样本组的抽样索引与原实现不同'
+                assert np.array_equal(D_baseline, D[samples[m]]) and np.array_equal(sum_baseline, sum_sample[m]), \
+                    f'IS={IS}, NS={NS}: 第{m}个样本组的样本需求与原实现不同'
+
+        records.append([IS, NS, MS, np.mean([len(sample) for sample in samples]), sample_time, gather_time, total_time,
+                        baseline_time, baseline_time / total_time])
+        del D
+
+    return pd.DataFrame(records, columns=['IS', 'NS', 'MS', 'SS', 'sample_time', 'gather_time', 'total_time',
+                                          'baseline_time', 'speedup'])
+
+if __name__ == "__main__":
+    pd.set_option('display.width', 200)
+    print(benchmark_model_build())
+    print(benchmark_formulation())
+    print(benchmark_warm_start())
+    print(benchmark_backends())
+    print(benchmark_data_path())
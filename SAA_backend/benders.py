@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Benders.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为两阶段随机规划的L-shaped(Benders)分解求解模块，主问题只包含第一阶段变量x、y，各场景的运输问题作为子问题返回最优性割
+"""
+import time
+import logging
+import numpy as np
+import gurobipy as gp
+from gurobipy import Model, GRB, GurobiError
+from plugins import read_data_from_redis, save_and_print_results
+from model_builder import transport_cost_tensor
+from solve_policy import SolvePolicy, has_solution
+from env_pool import env_pool
+
+# 可用的割类型
+BENDERS_CUT_TYPES = ('multi', 'single')
+
+class RecourseSubproblem:
+    """
+    功能: 单个场景的第二阶段线性规划，库存y与需求D均为右端项。模型只构建一次，之后每次求解只更新右端项。
+    方法:
+    solve(y, D_s): 求解一个场景，返回第二阶段成本与对偶值。
+    """
+    def __init__(self, IS, AS, CH, PU, CT, H, env=None):
+        CH = np.asarray(CH, dtype=float)
+        PU = np.asarray(PU, dtype=float)
+        TC = transport_cost_tensor(CT, H, IS)
+
+        self.model = Model("recourse", env=env) if env is not None else Model("recourse")
+        self.model.setParam('OutputFlag', 0)
+        q = self.model.addMVar((AS, IS, IS), obj=TC, name='q')
+        z = self.model.addMVar((AS, IS), obj=np.repeat(CH[:, None], IS, axis=1), name='z')
+        w = self.model.addMVar((AS, IS), obj=np.repeat(PU[:, None], IS, axis=1), name='w')
+        # z[a,i] = y[a,i] - sum(q[a,i,j] for j)，w[a,j] = D[a,j] - sum(q[a,i,j] for i)
+        self.supply = self.model.addConstr(q.sum(axis=2) + z == np.zeros((AS, IS)), name='Constraint (3)')
+        self.demand = self.model.addConstr(q.sum(axis=1) + w == np.zeros((AS, IS)), name='Constraint (4)')
+        self.model.ModelSense = GRB.MINIMIZE
+
+    def solve(self, y, D_s):
+        """
+        参数:
+        y: 库存，形状为 (AS, IS)，可以是分数值。
+        D_s: 该场景的需求，形状为 (AS, IS)。
+
+        返回:
+        元组 (cost, u, v)，u、v分别为Constraint (3)与Constraint (4)的对偶值，
+        对任意y均有 Q_s(y) >= sum(u * y) + sum(v * D_s)，且在当前y处取等号。
+        """
+        self.supply.RHS = y
+        self.demand.RHS = D_s
+        self.model.optimize()
+        if self.model.status != GRB.OPTIMAL:
+            raise GurobiError(self.model.status, 'Recourse subproblem is not solved to optimality')
+        return self.model.ObjVal, self.supply.Pi, self.demand.Pi
+
+class BendersSolver:
+    """
+    功能: 以分支切割方式实现的L-shaped方法。主问题为x、y与场景成本估计theta上的混合整数规划，
+          求解前先在主问题的线性松弛上加割，之后Gurobi每找到一个整数解就求解全部场景子问题并以惰性约束加入被违反的最优性割，
+          根节点的分数解上同时加入用户割。
+          'multi'为每个场景一个theta与一条割，'single'为所有场景按概率汇总为一条割，割的数量与NS无关，内存占用有界。
+    方法:
+    solve(): 求解并返回 (Vf, Vx, Vy)。
+    dispose(): 释放主问题与子问题模型。
+    """
+    def __init__(self, IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, cut_type='multi', log_filename=None, lp_cut_rounds=200, root_cut_rounds=20, tol=1e-6):
+        if cut_type not in BENDERS_CUT_TYPES:
+            raise ValueError(f'未知的Benders割类型: {cut_type}')
+        self.IS, self.AS, self.LS, self.NS = IS, AS, LS, NS
+        self.D = np.asarray(D, dtype=float)[:NS]
+        self.pr = np.asarray(pr, dtype=float)[:NS]
+        self.cut_type = cut_type
+        self.lp_cut_rounds = lp_cut_rounds
+        self.root_cut_rounds = root_cut_rounds
+        self.tol = tol
+        # 主问题与子问题均在共享的Gurobi环境上创建，LogFile已在主问题的环境中设置
+        tic = time.perf_counter()
+        self.subproblem = RecourseSubproblem(IS, AS, CH, PU, CT, H, env_pool().get())
+
+        CF, U, V, CP = (np.asarray(p, dtype=float) for p in (CF, U, V, CP))
+        n_theta = NS if cut_type == 'multi' else 1
+        self.weights = self.pr if cut_type == 'multi' else np.ones(1)
+
+        self.master = Model("benders_master", env=env_pool().get(log_filename))
+        self.x = self.master.addMVar((IS, LS), vtype=GRB.BINARY, name='x')
+        self.y = self.master.addMVar((AS, IS), vtype=GRB.INTEGER, name='y')
+        self.theta = self.master.addMVar(n_theta, name='theta')
+        self.master.setObjective((self.x * CF[None, :]).sum() + (self.y * CP[:, None]).sum() + self.weights @ self.theta, GRB.MINIMIZE)
+        self.master.addConstr(V @ self.y <= self.x @ U, name='Constraint (2)')
+        self.master.addConstr(self.x.sum(axis=1) <= 1, name='Constraint (5)')
+        self.master.setParam('LazyConstraints', 1)
+        self.master.setParam('PreCrush', 1)
+
+        self._y_vars = self.y.tolist()
+        self._y_vars = [v for row in self._y_vars for v in row]
+        self._theta_vars = self.theta.tolist()
+        self.root_rounds = 0
+        self.n_cuts = 0
+        self.n_evaluations = 0
+        env_pool().record('exact', time.perf_counter() - tic)
+
+    def dispose(self):
+        self.subproblem.model.dispose()
+        self.master.dispose()
+
+    def _evaluate(self, y):
+        """
+        在库存y下求解全部场景子问题，返回各场景成本、割的斜率与常数项。
+        """
+        costs = np.zeros(self.NS)
+        slopes = np.zeros((self.NS, self.AS * self.IS))
+        constants = np.zeros(self.NS)
+        for s in range(self.NS):
+            costs[s], u, v = self.subproblem.solve(y, self.D[s])
+            slopes[s] = u.ravel()
+            constants[s] = np.sum(v * self.D[s])
+        self.n_evaluations += 1
+        return costs, slopes, constants
+
+    def _cuts(self, y, theta):
+        """
+        生成在 (y, theta) 处被违反的割，返回 (theta下标, 斜率, 常数项) 列表。
+        """
+        costs, slopes, constants = self._evaluate(y)
+        if self.cut_type == 'single':
+            costs = np.array([self.pr @ costs])
+            slopes = self.pr[None, :] @ slopes
+            constants = np.array([self.pr @ constants])
+        violated = costs > theta + self.tol * np.maximum(1.0, np.abs(costs))
+        return [(k, slopes[k], constants[k]) for k in np.flatnonzero(violated)]
+
+    def _callback(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            y = np.asarray(model.cbGetSolution(self._y_vars)).reshape(self.AS, self.IS)
+            theta = np.asarray(model.cbGetSolution(self._theta_vars))
+            for k, slope, constant in self._cuts(y, theta):
+                model.cbLazy(self._theta_vars[k] - gp.LinExpr(slope.tolist(), self._y_vars) >= constant)
+                self.n_cuts += 1
+
+        elif where == GRB.Callback.MIPNODE and self.root_rounds < self.root_cut_rounds:
+            if model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL or model.cbGet(GRB.Callback.MIPNODE_NODCNT) > 0:
+                return
+            self.root_rounds += 1
+            y = np.asarray(model.cbGetNodeRel(self._y_vars)).reshape(self.AS, self.IS)
+            theta = np.asarray(model.cbGetNodeRel(self._theta_vars))
+            for k, slope, constant in self._cuts(np.maximum(y, 0), theta):
+                model.cbCut(self._theta_vars[k] - gp.LinExpr(slope.tolist(), self._y_vars) >= constant)
+                self.n_cuts += 1
+
+    def _relaxation_cuts(self):
+        """
+        先在主问题的线性松弛上反复求解并加割，直到松弛解不再违反任何割或达到lp_cut_rounds轮，
+        这些割作为普通约束保留在主问题中，使分支定界开始时的下界与完整模型的线性松弛相当。
+        """
+        self.x.VType = GRB.CONTINUOUS
+        self.y.VType = GRB.CONTINUOUS
+        output_flag = self.master.Params.OutputFlag
+        self.master.setParam('OutputFlag', 0)
+        y = np.zeros((self.AS, self.IS))
+        theta = np.zeros(len(self._theta_vars))
+        for _ in range(self.lp_cut_rounds):
+            cuts = self._cuts(y, theta)
+            if not cuts:
+                break
+            for k, slope, constant in cuts:
+                self.master.addConstr(self._theta_vars[k] - gp.LinExpr(slope.tolist(), self._y_vars) >= constant)
+                self.n_cuts += 1
+            self.master.optimize()
+            y, theta = np.maximum(self.y.X, 0), self.theta.X
+        self.master.setParam('OutputFlag', output_flag)
+        self.x.VType = GRB.BINARY
+        self.y.VType = GRB.INTEGER
+
+    def solve(self):
+        """
+        返回:
+        元组 (Vf, Vx, Vy)，求解失败时返回None。
+        """
+        self._relaxation_cuts()
+        self.master.optimize(self._callback)
+        print(f'Benders ({self.cut_type}-cut): {self.n_cuts} cuts, {self.n_evaluations} subproblem rounds')
+        if self.master.SolCount == 0:
+            return None
+        return self.master.ObjVal, np.round(self.x.X), np.round(self.y.X)
+
+def benders_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index, cut_type='multi', policy=None):
+    """
+    使用L-shaped分解求解两阶段随机规划模型的精确解，参数与返回值同two_stage_sp_model。
+
+    参数:
+    cut_type: 'multi'为多割，'single'为单割，场景数量很大时单割的主问题规模与内存占用不随NS增长。
+    policy: SolvePolicy对象，按其'exact'阶段设置主问题的求解参数。
+    其余参数同two_stage_sp_model。
+
+    返回:
+    返回一个元组，包括精确解最优解、花费的时间、决策变量Vx和Vy。
+    """
+    # 配置日志以追加模式
+    logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s')
+    method = f'gurobi_Benders_{cut_type}'
+    policy = policy or SolvePolicy()
+    attempt = 0
+    tic = time.perf_counter()
+    env_pool().reset_stats()
+    while attempt < max_attempts:
+        benders = None
+        try:
+            print('define parameters ...\n')
+            CF, U, H, V, CP, CH, PU, CT, D, pr, demand = read_data_from_redis(IS_init, NS_init, AS_init, Food_index, Medicine_index)
+
+            print('define model ...\n')
+            benders = BendersSolver(IS_init, AS_init, LS_init, NS_init, CF, U, V, H, CP, CH, PU, CT, D, pr, cut_type, log_filename)
+            m = benders.master
+            policy.apply(m, 'exact')
+
+            print('solving ...\n')
+            result = benders.solve()
+
+            if has_solution(m) and result is not None:
+                Vf, Vx, Vy = result
+
+                toc = time.perf_counter()
+                elapsed_time = toc - tic
+
+                save_and_print_results(method, Output_file, Vx, Vy, IS_init, NS_init, 0, 0, Vf, elapsed_time, 0, 0)
+                # 打印结果
+                print(f"Method: {method}")
+                print(f"I: {IS_init}, S: {NS_init}")
+                print(f"Costs: {float(Vf)}, gap: 0 %")
+                print(f"Elapsed time: {elapsed_time} seconds.")
+                print(f"Solve policy: {policy.describe()}, MIP gap: {m.MIPGap}")
+                # 记录结果
+                logging.info('--------------------------------------------')
+                logging.info(f"Method: {method}")
+                logging.info(f"I: {IS_init}, S: {NS_init}")
+                logging.info(f"Costs: {float(Vf)}, gap: 0 %")
+                logging.info(f"Elapsed time: {elapsed_time} seconds.")
+                logging.info(f"Solve policy: {policy.describe()}, MIP gap: {m.MIPGap}")
+                env_pool().report()
+                logging.info('--------------------------------------------')
+
+                return Vf, elapsed_time, Vx, Vy.T
+
+            else:
+                print('Hmm, something went wrong! Status code:', m.status)
+                attempt += 1
+
+        except GurobiError as e:
+            print('Error code ' + str(e.errno) + ": " + str(e))
+            logging.error('Error code ' + str(e.errno) + ": " + str(e))
+            print('Encountered a Gurobi error. Please check the Gurobi log for more details.')
+            attempt += 1
+
+        finally:
+            if benders is not None:
+                benders.dispose()
+
+    print(f"Try to find an optimal solution for {attempt} attempts.")
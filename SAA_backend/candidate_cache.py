@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Candidate cache.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为候选解评估缓存模块，以取整后的第一阶段解x、y与评估数据的指纹为键保存renew的评估结果，
+同一次求解中重复的候选解只评估一次，结果保存在JSON文件中供之后的求解与calculate_epoch的各轮复用，缓存条目按最近使用淘汰
+"""
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+import numpy as np
+
+# 默认缓存文件
+CANDIDATE_CACHE_PATH = 'candidate_cache.json'
+
+class CandidateCache:
+    """
+    功能: 候选解评估结果的LRU缓存，值为renew返回的 (Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2)，条目数量超过max_entries时淘汰最久未使用的条目。
+    方法:
+    key(fingerprint, new_x, new_y): 计算候选解的缓存键。
+    get(key): 读取评估结果，未命中时返回None。
+    plan(keys): 划分已缓存与需要评估的候选解。
+    put(key, result): 保存评估结果。
+    save(): 写入缓存文件。
+    report(): 打印并记录命中率。
+    """
+    def __init__(self, path=CANDIDATE_CACHE_PATH, max_entries=4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.entries = OrderedDict(json.load(file))
+
+    @staticmethod
+    def key(fingerprint, new_x, new_y):
+        """
+        参数:
+        fingerprint: 评估数据的指纹，包括成本参数、评估场景、场景概率以及影响评估结果的选项（见solver）。
+        new_x: 设施选址决策。
+        new_y: 库存决策。
+
+        返回:
+        缓存键，取整后的x、y与指纹完全相同时键相同。
+        """
+        digest = hashlib.sha256(fingerprint.encode())
+        for array in (new_x, new_y):
+            array = np.ascontiguousarray(np.rint(np.asarray(array, dtype=float)).astype(np.int64))
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()[:32]
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return tuple(result)
+
+    def plan(self, keys):
+        """
+        参数:
+        keys: 各候选解的缓存键。
+
+        返回:
+        元组 (cached, pending)。cached为 {候选解序号: 评估结果}，pending为 {缓存键: 候选解序号列表}，
+        每个键只需评估一次，同一次求解中重复的候选解计为命中。
+        """
+        cached = {}
+        pending = OrderedDict()
+        for m, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(m)
+                self.hits += 1
+                continue
+            result = self.get(key)
+            if result is None:
+                pending[key] = [m]
+            else:
+                cached[m] = result
+        return cached, pending
+
+    def put(self, key, result):
+        self.entries[key] = [float(value) for value in result]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        """
+        先与文件中现有的条目合并（其他进程在本次读取之后写入的条目不会丢失，本进程的条目视为最近使用），
+        再写入临时文件并替换，避免其他进程读到不完整的文件。
+        """
+        if not self.path:
+            return
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    entries = OrderedDict(json.load(file))
+            except (OSError, ValueError):
+                entries = OrderedDict()
+            for key, result in self.entries.items():
+                entries[key] = result
+                entries.move_to_end(key)
+            self.entries = entries
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        tmp_path = f'{self.path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(list(self.entries.items()), file)
+        os.replace(tmp_path, self.path)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        message = f'Candidate cache: {self.hits} hits, {self.misses} misses, hit rate {self.hit_rate() * 100} %, {len(self.entries)} entries'
+        print(message)
+        logging.info(message)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Env pool.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为Gurobi环境池模块，每个进程按日志文件与线程数只启动并配置一次gp.Env，getsol、renew、two_stage_sp_model以及期望值问题、L-shaped分解与渐进对冲的模型均在其上创建，
+避免每个模型重复获取许可证与重新打开日志文件，同时按求解阶段统计模型创建耗时
+"""
+import time
+import logging
+import gurobipy as gp
+from solver_backend import create_model
+
+class EnvPool:
+    """
+    功能: 进程内的Gurobi环境池，键为 (LogFile, Threads, OutputFlag)，相同配置的模型共用一个已启动的环境，
+          并记录各求解阶段创建模型的数量与耗时。
+    方法:
+    get(log_filename, threads, output_flag): 返回已启动的环境，不存在时创建。
+    record(stage, seconds): 记录一次模型创建。
+    report(): 打印并记录各阶段的模型创建耗时。
+    reset_stats(): 清空统计。
+    close(): 释放全部环境。
+    """
+    def __init__(self, threads=None, output_flag=1):
+        # 进程默认的Gurobi线程数，并行求解时由parallel_executor按进程数设置
+        self.threads = threads
+        self.output_flag = output_flag
+        self.envs = {}
+        self.stats = {}
+
+    def get(self, log_filename=None, threads=None, output_flag=None):
+        threads = self.threads if threads is None else threads
+        output_flag = self.output_flag if output_flag is None else output_flag
+        key = (log_filename or '', threads, output_flag)
+        env = self.envs.get(key)
+        if env is None:
+            tic = time.perf_counter()
+            env = gp.Env(empty=True)
+            env.setParam('OutputFlag', output_flag)
+            if log_filename:
+                env.setParam('LogFile', log_filename)
+            if threads:
+                env.setParam('Threads', threads)
+            env.start()
+            self.envs[key] = env
+            self.record('env', time.perf_counter() - tic)
+        return env
+
+    def record(self, stage, seconds):
+        count, total = self.stats.get(stage, (0, 0.0))
+        self.stats[stage] = (count + 1, total + seconds)
+
+    def report(self):
+        if not self.stats:
+            return
+        message = 'Model creation: ' + ', '.join(f'{stage} {count} x {total:.3f} s' for stage, (count, total) in self.stats.items())
+        print(message)
+        logging.info(message)
+
+    def reset_stats(self):
+        self.stats = {}
+
+    def close(self):
+        for env in self.envs.values():
+            env.dispose()
+        self.envs = {}
+
+_POOL = None
+
+def env_pool():
+    """
+    返回当前进程的环境池，每个进程（包括并行求解的子进程）各有一个。
+    """
+    global _POOL
+    if _POOL is None:
+        _POOL = EnvPool()
+    return _POOL
+
+def create_pooled_model(form, name, backend='gurobi', log_filename=None, stage=None):
+    """
+    在环境池的环境上创建模型，并将创建耗时记入stage阶段。
+
+    参数:
+    form: SAAModelForm对象。
+    name: 模型名称。
+    backend: 求解器后端，'highs'后端不使用Gurobi环境。
+    log_filename: Gurobi日志文件，由环境统一设置，模型上无需再设置LogFile。
+    stage: 统计所用的阶段名称，默认为模型名称。
+
+    返回:
+    SAAGurobiModel或HighsSAAModel对象，用完后应调用model.dispose()。
+    """
+    tic = time.perf_counter()
+    env = env_pool().get(log_filename) if backend == 'gurobi' else None
+    handle = create_model(form, name, backend, env)
+    env_pool().record(stage or name, time.perf_counter() - tic)
+    return handle
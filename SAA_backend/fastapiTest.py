@@ -19,7 +19,7 @@ from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from threading import Thread
+from threading import Thread, Event
 from sklearn.manifold import MDS
 from datetime import datetime
 from solver_model import *
@@ -27,7 +27,7 @@ from data_generator import *
 from clustering_param_analyzer import *
 from BaseModel import *
 import config
-import os, asyncio, logging, shutil, openpyxl
+import os, asyncio, logging, shutil, openpyxl, queue
 import pandas as pd
 
 app = FastAPI()
@@ -212,7 +212,7 @@ async def receive_parameters(request: Request, parameters: ParameterModel):
     body = await request.json()
     # # print(json.dumps(body, indent=2))
     # 解构前端发送的参数
-    global IS,NS,MS,SS_SAA, data_process_methods, cluster_methods, sample_generate_methods, graph_methods, max_attempts, calculate_epoch
+    global IS,NS,MS,SS_SAA, data_process_methods, cluster_methods, sample_generate_methods, graph_methods, max_attempts, calculate_epoch, solve_policy, gap_tolerance, sample_growth, screening, first_stage_search
     IS=parameters.IS
     NS=parameters.NS
     MS=parameters.MS
@@ -223,6 +223,11 @@ async def receive_parameters(request: Request, parameters: ParameterModel):
     sample_generate_methods = parameters.sample_generate_methods
     graph_methods = parameters.graph_methods
     max_attempts = parameters.max_attempts
+    solve_policy = SolvePolicy.from_dict(parameters.solve_policy)
+    gap_tolerance = parameters.gap_tolerance
+    sample_growth = parameters.sample_growth
+    screening = parameters.screening
+    first_stage_search = parameters.first_stage_search
     
     store_data_to_redis(Input_data_path, IS, Raw_data_flag)
     # 打印基本参数信息
@@ -237,6 +242,8 @@ async def receive_parameters(request: Request, parameters: ParameterModel):
     logging.info('Graph methods: {}'.format(', '.join(graph_methods)))
     # 其他相关日志，如果需要
     logging.info(f'Max gurobi solve attempts: {max_attempts}, Calculate epoch: {calculate_epoch}')
+    logging.info(f'Solve policy: {solve_policy.describe()}')
+    logging.info(f'Gap tolerance: {gap_tolerance}, Sample growth: {sample_growth}, Screening: {screening}, First-stage search: {first_stage_search}')
     logging.info('--------------------------------------------')
     await get_distance_matrix(IS)
     return {"message": "Parameters received successfully"}
@@ -346,19 +353,22 @@ async def calculate_gurobi_opt():
     global gurobi_opt
     logging.info(f'You are using the Gurobi for solving')
     
-    gurobi_opt, gurobi_elapsed_time, Vx, Vy = two_stage_sp_model(
-        IS_init=IS, 
-        NS_init=NS, 
-        Input_file=Input_data_path,
-        Output_file=Output_data_path,
-        Raw_data_flag=Raw_data_flag,
-        log_filename=app.state.log_filename,
-        max_attempts=max_attempts,
-        AS_init=config.AS,
-        LS_init=config.LS, 
-        Food_index=current_config['Food_index'], 
-        Medicine_index=current_config['Medicine_index']
-    )
+    with progress_bus().tag(combination='Gurobi'):
+        gurobi_opt, gurobi_elapsed_time, Vx, Vy = two_stage_sp_model(
+            IS_init=IS, 
+            NS_init=NS, 
+            Input_file=Input_data_path,
+            Output_file=Output_data_path,
+            Raw_data_flag=Raw_data_flag,
+            log_filename=app.state.log_filename,
+            max_attempts=max_attempts,
+            AS_init=config.AS,
+            LS_init=config.LS, 
+            Food_index=current_config['Food_index'], 
+            Medicine_index=current_config['Medicine_index'],
+            policy=solve_policy,
+            model_cache=MODEL_CACHE_DIR
+        )
     logging.info(f'Gurobi solved! the result is {gurobi_opt}')
     
     # 包装成与 run_solver 相同的格式
@@ -425,31 +435,38 @@ async def run_solver():
                             print(f"Executing combination: Data Processing={data_process}, Clustering={cluster}, Sampling={sample_generate}, Dimensionality Reduction={graph_method}")
                             logging.info(f"Executing combination: Data Processing={data_process}, Clustering={cluster}, Sampling={sample_generate}, Dimensionality Reduction={graph_method}")
                             try:
-                                script_name, opt_f, elapsed_time, gap, Vx, Vy, Output_file = solver(
-                                    DATA_PROCESS_METHOD=data_process,
-                                    CLUSTER_METHOD=cluster,
-                                    SAMPLE_GENERATE_METHOD=sample_generate,
-                                    GRAPH_METHOD=graph_method,
-                                    IS=IS,
-                                    NS=NS,
-                                    MS=MS,
-                                    SS_SAA=SS_SAA,
-                                    Graphs_sample_save_directory=sample_directory,
-                                    Graphs_cluster_save_directory=cluster_directory,
-                                    Input_file=Input_data_path,
-                                    Output_file=Output_data_path,
-                                    gurobi_opt=gurobi_opt,
-                                    Raw_data_flag=Raw_data_flag,
-                                    log_filename=app.state.log_filename,
-                                    max_attempts=max_attempts, 
-                                    AS=config.AS,
-                                    LS=config.LS, 
-                                    DATA_PROCESS_PARAMS=DATA_PROCESS_PARAMS, 
-                                    GRAPH_CONFIG=GRAPH_CONFIG,
-                                    Food_index=current_config['Food_index'],
-                                    Medicine_index=current_config['Medicine_index'],
-                                    CLUSTER_PARAMS=current_config['CLUSTER_PARAMS']
-                                )
+                                with progress_bus().tag(combination=method_dir_name, epoch=epoch):
+                                    script_name, opt_f, elapsed_time, gap, Vx, Vy, Output_file = solver(
+                                        DATA_PROCESS_METHOD=data_process,
+                                        CLUSTER_METHOD=cluster,
+                                        SAMPLE_GENERATE_METHOD=sample_generate,
+                                        GRAPH_METHOD=graph_method,
+                                        IS=IS,
+                                        NS=NS,
+                                        MS=MS,
+                                        SS_SAA=SS_SAA,
+                                        Graphs_sample_save_directory=sample_directory,
+                                        Graphs_cluster_save_directory=cluster_directory,
+                                        Input_file=Input_data_path,
+                                        Output_file=Output_data_path,
+                                        gurobi_opt=gurobi_opt,
+                                        Raw_data_flag=Raw_data_flag,
+                                        log_filename=app.state.log_filename,
+                                        max_attempts=max_attempts, 
+                                        AS=config.AS,
+                                        LS=config.LS, 
+                                        DATA_PROCESS_PARAMS=DATA_PROCESS_PARAMS, 
+                                        GRAPH_CONFIG=GRAPH_CONFIG,
+                                        Food_index=current_config['Food_index'],
+                                        Medicine_index=current_config['Medicine_index'],
+                                        CLUSTER_PARAMS=current_config['CLUSTER_PARAMS'],
+                                        solve_policy=SolvePolicy.from_dict(solve_policy.to_dict()),
+                                        gap_tolerance=gap_tolerance,
+                                        sample_growth=sample_growth,
+                                        screening=screening,
+                                        first_stage_search=first_stage_search,
+                                        candidate_cache=CANDIDATE_CACHE_PATH
+                                    )
                                 # 将每一次的执行结果存储到一个字典中
                                 result = SolverResult(
                                     script_name= script_name,
@@ -623,6 +640,44 @@ async def websocket_logs(websocket: WebSocket):
         await websocket.close()
         log_thread.join()
 
+async def handle_progress_events(websocket, events, stop):
+    try:
+        while not stop.is_set():
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            await websocket.send_json(event)
+    except Exception as e:
+        logging.error(f"progress thread: {str(e)}")
+
+def start_handle_progress_events(websocket, events, stop):
+    asyncio.run(handle_progress_events(websocket, events, stop))
+
+@app.websocket("/ws/progress")
+async def websocket_progress(websocket: WebSocket):
+    """
+    推送求解进度事件（见progress_events），每条消息为一个JSON对象，包括event、stage、combination、epoch、replication、
+    candidate、incumbent、bound、gap、nodes与elapsed等字段。只有存在连接时求解才挂接Gurobi回调。
+    """
+    await websocket.accept()
+    events = progress_bus().subscribe()
+    stop = Event()
+
+    # 与/ws/logs相同，在单独的线程中发送消息，求解占用事件循环时进度仍能实时送达
+    progress_thread = Thread(target=start_handle_progress_events, args=(websocket, events, stop))
+    progress_thread.start()
+
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        logging.info("Progress WebSocket connection was closed by the client.")
+    finally:
+        stop.set()
+        progress_bus().unsubscribe(events)
+        progress_thread.join()
+
 
 # 如果你希望建立一个可以直接运行的 FastAPI 应用，你还需要定义一个入口点
 if __name__ == "__main__":
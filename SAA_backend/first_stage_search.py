@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of First-stage search.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为第一阶段启发式搜索模块，不求解MIP，以模拟退火在库存y上搜索，设施选址x由y确定（每个有库存的城市选择容量足够的固定成本最低的设施），
+始终满足Constraint (2)与Constraint (5)；每一步只按场景向量化地重新估计受影响物资的第二阶段成本，多条链按独立的随机种子并行搜索，
+返回的候选解池交给solver原有的候选解评估，城市数量为数百时也不需要求解大规模MIP
+"""
+import time
+import logging
+import numpy as np
+from model_builder import transport_cost_tensor
+from replication_screening import round_candidate
+from parallel_executor import run_parallel
+
+class RecourseScorer:
+    """
+    功能: 快速估计固定库存下各物资的期望第二阶段成本，用于搜索中的移动评估。
+    方法:
+    resource_costs(a, y_a): 物资a的期望运输成本、持有成本与缺货成本。
+
+    功能说明:
+    第二阶段问题中每单位运量的收益为 CH + PU - 运输成本。本地需求先由本地库存满足（运输成本为0），
+    其余需求按场景向量化地贪心分配：每一轮各需求点向仍有剩余库存（y - 本地满足量）的最近供应点请求，
+    供应点的剩余库存不足时按请求量比例分配。前rounds轮得到的是一个可行的运输方案，之后剩余的少量需求才按当前供应点的
+    单位运输成本估计，因此估计值不会因忽略供应点的库存上限而系统性地低于精确成本，最终的候选解评估仍使用精确的renew或recourse_evaluator。
+    """
+    def __init__(self, IS, AS, CH, PU, CT, H, D, pr, arcs=None, rounds=5):
+        """
+        参数:
+        arcs: 可用运输弧，默认全部可用。
+        rounds: 贪心分配的最大轮数，None为分配到没有可用的供应点为止。
+        其余参数同solver_model.getsol。
+        """
+        self.IS, self.AS = IS, AS
+        self.rounds = IS + 1 if rounds is None else int(rounds)
+        self.CH = np.asarray(CH, dtype=float)
+        self.PU = np.asarray(PU, dtype=float)
+        self.D = np.asarray(D, dtype=float)
+        self.pr = np.asarray(pr, dtype=float)[:len(self.D)]
+        TC = transport_cost_tensor(CT, H, IS)
+        # 只保留收益为正的非本地弧，不可用的弧费用为inf
+        usable = (TC < (self.CH + self.PU)[:, None, None]) & ~np.eye(IS, dtype=bool)[None, :, :]
+        if arcs is not None:
+            usable &= np.asarray(arcs, dtype=bool)
+        self.cost = np.where(usable, TC, np.inf)
+
+    def resource_costs(self, a, y_a, tol=1e-9):
+        """
+        参数:
+        a: 物资序号。
+        y_a: 物资a的库存，形状为 (IS,)。
+        tol: 剩余库存与剩余需求的容差。
+        """
+        D_a = self.D[:, a, :]
+        NS, IS = D_a.shape
+        local = np.minimum(y_a[None, :], D_a)
+        surplus = (y_a[None, :] - local).ravel()
+        residual = (D_a - local).ravel()
+        tc = 0.0
+        suppliers = np.flatnonzero(y_a > 0)
+        if suppliers.size:
+            # 各需求点的可用供应点按单位运输成本排序
+            order = np.argsort(self.cost[a][suppliers], axis=0)
+            ranked = suppliers[order]
+            unit_ranked = np.take_along_axis(self.cost[a][suppliers], order, axis=0)
+            depth = np.isfinite(unit_ranked).sum(axis=0)
+            # 只跟踪仍有需求且还有可用供应点的 (场景, 需求点)，rank为其当前请求的供应点的名次
+            pair = np.flatnonzero((residual > tol) & np.tile(depth > 0, NS))
+            scenario, j = np.divmod(pair, IS)
+            rank = np.zeros(len(pair), dtype=int)
+            # 每一轮各请求要么被全部满足，要么其供应点已被耗尽而转向下一个供应点，轮数不超过供应点数量加一
+            for _ in range(min(self.rounds, len(suppliers) + 1)):
+                if not len(pair):
+                    break
+                key = scenario * IS + ranked[rank, j]
+                request = np.where(surplus[key] > tol, residual[pair], 0.0)
+                asked = np.bincount(key, weights=request, minlength=NS * IS)
+                share = np.minimum(1.0, np.divide(surplus[key], asked[key], out=np.ones(len(key)), where=request > 0))
+                flow = request * share
+                tc += self.pr[scenario] @ (flow * unit_ranked[rank, j])
+                residual[pair] -= flow
+                surplus -= np.bincount(key, weights=flow, minlength=NS * IS)
+                rank += surplus[key] <= tol
+                keep = (residual[pair] > tol) & (rank < depth[j])
+                pair, scenario, j, rank = pair[keep], scenario[keep], j[keep], rank[keep]
+        left_surplus = np.maximum(surplus, 0).reshape(NS, IS).sum(axis=1)
+        left_residual = np.maximum(residual, 0).reshape(NS, IS).sum(axis=1)
+        if suppliers.size and len(pair):
+            # 达到轮数上限后，剩余需求按当前请求的供应点的单位运输成本估计，运量不超过剩余库存
+            tail = np.bincount(scenario, weights=residual[pair], minlength=NS)
+            ship = np.minimum(tail, left_surplus)
+            scale = np.divide(ship, tail, out=np.zeros(NS), where=tail > 0)
+            tc += self.pr[scenario] @ (scale[scenario] * residual[pair] * unit_ranked[rank, j])
+            left_surplus -= ship
+            left_residual -= ship
+        hc = self.CH[a] * left_surplus
+        wc = self.PU[a] * left_residual
+        return float(tc), float(self.pr @ hc), float(self.pr @ wc)
+
+def newsvendor_stock(D, pr, CP, CH, PU, CF, U, V):
+    """
+    初始库存：每个城市按本地需求的报童分位数 (PU - CP) / (PU + CH) 备货，再按设施容量修复。
+
+    返回:
+    库存，形状为 (AS, IS)。
+    """
+    D = np.asarray(D, dtype=float)
+    pr = np.asarray(pr, dtype=float)[:len(D)]
+    CP, CH, PU = (np.asarray(a, dtype=float) for a in (CP, CH, PU))
+    ratio = np.clip((PU - CP) / (PU + CH), 0, 1)
+    order = np.argsort(D, axis=0)
+    cumulative = np.cumsum(pr[order], axis=0)
+    index = np.argmax(cumulative >= ratio[None, :, None] - 1e-12, axis=0)
+    stock = np.take_along_axis(np.take_along_axis(D, order, axis=0), index[None], axis=0)[0]
+    return round_candidate(np.zeros((D.shape[2], len(CF))), stock, CF, U, V)[1]
+
+def _city_fixed(load, CF, U):
+    if load <= 0:
+        return 0.0
+    feasible = U >= load
+    return float(CF[feasible].min()) if feasible.any() else np.inf
+
+def anneal_chain(IS, AS, CF, U, V, H, CP, CH, PU, CT, D, pr, arcs, y_start, seed, iterations, temperature, pool_size, perturb):
+    """
+    一条模拟退火链。
+
+    参数:
+    y_start: 初始库存。
+    seed: 随机种子。
+    iterations: 迭代次数。
+    temperature: 初始温度相对于初始目标值的比例，温度按几何级数降到初始温度的千分之一。
+    pool_size: 保留的最好解的数量。
+    perturb: 是否随机扰动初始库存，使各条链从不同的起点出发。
+
+    返回:
+    元组 (pool, stats)。pool为按目标值升序排列的 (f, y, fc, pc, tc, hc, wc) 列表，stats为迭代次数、接受次数与耗时。
+
+    功能:
+    每次迭代随机选择一种移动：调整一个城市一种物资的库存（60%）、关闭一个城市（10%）、按初始库存开放一个城市（10%）、
+    将一个城市的全部库存转移到一个未开放的城市（10%）或将一种物资的部分库存转移到另一个城市（10%）。城市库存体积超过最大的设施容量时拒绝该移动；
+    移动只影响一两个城市的固定成本与相关物资的第二阶段成本，只重新计算这些部分。
+    """
+    tic = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    CF, U, V, CP = (np.asarray(a, dtype=float) for a in (CF, U, V, CP))
+    scorer = RecourseScorer(IS, AS, CH, PU, CT, H, D, pr, arcs)
+    mean_demand = np.einsum('s,sai->ai', scorer.pr, scorer.D)
+    steps = np.maximum(np.rint(0.25 * mean_demand), 1).astype(int)
+
+    y = np.array(y_start, dtype=float)
+    if perturb:
+        y = np.rint(y * rng.uniform(0.5, 1.5, y.shape))
+        y[:, rng.random(IS) < 0.1] = 0
+        y = round_candidate(np.zeros((IS, len(CF))), y, CF, U, V)[1]
+    load = V @ y
+    fixed = np.array([_city_fixed(l, CF, U) for l in load])
+    comp = np.array([scorer.resource_costs(a, y[a]) for a in range(AS)])
+    f = fixed.sum() + CP @ y.sum(axis=1) + comp.sum()
+
+    pool = {y.tobytes(): (f, y.copy(), fixed.sum(), comp.copy())}
+    T0 = temperature * abs(f)
+    accepted = 0
+    for k in range(iterations):
+        T = T0 * 1e-3 ** (k / iterations)
+        u = rng.random()
+        opened = np.flatnonzero(load > 0)
+        closed = np.flatnonzero(load <= 0)
+        # changes为 {城市: 新的库存列}
+        if u < 0.1 and opened.size:
+            changes = {rng.choice(opened): np.zeros(AS)}
+            resources = range(AS)
+        elif u < 0.2 and closed.size:
+            i = rng.choice(closed)
+            changes = {i: y_start[:, i].copy() if y_start[:, i].any() else np.rint(mean_demand[:, i])}
+            resources = range(AS)
+        elif u < 0.3 and opened.size and closed.size:
+            i, j = rng.choice(opened), rng.choice(closed)
+            changes = {i: np.zeros(AS), j: y[:, i].copy()}
+            resources = range(AS)
+        elif u < 0.4 and opened.size:
+            a = rng.integers(AS)
+            i, j = rng.choice(opened), rng.integers(IS)
+            if i == j or y[a, i] <= 0:
+                continue
+            units = rng.integers(1, int(y[a, i]) + 1)
+            changes = {i: y[:, i].copy(), j: y[:, j].copy()}
+            changes[i][a] -= units
+            changes[j][a] += units
+            resources = (a,)
+        else:
+            a = rng.integers(AS)
+            i = rng.integers(IS)
+            column = y[:, i].copy()
+            column[a] = max(column[a] + rng.integers(1, steps[a, i] + 1) * rng.choice((-1, 1)), 0)
+            changes = {i: column}
+            resources = (a,)
+
+        cities = list(changes)
+        columns = np.stack([changes[i] for i in cities], axis=1)
+        new_load = V @ columns
+        new_fixed = np.array([_city_fixed(l, CF, U) for l in new_load])
+        if not np.isfinite(new_fixed).all():
+            continue
+        new_comp = comp.copy()
+        for a in resources:
+            y_a = y[a].copy()
+            y_a[cities] = columns[a]
+            new_comp[a] = scorer.resource_costs(a, y_a)
+        delta = (new_fixed.sum() - fixed[cities].sum() + CP @ (columns - y[:, cities]).sum(axis=1)
+                 + new_comp.sum() - comp.sum())
+        if delta > 0 and rng.random() >= np.exp(-delta / max(T, 1e-12)):
+            continue
+
+        accepted += 1
+        y[:, cities] = columns
+        load[cities], fixed[cities], comp = new_load, new_fixed, new_comp
+        f += delta
+        worst = max(pool.values(), key=lambda item: item[0])[0]
+        if len(pool) < pool_size or f < worst:
+            key = y.tobytes()
+            if key not in pool:
+                pool[key] = (f, y.copy(), fixed.sum(), comp.copy())
+                if len(pool) > pool_size:
+                    del pool[max(pool, key=lambda key: pool[key][0])]
+
+    results = [(f, y_pool, fc, float(CP @ y_pool.sum(axis=1)), *comp_pool.sum(axis=0)) for f, y_pool, fc, comp_pool in pool.values()]
+    results.sort(key=lambda item: item[0])
+    return results, {'iterations': iterations, 'accepted': accepted, 'time': time.perf_counter() - tic}
+
+class FirstStageSearch:
+    """
+    功能: 以多条并行的模拟退火链代替getsol求解样本组，返回候选解池。
+    方法:
+    from_dict(options): 由字典构建。
+    search(...): 在一个样本组上搜索，返回候选解池。
+    """
+    def __init__(self, chains=4, iterations=5000, pool_size=3, temperature=1e-2, seed=0, workers=None):
+        """
+        参数:
+        chains: 链的数量，第一条链从报童初始库存出发，其余链从随机扰动后的初始库存出发。
+        iterations: 每条链的迭代次数。
+        pool_size: 每个样本组返回的候选解数量。
+        temperature: 初始温度相对于初始目标值的比例。
+        seed: 随机种子，各样本组与各条链的种子由 (seed, 样本组序号) 派生，结果可复现。
+        workers: 并行执行各条链的进程数，默认None为顺序执行。
+        """
+        self.chains = int(chains)
+        self.iterations = int(iterations)
+        self.pool_size = int(pool_size)
+        self.temperature = temperature
+        self.seed = seed
+        self.workers = workers
+
+    @classmethod
+    def from_dict(cls, options):
+        options = dict(options or {})
+        for key in options:
+            if key not in ('chains', 'iterations', 'pool_size', 'temperature', 'seed', 'workers'):
+                raise ValueError(f'未知的启发式搜索选项: {key}')
+        return cls(**options)
+
+    def search(self, IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_sample, pr_sample, arcs=None, replication=0):
+        """
+        参数:
+        D_sample, pr_sample: 样本组的需求数据与场景概率，搜索中的第二阶段成本在这些场景上计算。
+        replication: 样本组序号，用于派生随机种子。
+        其余参数同solver_model.getsol。
+
+        返回:
+        候选解池，按估计的期望总成本升序排列，每个元素为包含 f、fc、pc、tc、hc、wc、x、y 的字典。
+        """
+        tic = time.perf_counter()
+        y_start = newsvendor_stock(D_sample, pr_sample, CP, CH, PU, CF, U, V)
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence([self.seed, replication]).spawn(self.chains)]
+        tasks = [(IS, AS, CF, U, V, H, CP, CH, PU, CT, D_sample, pr_sample, arcs, y_start, seeds[c], self.iterations, self.temperature,
+                  self.pool_size, c > 0) for c in range(self.chains)]
+        if self.workers and self.chains > 1:
+            chain_results = run_parallel(anneal_chain, tasks, self.workers)
+        else:
+            chain_results = [anneal_chain(*task) for task in tasks]
+
+        merged = {}
+        for results, _ in chain_results:
+            for f, y, fc, pc, tc, hc, wc in results:
+                merged.setdefault(y.tobytes(), (f, y, fc, pc, tc, hc, wc))
+        pool = []
+        for f, y, fc, pc, tc, hc, wc in sorted(merged.values(), key=lambda item: item[0])[:self.pool_size]:
+            x = round_candidate(np.zeros((IS, LS)), y, CF, U, V)[0]
+            pool.append({'f': f, 'fc': fc, 'pc': pc, 'tc': tc, 'hc': hc, 'wc': wc, 'x': x, 'y': y})
+
+        iterations = sum(stats['iterations'] for _, stats in chain_results)
+        accepted = sum(stats['accepted'] for _, stats in chain_results)
+        elapsed = time.perf_counter() - tic
+        message = (f"First-stage search replication {replication}: best {pool[0]['f']}, {len(pool)} candidates, "
+                   f"{self.chains} chains x {self.iterations} iterations ({accepted} accepted) in {elapsed} seconds")
+        print(message)
+        logging.info(message)
+        return pool
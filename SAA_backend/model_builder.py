@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Model builder.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为模型构建模块，getsol、renew与two_stage_sp_model共用同一套稀疏矩阵约束块，并通过gurobipy矩阵接口一次性加载
+"""
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import Model, GRB, MVar, MConstr
+
+
+# 第二阶段变量块
+RECOURSE_BLOCKS = ('q', 'z', 'w')
+
+# 可用的模型形式
+FORMULATIONS = ('standard', 'lean')
+
+def transport_cost_tensor(CT, H, IS):
+    """
+    预先计算单位运输成本张量 TC[a,i,j] = CT[a] * H[i,j]，所有模型共用，只计算一次。
+
+    参数:
+    CT: 各物资的单位运输成本。
+    H: 距离矩阵。
+    IS: 城市数量。
+
+    返回:
+    形状为 (AS, IS, IS) 的运输成本张量。
+    """
+    H = np.asarray(H, dtype=float)[:IS, :IS]
+    return np.asarray(CT, dtype=float)[:, None, None] * H[None, :, :]
+
+
+def resolve_recourse_vtype(recourse_integrality, D, fixed_y=None):
+    """
+    根据recourse_integrality选项确定第二阶段变量q、z、w的类型。
+
+    参数:
+    recourse_integrality: 'auto'、'integer'或'continuous'。
+    D: 需求数据。
+    fixed_y: renew中固定的库存，其余模型为None。
+
+    返回:
+    GRB.CONTINUOUS或GRB.INTEGER。
+
+    功能:
+    第二阶段是以y为供应、D为需求的运输结构，约束矩阵全幺模。只要D为整数且y为整数（y是整数变量或固定为整数值），
+    q、z、w的线性规划最优解即为整数，此时'auto'将其声明为连续变量；否则保留整数变量。'continuous'强制使用连续变量。
+    """
+    if recourse_integrality == 'integer':
+        return GRB.INTEGER
+    if recourse_integrality == 'continuous':
+        return GRB.CONTINUOUS
+    if recourse_integrality != 'auto':
+        raise ValueError(f'未知的第二阶段整数性选项: {recourse_integrality}')
+
+    def integral(values):
+        values = np.asarray(values, dtype=float)
+        return bool(np.all(values == np.round(values)))
+
+    if integral(D) and (fixed_y is None or integral(fixed_y)):
+        return GRB.CONTINUOUS
+    return GRB.INTEGER
+
+class SAAModelForm:
+    """
+    功能: 以稀疏矩阵形式保存一个线性模型（变量块、约束块、目标系数），与具体求解器无关。
+    方法:
+    add_vars(name, shape, vtype, lb, ub, obj): 添加一个变量块。
+    index(name): 返回变量块的列索引数组。
+    add_constrs(name, sense, rhs, *terms): 添加一个约束块。
+    finalize(): 拼接所有块，生成约束矩阵A。
+    layout(): 返回不含矩阵数据、只含变量块与约束块布局的副本。
+    """
+    def __init__(self):
+        """
+        初始化空模型。cols记录 变量块名称 -> (起始列, 形状)，rows记录 约束块名称 -> (起始行, 结束行)。
+        """
+        self.cols = {}
+        self.rows = {}
+        self.arcs = None
+        self.formulation = 'standard'
+        self.recourse_integrality = 'integer'
+        self.recourse_relaxed = False
+        self.obj_con = 0.0
+        self.n_cols = 0
+        self.n_rows = 0
+        self._lb, self._ub, self._obj, self._vtype = [], [], [], []
+        self._row_idx, self._col_idx, self._vals = [], [], []
+        self._sense, self._rhs = [], []
+
+    def add_vars(self, name, shape, vtype, lb=0.0, ub=np.inf, obj=0.0):
+        """
+        添加一个变量块，列按C顺序（最后一维最快）展开。
+
+        参数:
+        name: 变量块名称。
+        shape: 变量块形状。
+        vtype: 变量类型，GRB.BINARY / GRB.INTEGER / GRB.CONTINUOUS。
+        lb, ub, obj: 下界、上界与目标系数，可为标量或与shape相容的数组。
+        """
+        shape = tuple(int(d) for d in np.atleast_1d(shape))
+        size = int(np.prod(shape))
+        self.cols[name] = (self.n_cols, shape)
+        self._lb.append(np.broadcast_to(np.asarray(lb, dtype=float), shape).ravel())
+        self._ub.append(np.broadcast_to(np.asarray(ub, dtype=float), shape).ravel())
+        self._obj.append(np.broadcast_to(np.asarray(obj, dtype=float), shape).ravel())
+        self._vtype.append(np.full(size, vtype))
+        self.n_cols += size
+
+    def index(self, name):
+        """
+        返回变量块的全局列索引，形状与变量块一致。
+        """
+        start, shape = self.cols[name]
+        return np.arange(start, start + int(np.prod(shape))).reshape(shape)
+
+    def add_constrs(self, name, sense, rhs, *terms):
+        """
+        添加一个约束块。
+
+        参数:
+        name: 约束块名称。
+        sense: 约束方向，'<'、'='或'>'。
+        rhs: 右端项数组，其长度即为该块的行数。
+        terms: 若干 (局部行号, 全局列号, 系数) 三元组，三者可广播为同一形状。
+        """
+        rhs = np.atleast_1d(np.asarray(rhs, dtype=float)).ravel()
+        for rows, cols, vals in terms:
+            rows, cols, vals = np.broadcast_arrays(rows, cols, np.asarray(vals, dtype=float))
+            self._row_idx.append(rows.ravel() + self.n_rows)
+            self._col_idx.append(cols.ravel())
+            self._vals.append(vals.ravel())
+        self.rows[name] = (self.n_rows, self.n_rows + len(rhs))
+        self._sense.append(np.full(len(rhs), sense))
+        self._rhs.append(rhs)
+        self.n_rows += len(rhs)
+
+    def finalize(self):
+        """
+        拼接所有变量块与约束块，生成 lb、ub、obj、vtype、A、sense、rhs 数组。
+        """
+        self.lb = np.concatenate(self._lb)
+        self.ub = np.concatenate(self._ub)
+        self.obj = np.concatenate(self._obj)
+        self.vtype = np.concatenate(self._vtype)
+        self.sense = np.concatenate(self._sense)
+        self.rhs = np.concatenate(self._rhs)
+        A = sp.coo_matrix(
+            (np.concatenate(self._vals), (np.concatenate(self._row_idx), np.concatenate(self._col_idx))),
+            shape=(self.n_rows, self.n_cols)
+        ).tocsr()
+        A.eliminate_zeros()
+        self.A = A
+        self._lb = self._ub = self._obj = self._vtype = None
+        self._row_idx = self._col_idx = self._vals = self._sense = self._rhs = None
+        return self
+
+    def layout(self):
+        """
+        返回只含变量块与约束块布局（以及精简模型计算z、w与各项成本所需数据）的副本，
+        可与从文件读取的Gurobi模型一起构造SAAGurobiModel，见model_cache。
+        """
+        layout = SAAModelForm()
+        layout.__dict__.update({key: value for key, value in self.__dict__.items()
+                                if key not in ('lb', 'ub', 'obj', 'vtype', 'sense', 'rhs', 'A')})
+        return layout
+
+
+def build_saa_form(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y=None, recourse_integrality='auto', arcs=None, formulation='standard'):
+    """
+    构建两阶段随机规划模型的矩阵形式，getsol、renew与two_stage_sp_model共用。
+
+    参数:
+    IS: 城市数量。
+    AS: 资源种类的数量。
+    LS: 存储位置的数量。
+    NS: 场景数量（getsol中为样本数量SS）。
+    CF, U, V, H, CP, CH, PU, CT: 成本与容量参数。
+    D: 需求数据，形状为 (NS, AS, IS)。
+    pr: 场景概率。
+    fixed_y: 若给定，则库存y固定为该值（renew），模型中不含第一阶段变量x、y。
+    recourse_integrality: 第二阶段变量q、z、w的整数性选项，见resolve_recourse_vtype。
+    arcs: 保留的运输弧，形状为 (AS, IS, IS) 的布尔数组（见arc_pruning.build_arc_set），默认保留全部弧。
+    formulation: 'standard'为原模型；'lean'为精简模型，见build_lean_form。
+
+    返回:
+    已完成拼接的SAAModelForm对象，form.arcs为q各列对应的 (a, i, j) 下标。
+
+    功能:
+    变量与约束的编号均与原逐条构建的模型一致，约束块名称沿用 "Constraint (2)"~"Constraint (5)" 等。
+    """
+    if formulation == 'lean':
+        return build_lean_form(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y, recourse_integrality, arcs)
+    if formulation != 'standard':
+        raise ValueError(f'未知的模型形式: {formulation}')
+    CF, U, V, CP, CH, PU = (np.asarray(p, dtype=float) for p in (CF, U, V, CP, CH, PU))
+    D = np.asarray(D, dtype=float)[:NS]
+    pr = np.asarray(pr, dtype=float)[:NS]
+    TC = transport_cost_tensor(CT, H, IS)
+
+    # 所有保留的 (a, i, j) 运输弧，q的第二维按弧编号
+    if arcs is None:
+        arc_a, arc_i, arc_j = (idx.ravel() for idx in np.indices((AS, IS, IS)))
+    else:
+        arc_a, arc_i, arc_j = np.nonzero(arcs)
+    n_arc = len(arc_a)
+    s_idx = np.arange(NS)[:, None]
+
+    first_stage = fixed_y is None
+    recourse_vtype = resolve_recourse_vtype(recourse_integrality, D, fixed_y)
+    form = SAAModelForm()
+    form.arcs = (arc_a, arc_i, arc_j)
+    form.recourse_integrality = recourse_integrality
+    form.recourse_relaxed = recourse_vtype == GRB.CONTINUOUS
+
+    # create variables
+    if first_stage:
+        form.add_vars('x', (IS, LS), GRB.BINARY, ub=1.0)
+        form.add_vars('y', (AS, IS), GRB.INTEGER)
+    form.add_vars('q', (NS, n_arc), recourse_vtype)
+    form.add_vars('z', (NS, AS, IS), recourse_vtype)
+    form.add_vars('w', (NS, AS, IS), recourse_vtype)
+    form.add_vars('hc', NS, GRB.CONTINUOUS)
+    form.add_vars('tc', NS, GRB.CONTINUOUS)
+    form.add_vars('wc', NS, GRB.CONTINUOUS)
+    form.add_vars('f', 1, GRB.CONTINUOUS, obj=1.0)
+    if first_stage:
+        form.add_vars('fc', 1, GRB.CONTINUOUS)
+        form.add_vars('pc', 1, GRB.CONTINUOUS)
+
+    q = form.index('q')
+    z = form.index('z').reshape(NS, -1)
+    w = form.index('w').reshape(NS, -1)
+    hc, tc, wc = form.index('hc'), form.index('tc'), form.index('wc')
+    f = form.index('f')
+
+    # Non-negativity constraints
+    scalar_blocks = ['q', 'z', 'w', 'f', 'hc', 'tc', 'wc']
+    if first_stage:
+        x, y = form.index('x'), form.index('y')
+        fc, pc = form.index('fc'), form.index('pc')
+        scalar_blocks = ['y'] + scalar_blocks[:4] + ['fc', 'pc'] + scalar_blocks[4:]
+    for name in scalar_blocks:
+        cols = form.index(name).ravel()
+        form.add_constrs(f'{name} non-negative', '>', np.zeros(len(cols)), (np.arange(len(cols)), cols, 1.0))
+
+    if first_stage:
+        # sum(y[a,i] * V[a]) <= sum(x[i,l] * U[l])
+        form.add_constrs('Constraint (2)', '<', np.zeros(IS),
+                         (np.arange(IS)[None, :], y, V[:, None]),
+                         (np.arange(IS)[:, None], x, -U[None, :]))
+
+    # z[s,a,i] == y[a,i] - sum(q[s,a,i,j] for j)
+    rows_ai = np.arange(NS * AS * IS).reshape(NS, -1)
+    terms = [(s_idx * AS * IS + arc_a * IS + arc_i, q, 1.0), (rows_ai, z, 1.0)]
+    if first_stage:
+        terms.append((rows_ai, y.ravel()[None, :], -1.0))
+        rhs3 = np.zeros(NS * AS * IS)
+    else:
+        rhs3 = np.tile(np.asarray(fixed_y, dtype=float).ravel(), NS)
+    form.add_constrs('Constraint (3)', '=', rhs3, *terms)
+
+    # w[s,a,j] == D[s,a,j] - sum(q[s,a,i,j] for i)
+    form.add_constrs('Constraint (4)', '=', D.ravel(),
+                     (s_idx * AS * IS + arc_a * IS + arc_j, q, 1.0),
+                     (rows_ai, w, 1.0))
+
+    if first_stage:
+        # sum(x[i,l] for l) <= 1
+        form.add_constrs('Constraint (5)', '<', np.ones(IS), (np.arange(IS)[:, None], x, 1.0))
+
+    # 各场景成本
+    PU_ai = np.repeat(PU, IS)[None, :]
+    CH_ai = np.repeat(CH, IS)[None, :]
+    form.add_constrs('Shortage Costs', '=', np.zeros(NS), (s_idx, wc[:, None], 1.0), (s_idx, w, -PU_ai))
+    form.add_constrs('Surplus Costs', '=', np.zeros(NS), (s_idx, hc[:, None], 1.0), (s_idx, z, -CH_ai))
+    form.add_constrs('Transportation Costs', '=', np.zeros(NS),
+                     (s_idx, tc[:, None], 1.0), (s_idx, q, -TC[arc_a, arc_i, arc_j][None, :]))
+
+    terms = [(0, f, 1.0), (0, tc, -pr), (0, hc, -pr), (0, wc, -pr)]
+    if first_stage:
+        form.add_constrs('Fixed Facility Costs', '=', [0.0], (0, fc, 1.0), (0, x, -CF[None, :]))
+        form.add_constrs('Procurement Costs', '=', [0.0], (0, pc, 1.0), (0, y, -CP[:, None]))
+        terms += [(0, fc, -1.0), (0, pc, -1.0)]
+    form.add_constrs('Objective Function', '=', [0.0], *terms)
+
+    return form.finalize()
+
+
+def lean_objective(form, D, pr, fixed_y=None):
+    """
+    计算精简模型中q、y的目标系数与目标常数项。
+
+    参数:
+    form: build_lean_form构建的SAAModelForm对象。
+    D: 需求数据，形状为 (NS, AS, IS)。
+    pr: 场景概率。
+    fixed_y: renew中固定的库存，其余模型为None。
+
+    返回:
+    元组 (q_obj, y_obj, obj_con)，第一阶段模型之外y_obj为None。
+
+    功能:
+    将 z = y - sum(q for j) 与 w = D - sum(q for i) 代入 sum(pr * (TC*q + CH*z + PU*w))，
+    q的系数为 pr * (TC - CH - PU)，y的系数为 CP + CH * sum(pr)，常数项为 sum(pr * PU * D)（renew中另加 sum(pr) * CH * y）。
+    """
+    D = np.asarray(D, dtype=float)
+    pr = np.asarray(pr, dtype=float)
+    arc_a = form.arcs[0]
+    q_obj = pr[:, None] * (form.arc_cost - form.CH[arc_a] - form.PU[arc_a])[None, :]
+    obj_con = float(pr @ np.einsum('sai,a->s', D, form.PU))
+    if fixed_y is None:
+        y_obj = np.repeat(form.CP[:, None] + form.CH[:, None] * pr.sum(), form.shape[2], axis=1)
+        return q_obj, y_obj, obj_con
+    obj_con += float(pr.sum() * np.sum(form.CH[:, None] * np.asarray(fixed_y, dtype=float)))
+    return q_obj, None, obj_con
+
+def build_lean_form(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y=None, recourse_integrality='auto', arcs=None):
+    """
+    构建两阶段随机规划模型的精简形式，参数与build_saa_form相同。
+
+    返回:
+    已完成拼接的SAAModelForm对象，form.formulation为'lean'。
+
+    功能:
+    与原模型等价，但不含hc、tc、wc、f、fc、pc等成本变量及其定义约束，各项成本直接写入目标函数；
+    非负约束由变量下界表示；z、w只是Constraint (3)与Constraint (4)中的松弛变量，代入后两者变为
+    sum(q[s,a,i,j] for j) <= y[a,i] 与 sum(q[s,a,i,j] for i) <= D[s,a,j]，模型中只保留第二阶段变量q。
+    求解后z、w与各项成本由SAAGurobiModel.values根据q、y、D计算，与原模型的结果一致。
+    """
+    CF, U, V, CP, CH, PU = (np.asarray(p, dtype=float) for p in (CF, U, V, CP, CH, PU))
+    D = np.asarray(D, dtype=float)[:NS]
+    pr = np.asarray(pr, dtype=float)[:NS]
+    TC = transport_cost_tensor(CT, H, IS)
+
+    if arcs is None:
+        arc_a, arc_i, arc_j = (idx.ravel() for idx in np.indices((AS, IS, IS)))
+    else:
+        arc_a, arc_i, arc_j = np.nonzero(arcs)
+    n_arc = len(arc_a)
+    s_idx = np.arange(NS)[:, None]
+
+    first_stage = fixed_y is None
+    recourse_vtype = resolve_recourse_vtype(recourse_integrality, D, fixed_y)
+    form = SAAModelForm()
+    form.arcs = (arc_a, arc_i, arc_j)
+    form.formulation = 'lean'
+    form.recourse_integrality = recourse_integrality
+    form.recourse_relaxed = recourse_vtype == GRB.CONTINUOUS
+    form.shape = (NS, AS, IS)
+    form.arc_cost = TC[arc_a, arc_i, arc_j]
+    form.CF, form.CP, form.CH, form.PU = CF, CP, CH, PU
+    form.D, form.pr = D, pr
+    form.fixed_y = None if first_stage else np.asarray(fixed_y, dtype=float)
+    # q按弧汇总到供应点 (a, i) 与需求点 (a, j) 的映射
+    form.supply_map = sp.csr_matrix((np.ones(n_arc), (np.arange(n_arc), arc_a * IS + arc_i)), shape=(n_arc, AS * IS))
+    form.demand_map = sp.csr_matrix((np.ones(n_arc), (np.arange(n_arc), arc_a * IS + arc_j)), shape=(n_arc, AS * IS))
+    q_obj, y_obj, form.obj_con = lean_objective(form, D, pr, fixed_y)
+
+    # create variables
+    if first_stage:
+        form.add_vars('x', (IS, LS), GRB.BINARY, ub=1.0, obj=CF[None, :])
+        form.add_vars('y', (AS, IS), GRB.INTEGER, obj=y_obj)
+    form.add_vars('q', (NS, n_arc), recourse_vtype, obj=q_obj)
+    q = form.index('q')
+    rows_ai = np.arange(NS * AS * IS).reshape(NS, -1)
+
+    if first_stage:
+        x, y = form.index('x'), form.index('y')
+        # sum(y[a,i] * V[a]) <= sum(x[i,l] * U[l])
+        form.add_constrs('Constraint (2)', '<', np.zeros(IS),
+                         (np.arange(IS)[None, :], y, V[:, None]),
+                         (np.arange(IS)[:, None], x, -U[None, :]))
+
+    # sum(q[s,a,i,j] for j) <= y[a,i]
+    terms = [(s_idx * AS * IS + arc_a * IS + arc_i, q, 1.0)]
+    if first_stage:
+        terms.append((rows_ai, y.ravel()[None, :], -1.0))
+        rhs3 = np.zeros(NS * AS * IS)
+    else:
+        rhs3 = np.tile(form.fixed_y.ravel(), NS)
+    form.add_constrs('Constraint (3)', '<', rhs3, *terms)
+
+    # sum(q[s,a,i,j] for i) <= D[s,a,j]
+    form.add_constrs('Constraint (4)', '<', D.ravel(), (s_idx * AS * IS + arc_a * IS + arc_j, q, 1.0))
+
+    if first_stage:
+        # sum(x[i,l] for l) <= 1
+        form.add_constrs('Constraint (5)', '<', np.ones(IS), (np.arange(IS)[:, None], x, 1.0))
+
+    return form.finalize()
+
+
+class SAAGurobiModel:
+    """
+    功能: 将SAAModelForm加载为Gurobi模型，并保存各变量块与约束块的句柄。
+    方法:
+    __init__(form, name, env, model): 加载模型，或包装已读取的模型。
+    optimize(tol, callback): 求解模型，第二阶段变量被松弛时校验解的整数性。
+    constraint(block): 返回约束块的句柄。
+    set_starts(starts): 设置一组MIP初始解。
+    update_scenarios(D, pr): 原地更新场景需求与场景概率。
+    update_fixed_y(new_y): 原地更新renew模型中固定的库存。
+    values(name): 读取变量块的解，精简模型中z、w与各项成本由q、y、D计算。
+    """
+    def __init__(self, form, name, env=None, model=None):
+        """
+        通过addMVar/addMConstr按块加载模型，变量块与约束块在模型中的顺序与form一致。
+
+        参数:
+        form: SAAModelForm对象，model给定时只需布局（见SAAModelForm.layout）。
+        name: 模型名称。
+        env: Gurobi环境，默认使用全局环境。
+        model: 已从文件读取的Gurobi模型，其变量与约束的顺序须与form一致，给定时不再重新加载。
+        """
+        self.form = form
+        self.recourse_relaxed = form.recourse_relaxed
+        if form.formulation == 'lean':
+            self.D, self.pr, self.fixed_y = form.D, form.pr, form.fixed_y
+        if model is not None:
+            self.model = model
+            variables = model.getVars()
+            self.vars = {block: MVar.fromlist(variables[start:start + int(np.prod(shape))]).reshape(shape)
+                         for block, (start, shape) in form.cols.items()}
+            # 约束块的句柄只在原地更新模型时需要，由constraint按需构造
+            self.constrs = {}
+            return
+        self.model = Model(name, env=env) if env is not None else Model(name)
+        self.vars = {}
+        for block, (start, shape) in form.cols.items():
+            stop = start + int(np.prod(shape))
+            self.vars[block] = self.model.addMVar(
+                shape,
+                lb=form.lb[start:stop].reshape(shape),
+                ub=form.ub[start:stop].reshape(shape),
+                obj=form.obj[start:stop].reshape(shape),
+                vtype=form.vtype[start:stop].reshape(shape)
+            )
+        self.model.ModelSense = GRB.MINIMIZE
+        self.model.ObjCon = form.obj_con
+        self.model.update()
+        self.constrs = {}
+        for block, (start, stop) in form.rows.items():
+            self.constrs[block] = self.model.addMConstr(
+                form.A[start:stop], None, form.sense[start:stop], form.rhs[start:stop], name=block
+            )
+
+    def optimize(self, tol=1e-6, callback=None):
+        """
+        求解模型。若第二阶段变量被声明为连续变量而返回的q、z、w不是整数，
+        则将其恢复为整数变量后重新求解，保证结果与整数模型一致。
+
+        参数:
+        tol: 判断整数性的容差。
+        callback: Gurobi回调函数，签名为 callback(model, where)。
+        """
+        self.model.optimize(callback)
+        if self.recourse_relaxed and self.model.SolCount > 0:
+            fractional = max(float(np.max(np.abs(v - np.round(v)), initial=0.0))
+                             for v in (self.values(block) for block in RECOURSE_BLOCKS if block in self.vars))
+            if fractional > tol:
+                print(f'Recourse solution is fractional ({fractional}), re-solving with integer variables ...\n')
+                self._restore_recourse_integrality()
+                self.model.optimize(callback)
+
+    def constraint(self, block):
+        """
+        返回约束块的句柄，从文件读取的模型在第一次使用时构造。
+        """
+        if block not in self.constrs:
+            start, stop = self.form.rows[block]
+            self.constrs[block] = MConstr.fromlist(self.model.getConstrs()[start:stop])
+        return self.constrs[block]
+
+    def set_starts(self, starts):
+        """
+        设置一组MIP初始解，Gurobi会从中选出可行且最好的一个，未给出的变量由Gurobi补全。
+
+        参数:
+        starts: 列表，每个元素为 {变量块名称: 取值} 的字典，例如 {'x': Vx, 'y': Vy}。
+        """
+        if not starts:
+            return
+        self.model.NumStart = len(starts)
+        for k, start in enumerate(starts):
+            self.model.Params.StartNumber = k
+            for block, value in start.items():
+                self.vars[block].Start = np.asarray(value, dtype=float)
+
+    def _restore_recourse_integrality(self):
+        """
+        将第二阶段变量恢复为整数变量。
+        """
+        for block in RECOURSE_BLOCKS:
+            if block in self.vars:
+                self.vars[block].VType = GRB.INTEGER
+        self.recourse_relaxed = False
+
+    def update_scenarios(self, D, pr):
+        """
+        原地更新场景需求D（Constraint (4)的右端项）与场景概率pr（Objective Function中的系数），模型结构不变。
+        Gurobi保留上一次求解的信息，上一次的解若仍可行会作为新一次求解的初始解，
+        因此结果可能与新建的模型不同；需要逐位一致时由调用者调用model.reset(1)清除（见SolvePolicy的reproducible）。
+
+        参数:
+        D: 需求数据，形状为 (NS, AS, IS)，NS须与构建时相同。
+        pr: 场景概率，长度为NS。
+        """
+        D = np.asarray(D, dtype=float)
+        pr = np.asarray(pr, dtype=float)
+        self.constraint('Constraint (4)').RHS = D.ravel()
+        if (self.recourse_relaxed and self.form.recourse_integrality == 'auto'
+                and resolve_recourse_vtype('auto', D) != GRB.CONTINUOUS):
+            self._restore_recourse_integrality()
+
+        if self.form.formulation == 'lean':
+            # 精简模型中pr与D出现在q、y的目标系数与目标常数项中
+            self.D, self.pr = D, pr
+            q_obj, y_obj, self.model.ObjCon = lean_objective(self.form, D, pr, self.fixed_y)
+            self.vars['q'].Obj = q_obj
+            if y_obj is not None:
+                self.vars['y'].Obj = y_obj
+            return
+
+        objective = self.constraint('Objective Function').tolist()[0]
+        for block in ('tc', 'hc', 'wc'):
+            for var, p in zip(self.vars[block].tolist(), pr):
+                self.model.chgCoeff(objective, var, -p)
+
+    def update_fixed_y(self, new_y):
+        """
+        原地更新renew模型中固定的库存new_y（Constraint (3)的右端项），模型结构不变。
+
+        参数:
+        new_y: 固定的库存决策，形状为 (AS, IS)。
+        """
+        new_y = np.asarray(new_y, dtype=float)
+        start, stop = self.form.rows['Constraint (3)']
+        self.constraint('Constraint (3)').RHS = np.tile(new_y.ravel(), (stop - start) // new_y.size)
+        if (self.recourse_relaxed and self.form.recourse_integrality == 'auto'
+                and not np.all(new_y == np.round(new_y))):
+            self._restore_recourse_integrality()
+        if self.form.formulation == 'lean':
+            # 精简模型中 CH * new_y 属于目标常数项
+            self.fixed_y = new_y
+            self.model.ObjCon = lean_objective(self.form, self.D, self.pr, new_y)[2]
+
+    def values(self, name):
+        """
+        以NumPy数组形式批量读取变量块的解。精简模型中不存在的变量块（z、w、hc、tc、wc、f、fc、pc）
+        按原模型中的定义由q、y、D计算，形状与原模型中的变量块一致。
+        """
+        if name in self.vars:
+            return np.asarray(self.vars[name].X)
+        if self.form.formulation != 'lean':
+            raise KeyError(name)
+
+        form = self.form
+        NS, AS, IS = form.shape
+        q = self.values('q')
+        y = self.values('y') if self.fixed_y is None else self.fixed_y
+        if name == 'z':
+            return y[None, :, :] - np.asarray(q @ form.supply_map).reshape(NS, AS, IS)
+        if name == 'w':
+            return self.D - np.asarray(q @ form.demand_map).reshape(NS, AS, IS)
+        if name == 'tc':
+            return q @ form.arc_cost
+        if name == 'hc':
+            return np.einsum('sai,a->s', self.values('z'), form.CH)
+        if name == 'wc':
+            return np.einsum('sai,a->s', self.values('w'), form.PU)
+        if name == 'fc':
+            return np.array([np.sum(form.CF[None, :] * self.values('x'))])
+        if name == 'pc':
+            return np.array([np.sum(form.CP[:, None] * y)])
+        if name == 'f':
+            return np.array([self.model.ObjVal])
+        raise KeyError(name)
+
+    def flows(self, tol=1e-9):
+        """
+        以稀疏矩阵形式读取第二阶段运输量q，不分配 NS*AS*IS*IS 的稠密数组。
+
+        参数:
+        tol: 绝对值不超过tol的运输量视为0。
+
+        返回:
+        scipy.sparse.csr_matrix，形状为 (NS, AS*IS*IS)，第s行第 (a*IS + i)*IS + j 列为场景s中物资a从i运往j的运输量。
+        """
+        q = self.values('q')
+        NS = q.shape[0]
+        AS, IS = self.form.cols['y'][1]
+        rows, arcs = np.nonzero(np.abs(q) > tol)
+        cols = np.ravel_multi_index(self.form.arcs, (AS, IS, IS))[arcs]
+        return sp.coo_matrix((q[rows, arcs], (rows, cols)), shape=(NS, AS * IS * IS)).tocsr()
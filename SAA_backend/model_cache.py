@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Model cache.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为模型缓存模块，将构建好的模型以压缩的MPS文件保存在磁盘上，以输入数据与建模选项的哈希值为键，
+再次求解相同的模型时直接用gp.read读取，缓存目录按最近使用时间淘汰，总大小有上限
+"""
+import os
+import time
+import pickle
+import hashlib
+import logging
+import gurobipy as gp
+from plugins import dataset_fingerprint
+from model_builder import SAAGurobiModel
+
+# 默认缓存目录
+MODEL_CACHE_DIR = 'model_cache'
+
+# 可用的模型文件格式，Gurobi按后缀选择压缩方式
+MODEL_CACHE_FORMATS = ('mps.bz2', 'mps.gz', 'mps')
+
+class ModelCache:
+    """
+    功能: 模型文件缓存。每个键对应一个模型文件与一个布局文件（SAAModelForm.layout，用于恢复变量块与约束块的句柄），
+          命中时更新文件的修改时间，写入新模型后按修改时间从旧到新删除，直到缓存目录的总大小不超过max_bytes。
+    方法:
+    key(name, arrays, options): 由输入数组与建模选项计算缓存键。
+    load(key, env): 读取缓存的模型，未命中时返回None。
+    store(key, handle): 保存模型并淘汰最久未使用的缓存。
+    """
+    def __init__(self, directory=MODEL_CACHE_DIR, max_bytes=2 * 1024 ** 3, file_format='mps.bz2'):
+        if file_format not in MODEL_CACHE_FORMATS:
+            raise ValueError(f'未知的模型文件格式: {file_format}')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(name, arrays, options):
+        """
+        参数:
+        name: 模型名称，例如 "two-stage_SP"。
+        arrays: 输入数组列表，例如成本参数、需求数据与场景概率。
+        options: 影响模型结构的其他选项（规模、formulation、recourse_integrality、保留的运输弧等），值须可用repr表示。
+
+        返回:
+        缓存键，输入数组与选项完全相同时键相同。
+        """
+        digest = hashlib.sha256(dataset_fingerprint(*arrays).encode())
+        digest.update(repr(sorted(options.items())).encode())
+        return f'{name}_{digest.hexdigest()[:24]}'
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return f'{base}.{self.file_format}', f'{base}.layout.pkl'
+
+    def load(self, key, env=None):
+        """
+        返回:
+        SAAGurobiModel对象，未命中时返回None。
+        """
+        model_path, layout_path = self._paths(key)
+        if not (os.path.exists(model_path) and os.path.exists(layout_path)):
+            self.misses += 1
+            return None
+        tic = time.perf_counter()
+        with open(layout_path, 'rb') as file:
+            layout = pickle.load(file)
+        model = gp.read(model_path, env) if env is not None else gp.read(model_path)
+        handle = SAAGurobiModel(layout, model.ModelName, model=model)
+        now = time.time()
+        os.utime(model_path, (now, now))
+        os.utime(layout_path, (now, now))
+        self.hits += 1
+        read_time = time.perf_counter() - tic
+        print(f'Model cache hit: {key}, read in {read_time} seconds')
+        logging.info(f'Model cache hit: {key}, read in {read_time} seconds')
+        return handle
+
+    def store(self, key, handle):
+        """
+        保存模型与布局，先写入临时文件再替换，避免其他进程读到不完整的文件。
+
+        参数:
+        key: 缓存键。
+        handle: SAAGurobiModel对象。
+        """
+        model_path, layout_path = self._paths(key)
+        # Gurobi按后缀确定文件格式，临时文件保留原后缀
+        tmp_model_path = os.path.join(self.directory, f'{key}.tmp{os.getpid()}.{self.file_format}')
+        tmp_layout_path = f'{layout_path}.tmp{os.getpid()}'
+        handle.model.update()
+        handle.model.write(tmp_model_path)
+        with open(tmp_layout_path, 'wb') as file:
+            pickle.dump(handle.form.layout(), file)
+        os.replace(tmp_model_path, model_path)
+        os.replace(tmp_layout_path, layout_path)
+        self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """
+        按最近使用时间淘汰缓存，直到总大小不超过max_bytes，keep对应的缓存不会被删除。
+        """
+        entries = {}
+        for file_name in os.listdir(self.directory):
+            if '.tmp' in file_name:
+                continue
+            path = os.path.join(self.directory, file_name)
+            key = file_name.split('.', 1)[0]
+            size, mtime = entries.get(key, (0, 0.0))
+            stat = os.stat(path)
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+            print(f'Model cache evicted: {key}')
+            logging.info(f'Model cache evicted: {key}')
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Out-of-sample evaluation.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为样本外评估模块，从磁盘或Redis按固定大小分块读取大规模的独立场景集，逐块计算各候选解的第二阶段成本，
+增量累计期望成本、方差与成本构成，内存占用只取决于块大小而与场景总数无关
+"""
+import json
+import logging
+import numpy as np
+from scipy import stats
+from recourse_evaluator import solve_recourse
+from plugins import demand_to_scenarios
+
+# Redis中保存样本外场景的默认键
+OUT_OF_SAMPLE_KEY = 'holdout_demand_raw'
+
+class NpyScenarioSource:
+    """
+    功能: 以内存映射方式分块读取.npy文件中的场景，文件内容为原始需求 (n, IS) 或需求数据D (n, AS, IS)。
+    方法:
+    chunks(chunk_size): 依次返回各块的数组。
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def chunks(self, chunk_size):
+        data = np.load(self.path, mmap_mode='r')
+        for start in range(0, len(data), chunk_size):
+            yield np.array(data[start:start + chunk_size], dtype=float)
+
+class RedisScenarioSource:
+    """
+    功能: 分块读取Redis列表中的原始需求，列表的每个元素为一个场景的JSON数组（见store_out_of_sample_to_redis）。
+    方法:
+    chunks(chunk_size): 依次返回各块的数组。
+    """
+    def __init__(self, key=OUT_OF_SAMPLE_KEY, host='localhost', port=6379, db=0):
+        self.key = key
+        self.host, self.port, self.db = host, port, db
+
+    def chunks(self, chunk_size):
+        import redis
+        r = redis.Redis(host=self.host, port=self.port, db=self.db, decode_responses=True)
+        length = r.llen(self.key)
+        for start in range(0, length, chunk_size):
+            yield np.array([json.loads(row) for row in r.lrange(self.key, start, start + chunk_size - 1)], dtype=float)
+
+def store_out_of_sample_to_redis(demand_raw, key=OUT_OF_SAMPLE_KEY, chunk_size=10000, host='localhost', port=6379, db=0):
+    """
+    将原始需求按场景写入Redis列表，已有的同名列表会被覆盖。demand_raw可以是数组或按块返回数组的迭代器。
+    """
+    import redis
+    r = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+    r.delete(key)
+    chunks = [demand_raw] if isinstance(demand_raw, np.ndarray) else demand_raw
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        for start in range(0, len(chunk), chunk_size):
+            r.rpush(key, *[json.dumps(row) for row in chunk[start:start + chunk_size].tolist()])
+    print(f"Out-of-sample scenarios stored in Redis ({r.llen(key)} scenarios)")
+
+def scenario_source(source):
+    """
+    参数:
+    source: .npy文件路径、'redis'，或提供chunks(chunk_size)方法的对象。
+
+    返回:
+    场景来源对象。
+    """
+    if hasattr(source, 'chunks'):
+        return source
+    if source == 'redis':
+        return RedisScenarioSource()
+    if isinstance(source, str) and source.endswith('.npy'):
+        return NpyScenarioSource(source)
+    raise ValueError(f'未知的样本外场景来源: {source}')
+
+class RunningMoments:
+    """
+    功能: 增量累计均值与离差平方和，每块合并一次（Chan等人的并行合并公式），数值上与一次性计算一致。
+    方法:
+    update(values): 合并一块数据，values形状为 (n_candidates, n)。
+    variance(): 样本方差。
+    """
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def update(self, values):
+        n = values.shape[1]
+        if n == 0:
+            return
+        mean = values.mean(axis=1)
+        m2 = ((values - mean[:, None]) ** 2).sum(axis=1)
+        delta = mean - self.mean
+        total = self.count + n
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.full_like(self.m2, np.inf)
+
+def evaluate_out_of_sample(IS, AS, CF, CP, CH, PU, CT, H, source, xx, yy, Food, Medicine, chunk_size=10000, arcs=None, confidence=0.95):
+    """
+    在样本外场景上评估一组候选解，场景等概率。
+
+    参数:
+    IS, AS: 城市与资源种类的数量。
+    CF, CP, CH, PU, CT, H: 成本参数与距离矩阵。
+    source: 场景来源，见scenario_source。
+    xx: 候选设施选址，形状为 (IS, LS, MS)。
+    yy: 候选库存，形状为 (AS, IS, MS)。
+    Food, Medicine: 原始需求转换为需求数据时使用的比例系数。
+    chunk_size: 每块的场景数量，每块的内存占用约为 chunk_size * AS * IS * IS * 8 字节。
+    arcs: 保留的运输弧。
+    confidence: 置信水平。
+
+    返回:
+    字典，键为 f、fc、pc、tc、hc、wc（形状均为 (MS,)，含义同renew的返回值）、half_width（期望成本的双侧t区间半宽）、variance（总成本的样本方差）与n（场景数量）。
+    """
+    source = scenario_source(source)
+    MS = xx.shape[2]
+    Vfc = np.einsum('l,ilm->m', np.asarray(CF, dtype=float), xx)
+    Vpc = np.einsum('a,aim->m', np.asarray(CP, dtype=float), yy)
+    moments = RunningMoments(MS)
+    breakdown = {'tc': RunningMoments(MS), 'hc': RunningMoments(MS), 'wc': RunningMoments(MS)}
+
+    for chunk in source.chunks(chunk_size):
+        D_chunk = chunk if chunk.ndim == 3 else demand_to_scenarios(chunk, AS, Food, Medicine)
+        n = len(D_chunk)
+        chunk_costs = {name: np.zeros((MS, n)) for name in breakdown}
+        for m in range(MS):
+            costs = solve_recourse(IS, AS, n, CH, PU, CT, H, D_chunk, yy[:, :, m], arcs)
+            for name in breakdown:
+                chunk_costs[name][m] = costs[name]
+        for name in breakdown:
+            breakdown[name].update(chunk_costs[name])
+        moments.update(Vfc[:, None] + Vpc[:, None] + chunk_costs['tc'] + chunk_costs['hc'] + chunk_costs['wc'])
+        print(f"Out-of-sample evaluation: {moments.count} scenarios")
+
+    half_width = stats.t.ppf(0.5 + confidence / 2, max(moments.count - 1, 1)) * np.sqrt(moments.variance() / max(moments.count, 1))
+    return {'f': moments.mean, 'fc': Vfc, 'pc': Vpc, 'tc': breakdown['tc'].mean, 'hc': breakdown['hc'].mean, 'wc': breakdown['wc'].mean,
+            'half_width': half_width, 'variance': moments.variance(), 'n': moments.count}
+
+def report_out_of_sample(result, confidence=0.95, labels=None):
+    """
+    打印并记录各候选解的样本外评估结果，labels为各候选解的编号，默认为0, 1, ...。
+    """
+    labels = range(len(result['f'])) if labels is None else labels
+    for m, label in enumerate(labels):
+        message = (f"Out-of-sample candidate {label}: cost {result['f'][m]} +/- {result['half_width'][m]} ({confidence * 100} %), "
+                   f"fc {result['fc'][m]}, pc {result['pc'][m]}, tc {result['tc'][m]}, hc {result['hc'][m]}, wc {result['wc'][m]}, "
+                   f"{result['n']} scenarios")
+        print(message)
+        logging.info(message)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Parallel executor.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为多进程并行执行模块，将互相独立的样本组求解与候选解评估分配到多个进程，并在进程数与Gurobi线程数之间分配CPU核心
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import gurobipy as gp
+from env_pool import env_pool
+
+def plan_workers(n_tasks, workers=None, cores=None):
+    """
+    在进程数与每个模型的Gurobi线程数之间分配CPU核心。
+
+    参数:
+    n_tasks: 任务数量。
+    workers: 期望的进程数，默认与核心数相同。
+    cores: 可用的CPU核心数，默认为本机核心数。
+
+    返回:
+    元组 (workers, threads)，进程数不超过任务数与核心数，每个进程的Gurobi线程数为 cores // workers。
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(min(workers or cores, n_tasks, cores), 1)
+    threads = max(cores // workers, 1)
+    return workers, threads
+
+def _init_worker(threads):
+    """
+    进程初始化：设置该进程中所有Gurobi模型默认使用的线程数，环境池中的环境在进程内首次使用时按该线程数启动，每个进程一个。
+    """
+    gp.setParam('Threads', threads)
+    env_pool().threads = threads
+
+def create_executor(n_tasks, workers=None, cores=None, threads=None):
+    """
+    创建进程池，可在多次run_parallel之间复用，迭代算法无需每轮重新启动子进程与Gurobi环境。
+
+    参数:
+    n_tasks: 每次提交的任务数量，进程数不超过该值。
+    workers: 期望的进程数。
+    cores: 可用的CPU核心数。
+    threads: 每个进程的Gurobi线程数，默认为 cores // workers。
+
+    返回:
+    ProcessPoolExecutor对象，用完后由调用者关闭。
+    """
+    workers, planned = plan_workers(n_tasks, workers, cores)
+    threads = threads or planned
+    print(f'Starting {workers} processes with {threads} Gurobi threads each ...\n')
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,))
+
+def run_parallel(func, tasks, workers=None, cores=None, threads=None, executor=None):
+    """
+    使用ProcessPoolExecutor并行执行一组任务，结果顺序与任务顺序一致。
+
+    参数:
+    func: 模块级函数，例如getsol或renew。
+    tasks: 参数元组列表，每个元组为一次调用func的位置参数。
+    workers: 期望的进程数。
+    cores: 可用的CPU核心数。
+    threads: 每个进程的Gurobi线程数，默认为 cores // workers。
+    executor: 已创建的进程池（见create_executor），给定时忽略workers、cores与threads，执行后不关闭。
+
+    返回:
+    func返回值的列表。
+
+    功能:
+    随机抽样全部在主进程中完成，子进程只负责求解，因此在给定随机种子时输出与顺序执行一致。
+    Gurobi在线程数相同时结果是确定的，顺序执行需使用相同的Threads（见SolvePolicy的threads）才能保证逐位一致。
+    """
+    print(f'Running {len(tasks)} tasks ...\n')
+    if executor is not None:
+        return list(executor.map(func, *zip(*tasks)))
+    with create_executor(len(tasks), workers, cores, threads) as executor:
+        return list(executor.map(func, *zip(*tasks)))
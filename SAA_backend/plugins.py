@@ -21,6 +21,7 @@ import matplotlib.pyplot as plt
 import redis
 import json
 import pickle
+import hashlib
 
 
 """
@@ -186,6 +187,31 @@ def store_data_to_redis(filename, IS, Raw_data_flag):
 
 #     return CF, U, H, V, CP, CH, PU, CT, D, pr, demand
 
+# 需求系数，原始需求乘以该系数并取整得到各物资的需求
+DEMAND_INDEX = 0.03
+
+def demand_to_scenarios(demand_raw, AS, Food, Medicine, demand_index=DEMAND_INDEX):
+    """
+    将原始需求转换为需求数据D，Redis、Excel、样本外场景与随机生成的算例共用这一处理。
+
+    参数:
+    demand_raw: 原始需求，形状为 (n, IS)。
+    AS: 资源种类的数量，须为3（通用物资、食品类与药品类）。
+    Food, Medicine: 食品类与药品类资源的比例系数。
+    demand_index: 需求系数。
+
+    返回:
+    需求数据D，形状为 (n, AS, IS)。
+    """
+    if AS != 3:
+        raise ValueError(f'未知的资源种类数量: {AS}')
+    demand_raw = np.asarray(demand_raw, dtype=float)
+    Dr = np.empty(demand_raw.shape + (AS,))
+    Dr[:, :, 0] = demand_raw
+    Dr[:, :, 1] = np.rint(demand_raw * Food)
+    Dr[:, :, 2] = np.rint(demand_raw * Medicine)
+    return np.rint(Dr * demand_index).transpose(0, 2, 1)
+
 # Redis读取接口2
 def read_data_from_redis(IS, NS, AS, Food, Medicine):
     # 连接到Redis
@@ -203,18 +229,11 @@ def read_data_from_redis(IS, NS, AS, Food, Medicine):
     demand_raw = json.loads(r.get('demand_raw'))
 
     # 数据处理
-    demand_index = 0.03
     pr = np.full(NS, 1/NS)
 
     demand_raw = np.array(demand_raw)[:NS, :IS]
-    demand = np.rint(demand_raw * demand_index)
-    
-    Dr = np.empty((NS, IS, AS))
-    Dr[:, :, 0] = demand_raw
-    Dr[:, :, 1] = np.rint(demand_raw * Food)
-    Dr[:, :, 2] = np.rint(demand_raw * Medicine)
-
-    D = np.rint(Dr * demand_index).transpose(0, 2, 1)
+    demand = np.rint(demand_raw * DEMAND_INDEX)
+    D = demand_to_scenarios(demand_raw, AS, Food, Medicine)
 
     return CF, U, np.array(H)[:IS, :IS], V, CP, CH, PU, CT, D, pr, demand
 
@@ -271,7 +290,6 @@ def read_data(filename, IS, NS, AS, Food, Medicine, Raw_data_flag):
     :return: 返回处理后的参数和数据数组，包括固定成本、存储容量、距离矩阵等。
     """
     # 这个部分的数据处理主要用于保证示例数据计算结果与论文所示相同，随机生成的算例不受影响
-    demand_index = 0.03
     if Raw_data_flag:
         if IS <= 20:
             scenario_sheet_name = f'scenario_20'
@@ -294,12 +312,9 @@ def read_data(filename, IS, NS, AS, Food, Medicine, Raw_data_flag):
 
     # demand
     demand_raw = scenario_data.iloc[:NS, 1:IS + 1].to_numpy()
-    demand = np.rint(demand_raw * demand_index)
+    demand = np.rint(demand_raw * DEMAND_INDEX)
     # print(demand)
-    Dr = np.empty((NS, IS, AS))
-    Dr[:, :, 0] = demand_raw
-    Dr[:, :, 1] = np.rint((demand_raw * Food))
-    Dr[:, :, 2] = np.rint((demand_raw * Medicine))
+    D = demand_to_scenarios(demand_raw, AS, Food, Medicine)
 
     # Fixed cost, Storage capacity, volume of items
     CF = facility_cost_data.loc[1, 1:3].to_numpy()
@@ -319,9 +334,6 @@ def read_data(filename, IS, NS, AS, Food, Medicine, Raw_data_flag):
     # Unit penalty cost
     PU = resource_cost_data.loc[5, 1:3].to_numpy()
 
-    D = np.rint(Dr * demand_index).transpose(0, 2, 1)
-    
-    
     # print(CF, U, PU, V, CP, CH, G, CT, D, pr, demand)
 
     return CF, U, H, V, CP, CH, PU, CT, D, pr, demand
@@ -762,6 +774,24 @@ def generate_sample_plots(demand_transformed, samples_info, cluster_labels, Grap
         else:
             raise ValueError("Invalid plot_type: {}. Choose '2d' or '3d'.".format(graph_type))
 
+def dataset_fingerprint(*arrays):
+    """
+    计算一组数据的指纹，用于标识数据集。
+
+    参数说明：
+
+    arrays: 任意数量的数组或列表，例如成本参数与需求数据。
+
+    返回值：
+    长度为16的十六进制字符串，数据的形状与取值完全相同时指纹相同。
+    """
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(np.asarray(array, dtype=float))
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
 def calculate_gap(ff, MS, gurobi_opt):
     """ 
     计算和返回GAP百分比，用来评估模型的优化效果。
@@ -820,8 +850,8 @@ def save_and_print_results(script_name, Output_file, Vx, Vy, IS, NS, MS, SS_SAA,
     details_sheet_name = f'details_IS_{IS}_NS_{NS}'
 
     # 创建一个DataFrame来组织需要输出的数据
-    result_df = pd.DataFrame([[script_name, IS, NS, MS, SS_SAA, float(opt_f), elapsed_time, cluster_num, gap]])
-    detail_df = pd.DataFrame([[script_name, IS, NS, MS, SS_SAA, float(opt_f), elapsed_time, gap]])
+    result_df = pd.DataFrame([[script_name, IS, NS, MS, SS_SAA, float(np.ravel(opt_f)[0]), elapsed_time, cluster_num, gap]])
+    detail_df = pd.DataFrame([[script_name, IS, NS, MS, SS_SAA, float(np.ravel(opt_f)[0]), elapsed_time, gap]])
 
     # 将数据输出到Excel的特定列，只有一列
     append_df_to_excel(Output_file, result_df, sheet_name=results_sheet_name, index=False, header=False, startrow=0)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Progress events.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为求解进度事件模块，通过Gurobi的MIPNODE与MIPSOL回调读取当前最好解、下界、gap、节点数与求解时间，
+按方法组合、样本组序号与求解阶段标记后发布到进程内的事件总线，前端通过/ws/progress接收结构化的进度，无需解析日志
+"""
+import time
+import queue
+import threading
+import contextvars
+from contextlib import contextmanager
+from gurobipy import GRB
+
+class ProgressBus:
+    """
+    功能: 进程内的求解进度事件总线，每个订阅者一个有界队列，队列已满时丢弃最早的事件，求解过程不会因订阅者读取缓慢而阻塞。
+    方法:
+    subscribe(maxsize): 订阅事件，返回事件队列。
+    unsubscribe(events): 取消订阅。
+    active(): 是否有订阅者，没有订阅者时求解不挂接回调。
+    tag(**tags): 上下文管理器，在其中发布的事件带有给定的标记；标记保存在ContextVar中，并发的求解线程互不影响。
+    publish(event): 发布事件。
+    """
+    def __init__(self):
+        self.subscribers = []
+        self.tags = contextvars.ContextVar('progress_tags', default={})
+        self.lock = threading.Lock()
+
+    def subscribe(self, maxsize=1000):
+        events = queue.Queue(maxsize)
+        with self.lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+
+    def active(self):
+        return bool(self.subscribers)
+
+    @contextmanager
+    def tag(self, **tags):
+        token = self.tags.set({**self.tags.get(), **tags})
+        try:
+            yield
+        finally:
+            self.tags.reset(token)
+
+    def publish(self, event):
+        event = {**self.tags.get(), **event}
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            while True:
+                try:
+                    events.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        pass
+
+_BUS = None
+
+def progress_bus():
+    """
+    返回当前进程的事件总线。并行求解的子进程没有订阅者，不发布事件。
+    """
+    global _BUS
+    if _BUS is None:
+        _BUS = ProgressBus()
+    return _BUS
+
+def _finite(value):
+    # 没有可行解时Gurobi返回GRB.INFINITY，转换为None以便序列化为JSON
+    value = float(value)
+    return value if abs(value) < GRB.INFINITY else None
+
+def _gap(incumbent, bound):
+    if incumbent is None or bound is None:
+        return None
+    return abs(incumbent - bound) / max(abs(incumbent), 1e-10) * 100
+
+class ProgressCallback:
+    """
+    功能: Gurobi回调，发布求解进度事件。MIPNODE事件按interval秒节流，找到新的可行解（MIPSOL）时立即发布。
+    方法:
+    start(model): 发布求解开始事件。
+    finish(model): 发布求解结束事件，包括最终的目标值、下界、gap、节点数与求解时间。
+    """
+    def __init__(self, stage, bus=None, interval=0.5, inner=None):
+        """
+        参数:
+        stage: 求解阶段，'replication'、'evaluation'或'exact'。
+        bus: 事件总线，默认为progress_bus()。
+        interval: MIPNODE事件的最小发布间隔（秒）。
+        inner: 同时调用的其他回调，例如warm_start.IncumbentTimer。
+        """
+        self.stage = stage
+        self.bus = bus or progress_bus()
+        self.interval = interval
+        self.inner = inner
+        self.last = -float('inf')
+        self.name = None
+
+    def _publish(self, kind, **values):
+        self.bus.publish({'event': kind, 'stage': self.stage, 'model': self.name, 'time': time.time(), **values})
+
+    def start(self, model):
+        self.name = getattr(model, 'ModelName', None)
+        self._publish('start')
+
+    def __call__(self, model, where):
+        if self.inner is not None:
+            self.inner(model, where)
+        if where == GRB.Callback.MIPSOL:
+            # MIPSOL_OBJBST不包括当前找到的解
+            incumbent = _finite(min(model.cbGet(GRB.Callback.MIPSOL_OBJ), model.cbGet(GRB.Callback.MIPSOL_OBJBST)))
+            bound = _finite(model.cbGet(GRB.Callback.MIPSOL_OBJBND))
+            nodes = model.cbGet(GRB.Callback.MIPSOL_NODCNT)
+            kind = 'incumbent'
+        elif where == GRB.Callback.MIPNODE:
+            runtime = model.cbGet(GRB.Callback.RUNTIME)
+            if runtime - self.last < self.interval:
+                return
+            incumbent = _finite(model.cbGet(GRB.Callback.MIPNODE_OBJBST))
+            bound = _finite(model.cbGet(GRB.Callback.MIPNODE_OBJBND))
+            nodes = model.cbGet(GRB.Callback.MIPNODE_NODCNT)
+            kind = 'progress'
+        else:
+            return
+        runtime = model.cbGet(GRB.Callback.RUNTIME)
+        self.last = runtime
+        self._publish(kind, incumbent=incumbent, bound=bound, gap=_gap(incumbent, bound), nodes=float(nodes), elapsed=runtime)
+
+    def finish(self, model):
+        incumbent = _finite(model.ObjVal) if model.SolCount > 0 else None
+        bound = incumbent
+        if incumbent is not None and getattr(model, 'IsMIP', True):
+            bound = _finite(model.ObjBound)
+        self._publish('finish', status=int(model.status), incumbent=incumbent, bound=bound, gap=_gap(incumbent, bound),
+                      nodes=float(getattr(model, 'NodeCount', 0)), elapsed=float(model.Runtime))
+
+def optimize_with_progress(handle, stage, callback=None, interval=0.5):
+    """
+    求解模型，有订阅者时挂接ProgressCallback并发布开始与结束事件，没有订阅者时与handle.optimize(callback=callback)相同。
+
+    参数:
+    handle: SAAGurobiModel或HighsSAAModel对象，HiGHS后端忽略回调，只发布开始与结束事件。
+    stage: 求解阶段。
+    callback: 同时调用的其他回调。
+    interval: MIPNODE事件的最小发布间隔（秒）。
+    """
+    bus = progress_bus()
+    if not bus.active():
+        handle.optimize(callback=callback)
+        return
+    progress = ProgressCallback(stage, bus, interval, callback)
+    progress.start(handle.model)
+    handle.optimize(callback=progress)
+    progress.finish(handle.model)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Progressive hedging.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为两阶段随机规划的渐进对冲(Progressive Hedging)求解模块，按场景组分解并在多个进程中求解，通过惩罚项使各场景组的x、y趋于一致
+"""
+import time
+import logging
+import numpy as np
+from gurobipy import GRB, GurobiError
+from plugins import read_data_from_redis, save_and_print_results
+from model_builder import build_saa_form
+from env_pool import create_pooled_model
+from recourse_evaluator import evaluate_candidate
+from parallel_executor import run_parallel, create_executor
+from solve_policy import SolvePolicy
+
+def solve_bundle(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_b, pr_b, w_x, w_y, x_bar, y_bar, rho_x, rho_y, log_filename, recourse_integrality='auto', policy=None):
+    """
+    求解一个场景组的渐进对冲子问题，供子进程调用，模型在函数内构建与释放，内存只与场景组大小有关。
+
+    参数:
+    IS, AS, LS, CF, U, V, H, CP, CH, PU, CT: 问题规模与成本参数。
+    D_b: 场景组的需求数据，形状为 (B, AS, IS)。
+    pr_b: 场景组内的条件概率，和为1。
+    w_x, w_y: 该场景组的乘子，为None时只求解场景组本身的SAA模型。
+    x_bar, y_bar: 当前的一致解。
+    rho_x, rho_y: 惩罚系数，形状分别与x、y相同；为None时求解只含乘子项的拉格朗日子问题。
+    log_filename: 日志文件名。
+    recourse_integrality: 第二阶段变量的整数性选项。
+    policy: SolvePolicy对象，给定时按其'exact'阶段设置子问题的求解参数。
+
+    返回:
+    元组 (lower, Vx, Vy, Vf)。lower为 min f + w·(x, y) 的下界（ObjBound），求解带惩罚项的子问题时为None；
+    Vx、Vy为子问题的解，Vf为该解在场景组上的期望成本。每次调用只求解一次MIP。
+    """
+    form = build_saa_form(IS, AS, LS, len(D_b), CF, U, V, H, CP, CH, PU, CT, D_b, pr_b, recourse_integrality=recourse_integrality)
+    # 在子进程的共享Gurobi环境上创建模型
+    handle = create_pooled_model(form, "ph_bundle", 'gurobi', log_filename, 'ph')
+    m = handle.model
+    try:
+        if policy is not None:
+            policy.apply(m, 'exact')
+        m.setParam('OutputFlag', 0)
+        x, y, f = handle.vars['x'], handle.vars['y'], handle.vars['f']
+
+        objective = f.sum()
+        if w_x is not None:
+            # 只含乘子项时，各场景组的下界按概率加权即为拉格朗日下界（乘子按概率加权的和为0）
+            objective = objective + (w_x * x).sum() + (w_y * y).sum()
+        if rho_x is not None:
+            # x为0-1变量，(x - x_bar)^2 = x * (1 - 2 * x_bar) + x_bar^2，惩罚项中只有y部分是二次的
+            objective = (objective + (0.5 * rho_x * (1 - 2 * x_bar) * x).sum() + float(np.sum(0.5 * rho_x * x_bar ** 2))
+                         + (0.5 * rho_y * (y - y_bar) * (y - y_bar)).sum())
+        m.setObjective(objective, GRB.MINIMIZE)
+        handle.optimize()
+        if m.SolCount == 0:
+            raise GurobiError(m.status, 'Progressive hedging bundle is not solved')
+        lower = m.ObjBound if rho_x is None else None
+
+        Vx, Vy, Vf = np.round(handle.values('x')), np.round(handle.values('y')), float(handle.values('f')[0])
+    finally:
+        m.dispose()
+    return lower, Vx, Vy, Vf
+
+class ProgressiveHedgingSolver:
+    """
+    功能: 渐进对冲算法。场景按bundle_size分组，每轮在多个进程中并行求解各场景组的子问题，
+          用概率加权平均得到一致解，并按 w += rho * (x_b - x_bar) 更新乘子；一致性残差下降不足时放大惩罚系数。
+          每轮每个场景组只求解一次带惩罚项的子问题；每隔bound_interval轮以及迭代结束时，用当前乘子求解只含乘子项的
+          拉格朗日子问题更新下界，其解也作为候选解。结束后用recourse_evaluator在全部场景上评估候选解，取最好的作为上界。
+          子进程的进程池在solve()中只创建一次，各轮迭代共用。
+    方法:
+    solve(): 迭代求解并返回 (Vf, Vx, Vy)。
+    """
+    def __init__(self, IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, bundle_size=10, rho_factor=0.1,
+                 rho_growth=1.5, max_iterations=50, tol=1e-3, workers=None, recourse_integrality='auto', policy=None, bound_interval=5):
+        self.IS, self.AS, self.LS, self.NS = IS, AS, LS, NS
+        self.costs = (CF, U, V, H, CP, CH, PU, CT)
+        self.D = np.asarray(D, dtype=float)[:NS]
+        self.pr = np.asarray(pr, dtype=float)[:NS]
+        self.log_filename = log_filename
+        self.rho_growth = rho_growth
+        self.max_iterations = max_iterations
+        self.tol = tol
+        self.workers = workers
+        self.recourse_integrality = recourse_integrality
+        self.policy = policy or SolvePolicy()
+        self.bound_interval = bound_interval
+        self.executor = None
+
+        # 场景组及其概率
+        self.bundles = [np.arange(start, min(start + bundle_size, NS)) for start in range(0, NS, bundle_size)]
+        self.p_bundle = np.array([self.pr[b].sum() for b in self.bundles])
+
+        # 与成本成比例的惩罚系数，第0轮后按变量的偏差缩放
+        self.rho_x = rho_factor * np.broadcast_to(np.asarray(CF, dtype=float)[None, :], (IS, LS)).copy()
+        self.rho_y = rho_factor * np.broadcast_to(np.asarray(CP, dtype=float)[:, None], (AS, IS)).copy()
+        self.history = []
+
+    def _solve_bundles(self, w_x, w_y, x_bar, y_bar, proximal=True):
+        tasks = []
+        for k, bundle in enumerate(self.bundles):
+            tasks.append((self.IS, self.AS, self.LS, *self.costs, self.D[bundle], self.pr[bundle] / self.p_bundle[k],
+                          None if w_x is None else w_x[k], None if w_y is None else w_y[k], x_bar, y_bar,
+                          self.rho_x if proximal else None, self.rho_y if proximal else None,
+                          self.log_filename, self.recourse_integrality, self.policy))
+        return run_parallel(solve_bundle, tasks, executor=self.executor)
+
+    def _lagrangian_bound(self, w_x, w_y, candidates):
+        """
+        用当前乘子求解各场景组的拉格朗日子问题，返回按概率加权的下界，子问题的解加入候选解。
+        """
+        results = self._solve_bundles(w_x, w_y, None, None, proximal=False)
+        lower, xs, ys, _ = (np.array(r) for r in zip(*results))
+        candidates.extend(zip(xs, ys))
+        return float(self.p_bundle @ lower)
+
+    def solve(self):
+        """
+        返回:
+        元组 (Vf, Vx, Vy)，Vf为候选解在全部场景上的期望成本。
+        """
+        tic = time.perf_counter()
+        self.executor = create_executor(len(self.bundles), self.workers, threads=self.policy.threads)
+        try:
+            return self._iterate(tic)
+        finally:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _iterate(self, tic):
+        # 第0轮：不含惩罚项，各场景组下界的加权和即为下界
+        results = self._solve_bundles(None, None, None, None, proximal=False)
+        lower, xs, ys, _ = (np.array(r) for r in zip(*results))
+        lower_bound = float(self.p_bundle @ lower)
+        x_bar = np.tensordot(self.p_bundle, xs, axes=1)
+        y_bar = np.tensordot(self.p_bundle, ys, axes=1)
+        # 按第0轮各变量在场景组间的平均偏差缩放惩罚系数，库存y的偏差可达数百件，不缩放时乘子远大于单位成本，拉格朗日下界失去意义
+        self.rho_x = self.rho_x / np.maximum(1, np.tensordot(self.p_bundle, np.abs(xs - x_bar), axes=1))
+        self.rho_y = self.rho_y / np.maximum(1, np.tensordot(self.p_bundle, np.abs(ys - y_bar), axes=1))
+        w_x = self.rho_x * (xs - x_bar)
+        w_y = self.rho_y * (ys - y_bar)
+        residual = float(self.p_bundle @ (np.abs(xs - x_bar).sum(axis=(1, 2)) + np.abs(ys - y_bar).sum(axis=(1, 2))))
+        self._report(0, lower_bound, residual, tic)
+        candidates = list(zip(xs, ys))
+
+        # 当前乘子的拉格朗日下界是否已计算，第0轮的下界对应乘子为0
+        bounded = True
+        for iteration in range(1, self.max_iterations + 1):
+            if residual <= self.tol:
+                break
+            results = self._solve_bundles(w_x, w_y, x_bar, y_bar)
+            _, xs, ys, _ = (np.array(r) for r in zip(*results))
+            x_bar = np.tensordot(self.p_bundle, xs, axes=1)
+            y_bar = np.tensordot(self.p_bundle, ys, axes=1)
+            w_x = w_x + self.rho_x * (xs - x_bar)
+            w_y = w_y + self.rho_y * (ys - y_bar)
+            bounded = False
+
+            previous, residual = residual, float(self.p_bundle @ (np.abs(xs - x_bar).sum(axis=(1, 2)) + np.abs(ys - y_bar).sum(axis=(1, 2))))
+            if residual > 0.5 * previous:
+                self.rho_x = self.rho_x * self.rho_growth
+                self.rho_y = self.rho_y * self.rho_growth
+            if self.bound_interval and iteration % self.bound_interval == 0:
+                lower_bound = max(lower_bound, self._lagrangian_bound(w_x, w_y, candidates))
+                bounded = True
+            self._report(iteration, lower_bound, residual, tic)
+            candidates.extend(zip(xs, ys))
+        if not bounded:
+            # 迭代结束时的乘子通常给出最好的下界
+            lower_bound = max(lower_bound, self._lagrangian_bound(w_x, w_y, candidates))
+
+        # 四舍五入的一致解满足Constraint (2)与Constraint (5)时也作为候选解
+        x_round, y_round = np.round(x_bar), np.round(y_bar)
+        V, U = np.asarray(self.costs[2], dtype=float), np.asarray(self.costs[1], dtype=float)
+        if np.all(x_round.sum(axis=1) <= 1) and np.all(V @ y_round <= x_round @ U + 1e-6):
+            candidates.append((x_round, y_round))
+
+        CF, U, V, H, CP, CH, PU, CT = self.costs
+        best = None
+        seen = set()
+        for Vx, Vy in candidates:
+            key = (Vx.tobytes(), Vy.tobytes())
+            if key in seen:
+                continue
+            seen.add(key)
+            Vf = evaluate_candidate(self.IS, self.AS, self.LS, self.NS, CF, CP, CH, PU, CT, H, self.D, self.pr, Vx, Vy)[0]
+            if best is None or Vf < best[0]:
+                best = (Vf, Vx, Vy)
+
+        self.lower_bound = lower_bound
+        print(f'Progressive hedging: upper bound {best[0]}, lower bound {lower_bound}')
+        logging.info(f'Progressive hedging: upper bound {best[0]}, lower bound {lower_bound}')
+        return best
+
+    def _report(self, iteration, lower_bound, residual, tic):
+        elapsed_time = time.perf_counter() - tic
+        self.history.append((iteration, lower_bound, residual, elapsed_time))
+        print(f'PH iteration {iteration}: lower bound {lower_bound}, residual {residual}, elapsed {elapsed_time} s')
+        logging.info(f'PH iteration {iteration}: lower bound {lower_bound}, residual {residual}, elapsed {elapsed_time} s')
+
+def ph_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index, bundle_size=10, workers=None, policy=None):
+    """
+    使用渐进对冲算法求解两阶段随机规划模型，参数与返回值同two_stage_sp_model。
+
+    参数:
+    bundle_size: 每个场景组的场景数量，子进程的内存占用只与其有关。
+    workers: 并行求解场景组的进程数。
+    policy: SolvePolicy对象，按其'exact'阶段设置场景组子问题的求解参数。
+    其余参数同two_stage_sp_model。
+
+    返回:
+    返回一个元组，包括最好候选解的期望成本、花费的时间、决策变量Vx和Vy。
+    """
+    # 配置日志以追加模式
+    logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s')
+    policy = policy or SolvePolicy()
+    attempt = 0
+    tic = time.perf_counter()
+    while attempt < max_attempts:
+        try:
+            print('define parameters ...\n')
+            CF, U, H, V, CP, CH, PU, CT, D, pr, demand = read_data_from_redis(IS_init, NS_init, AS_init, Food_index, Medicine_index)
+
+            print('solving ...\n')
+            ph = ProgressiveHedgingSolver(IS_init, AS_init, LS_init, NS_init, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, bundle_size, workers=workers, policy=policy)
+            Vf, Vx, Vy = ph.solve()
+
+            toc = time.perf_counter()
+            elapsed_time = toc - tic
+            gap = (Vf - ph.lower_bound) / Vf * 100
+
+            save_and_print_results('gurobi_PH', Output_file, Vx, Vy, IS_init, NS_init, 0, 0, Vf, elapsed_time, 0, gap)
+            # 打印结果
+            print(f"Method: gurobi_PH")
+            print(f"I: {IS_init}, S: {NS_init}")
+            print(f"Costs: {float(Vf)}, gap: {gap} %")
+            print(f"Elapsed time: {elapsed_time} seconds.")
+            print(f"Solve policy: {policy.describe()}")
+            # 记录结果
+            logging.info('--------------------------------------------')
+            logging.info(f"Method: gurobi_PH")
+            logging.info(f"I: {IS_init}, S: {NS_init}")
+            logging.info(f"Costs: {float(Vf)}, gap: {gap} %")
+            logging.info(f"Elapsed time: {elapsed_time} seconds.")
+            logging.info(f"Solve policy: {policy.describe()}")
+            logging.info('--------------------------------------------')
+
+            return Vf, elapsed_time, Vx, Vy.T
+
+        except GurobiError as e:
+            print('Error code ' + str(e.errno) + ": " + str(e))
+            logging.error('Error code ' + str(e.errno) + ": " + str(e))
+            print('Encountered a Gurobi error. Please check the Gurobi log for more details.')
+            attempt += 1
+
+    print(f"Try to find an optimal solution for {attempt} attempts.")
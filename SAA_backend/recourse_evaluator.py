@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Recourse evaluator.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为第二阶段成本评估模块，不依赖Gurobi许可证，基于NumPy批量最小费用流求解固定库存y下的运输问题
+"""
+import numpy as np
+from model_builder import transport_cost_tensor
+
+
+def transport_flows(profit, supply, demand, flow=None, tol=1e-9):
+    """
+    批量求解一组互相独立的运输问题 max sum(profit * q)，s.t. 行和不超过supply、列和不超过demand、q >= 0。
+
+    参数:
+    profit: 单位运输收益，形状为 (B, K, J)，不为正的弧视为不可用。
+    supply: 供应量，形状为 (B, K)。
+    demand: 需求量，形状为 (B, J)。
+    flow: 初始运输量，需对其自身的总运量是最优的（例如只分布在各问题收益最大的弧上），默认从零开始。
+    tol: 数值容差。
+
+    返回:
+    最优运输量q，形状为 (B, K, J)。
+
+    功能:
+    对全部B个问题同时执行逐次最短路(successive shortest path)最小费用流算法：每轮用向量化的Bellman-Ford
+    在残量网络上求源点到各需求点的最短路，沿费用为负的最短增广路推送瓶颈流量，直到所有问题都不存在负费用增广路。
+    供应量与需求量为整数时，得到的q也为整数，与整数规划的最优解一致。
+    """
+    B, K, J = profit.shape
+    cost_fwd = np.where(profit > tol, -profit, np.inf)
+    q = np.zeros((B, K, J)) if flow is None else np.array(flow, dtype=float)
+    rs = np.asarray(supply, dtype=float) - q.sum(axis=2)
+    rd = np.asarray(demand, dtype=float) - q.sum(axis=1)
+    active = np.flatnonzero((rs > tol).any(axis=1) & (rd > tol).any(axis=1))
+
+    while active.size:
+        n = active.size
+        qa = q[active]
+        cf = cost_fwd[active]
+        # 反向弧 j -> k 仅在已有流量时存在，费用为 +profit
+        cb = np.where(qa > tol, profit[active], np.inf)
+
+        # Bellman-Ford：du为到供应点的距离，dv为到需求点的距离，只在严格改进时更新前驱
+        du = np.where(rs[active] > tol, 0.0, np.inf)
+        dv = np.full((n, J), np.inf)
+        pred_u = np.full((n, K), -1)
+        pred_v = np.full((n, J), -1)
+        for _ in range(K + J + 1):
+            cand_v = du[:, :, None] + cf
+            arg_v = cand_v.argmin(axis=1)
+            best_v = np.take_along_axis(cand_v, arg_v[:, None, :], axis=1)[:, 0, :]
+            improve_v = best_v < dv - tol
+            pred_v = np.where(improve_v, arg_v, pred_v)
+            dv = np.where(improve_v, best_v, dv)
+
+            cand_u = dv[:, None, :] + cb
+            arg_u = cand_u.argmin(axis=2)
+            best_u = np.take_along_axis(cand_u, arg_u[:, :, None], axis=2)[:, :, 0]
+            improve_u = best_u < du - tol
+            if not improve_u.any():
+                break
+            pred_u = np.where(improve_u, arg_u, pred_u)
+            du = np.where(improve_u, best_u, du)
+
+        # 选择费用最小的可增广需求点，费用非负的问题已达到最优
+        target = np.where(rd[active] > tol, dv, np.inf)
+        j_end = target.argmin(axis=1)
+        augment = target[np.arange(n), j_end] < -tol
+        active, j_end = active[augment], j_end[augment]
+        if not active.size:
+            break
+        rows = np.flatnonzero(augment)
+
+        # 回溯增广路并计算瓶颈流量，路径为 源点 -> k -> j -> ... -> k -> j_end
+        delta = rd[active, j_end]
+        k_start = np.zeros(active.size, dtype=int)
+        path = []
+        j_cur = j_end
+        open_path = np.ones(active.size, dtype=bool)
+        while open_path.any():
+            k_cur = pred_v[rows, j_cur]
+            j_prev = pred_u[rows, k_cur]
+            from_source = open_path & (j_prev < 0)
+            backward = open_path & (j_prev >= 0)
+            path.append((open_path, k_cur, j_cur, j_prev))
+            delta = np.where(from_source, np.minimum(delta, rs[active, k_cur]), delta)
+            delta = np.where(backward, np.minimum(delta, q[active, k_cur, np.maximum(j_prev, 0)]), delta)
+            k_start = np.where(from_source, k_cur, k_start)
+            open_path = backward
+            j_cur = np.where(backward, j_prev, j_cur)
+
+        # 沿增广路推送流量：正向弧增加，反向弧减少
+        for on_path, k_cur, j_cur, j_prev in path:
+            q[active[on_path], k_cur[on_path], j_cur[on_path]] += delta[on_path]
+            back = on_path & (j_prev >= 0)
+            q[active[back], k_cur[back], j_prev[back]] -= delta[back]
+        rs[active, k_start] -= delta
+        rd[active, j_end] -= delta
+
+    return q
+
+def solve_recourse(IS, AS, NS, CH, PU, CT, H, D, new_y, arcs=None):
+    """
+    在库存固定为new_y时求解所有场景的第二阶段问题。
+
+    参数:
+    IS: 城市数量。
+    AS: 资源种类的数量。
+    NS: 场景数量。
+    CH: 持有成本。
+    PU: 缺货惩罚成本。
+    CT: 运输成本。
+    H: 距离矩阵。
+    D: 需求数据，形状为 (NS, AS, IS)。
+    new_y: 固定的库存决策，形状为 (AS, IS)。
+    arcs: 保留的运输弧，形状为 (AS, IS, IS) 的布尔数组，默认保留全部弧。
+
+    返回:
+    字典，包含各场景的运输成本tc、持有成本hc与缺货成本wc，形状均为 (NS,)。
+
+    功能:
+    y固定后，第二阶段按场景与物资分解为互不相关的运输问题。代入 z = y - sum(q)、w = D - sum(q) 后，
+    每个子问题等价于 max sum((CH[a] + PU[a] - CT[a]*H[i,j]) * q[i,j])，s.t. 运出量不超过y、运入量不超过D。
+    只保留有库存的供应点，先就地满足本地需求，再将 NS*AS 个子问题交给transport_flows批量求解。
+    """
+    CH = np.asarray(CH, dtype=float)
+    PU = np.asarray(PU, dtype=float)
+    D = np.asarray(D, dtype=float)[:NS]
+    new_y = np.asarray(new_y, dtype=float)
+    TC = transport_cost_tensor(CT, H, IS)
+
+    # 各物资的供应点，补齐到相同长度K，补齐位置的库存为0
+    K = max(int((new_y > 0).sum(axis=1).max()), 1)
+    order = np.argsort(new_y <= 0, axis=1, kind='stable')[:, :K]
+    supply = np.take_along_axis(new_y, order, axis=1) * (np.take_along_axis(new_y, order, axis=1) > 0)
+    tc_sup = np.take_along_axis(TC, order[:, :, None], axis=1)
+    profit = CH[:, None, None] + PU[:, None, None] - tc_sup
+    if arcs is not None:
+        # 被裁剪的弧收益置0，transport_flows将其视为不可用
+        profit = np.where(np.take_along_axis(np.asarray(arcs, dtype=bool), order[:, :, None], axis=1), profit, 0.0)
+
+    # 供应点就地满足本地需求：本地弧运输成本为0时其收益在该物资的所有弧中最大，
+    # 这些弧互不相交，贪心推送后的流量对其总运量仍是最优的，可直接作为逐次最短路的起点
+    local_profit = np.take_along_axis(profit, order[:, :, None], axis=2)[:, :, 0]
+    local = np.isclose(local_profit, profit.max(axis=(1, 2))[:, None]) & (local_profit > 0) & (supply > 0)
+    flow = np.zeros((NS, AS, K, IS))
+    s_idx, a_idx, k_idx = np.nonzero(np.broadcast_to(local, (NS, AS, K)))
+    j_idx = order[a_idx, k_idx]
+    flow[s_idx, a_idx, k_idx, j_idx] = np.minimum(supply[a_idx, k_idx], D[s_idx, a_idx, j_idx])
+
+    # 批次按 (s, a) 展开
+    q = transport_flows(
+        np.broadcast_to(profit, (NS, AS, K, IS)).reshape(-1, K, IS),
+        np.broadcast_to(supply, (NS, AS, K)).reshape(-1, K),
+        D.reshape(-1, IS),
+        flow.reshape(-1, K, IS)
+    ).reshape(NS, AS, K, IS)
+
+    tc = np.einsum('sakj,akj->s', q, tc_sup)
+    hc = new_y.sum(axis=1) @ CH - np.einsum('sakj,a->s', q, CH)
+    wc = D.sum(axis=2) @ PU - np.einsum('sakj,a->s', q, PU)
+    return {'tc': tc, 'hc': hc, 'wc': wc}
+
+def evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, new_x, new_y, arcs=None):
+    """
+    不借助Gurobi评估一个第一阶段候选解，返回值与renew一致。
+
+    参数:
+    IS, AS, LS, NS: 城市、资源种类、存储位置与场景数量。
+    CF, CP, CH, PU, CT, H: 成本参数与距离矩阵。
+    D: 需求数据。
+    pr: 场景概率。
+    new_x: 设施选址决策。
+    new_y: 库存决策。
+    arcs: 保留的运输弧，默认保留全部弧。
+
+    返回:
+    元组 (Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2, scenario_costs)，前六项与renew的返回值含义相同，
+    scenario_costs为包含各场景tc、hc、wc与总第二阶段成本recourse的字典。
+    """
+    pr = np.asarray(pr, dtype=float)[:NS]
+    costs = solve_recourse(IS, AS, NS, CH, PU, CT, H, D, new_y, arcs)
+    scenario_costs = {
+        'tc': costs['tc'],
+        'hc': costs['hc'],
+        'wc': costs['wc'],
+        'recourse': costs['tc'] + costs['hc'] + costs['wc'],
+    }
+
+    Vfc2 = float(np.sum(np.asarray(CF, dtype=float)[None, :] * new_x))
+    Vpc2 = float(np.sum(np.asarray(CP, dtype=float)[:, None] * new_y))
+    Vtc2 = float(pr @ costs['tc'])
+    Vhc2 = float(pr @ costs['hc'])
+    Vwc2 = float(pr @ costs['wc'])
+    Vf2 = Vfc2+Vpc2+Vtc2+Vhc2+Vwc2
+    return Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2, scenario_costs
+
+def evaluate_candidates(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, xx, yy, arcs=None):
+    """
+    依次评估solver中全部MS个候选解。
+
+    参数:
+    xx: 候选设施选址，形状为 (IS, LS, MS)。
+    yy: 候选库存，形状为 (AS, IS, MS)。
+    其余参数同evaluate_candidate。
+
+    返回:
+    元组 (new_f, new_fc, new_pc, new_tc, new_hc, new_wc, scenario_recourse)，前六项形状为 (MS, 1)，
+    与solver中的同名数组一致；scenario_recourse形状为 (MS, NS)，为各候选解在每个场景下的第二阶段成本。
+    """
+    MS = xx.shape[2]
+    results = np.zeros((6, MS, 1))
+    scenario_recourse = np.zeros((MS, NS))
+    for m in range(MS):
+        *values, scenario_costs = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, xx[:, :, m], yy[:, :, m], arcs)
+        results[:, m, 0] = values
+        scenario_recourse[m] = scenario_costs['recourse']
+    new_f, new_fc, new_pc, new_tc, new_hc, new_wc = results
+    return new_f, new_fc, new_pc, new_tc, new_hc, new_wc, scenario_recourse
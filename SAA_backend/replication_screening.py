@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Replication screening.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为样本组筛选模块，先求解各样本组getsol模型的LP松弛，将松弛解取整修复为可行的第一阶段候选解并在评估场景的一个子样本上计算期望成本，
+按候选解质量或松弛目标值对样本组排序，只对排名前top_k的样本组求解完整的MIP；审计模式下求解全部样本组，
+统计最终解来自筛选集合的比例，用于在精度与求解时间之间取舍
+"""
+import os
+import json
+import time
+import logging
+import numpy as np
+from gurobipy import GRB
+from model_builder import build_saa_form
+from env_pool import create_pooled_model
+from saa_bounds import candidate_costs
+from scenario_compaction import compact_scenarios
+
+# 默认的审计统计文件
+SCREENING_STATS_PATH = 'screening_stats.json'
+
+def relax_form(form):
+    """
+    将矩阵形式的模型改为LP松弛：全部变量改为连续变量，求解后不再校验第二阶段变量的整数性。
+    """
+    form.vtype = np.full_like(form.vtype, GRB.CONTINUOUS)
+    form.recourse_relaxed = False
+    return form
+
+def round_candidate(x_relaxed, y_relaxed, CF, U, V):
+    """
+    将LP松弛解取整修复为满足Constraint (2)与Constraint (5)的第一阶段解。
+
+    参数:
+    x_relaxed: 松弛的设施选址，形状为 (IS, LS)。
+    y_relaxed: 松弛的库存，形状为 (AS, IS)。
+    CF, U, V: 设施固定成本、设施容量与物品体积。
+
+    返回:
+    元组 (new_x, new_y)。
+
+    功能:
+    库存四舍五入后，为每个有库存的城市选择容量足够的固定成本最低的设施；容量最大的设施仍不足时，按比例减少该城市的库存。
+    """
+    CF, U, V = (np.asarray(a, dtype=float) for a in (CF, U, V))
+    new_y = np.maximum(np.rint(np.asarray(y_relaxed, dtype=float)), 0)
+    load = V @ new_y
+    cost = np.where(U[None, :] >= load[:, None], CF[None, :], np.inf)
+    level = np.where(np.isfinite(cost).any(axis=1), np.argmin(cost, axis=1), np.argmax(U))
+    over = load > U[level]
+    new_y[:, over] = np.floor(new_y[:, over] * U[level[over]] / load[over])
+    new_x = np.zeros(np.shape(x_relaxed))
+    opened = np.flatnonzero(new_y.sum(axis=0) > 0)
+    new_x[opened, level[opened]] = 1
+    return new_x, new_y
+
+class ReplicationScreening:
+    """
+    功能: 样本组的多精度筛选，以LP松弛为低精度模型选出top_k个样本组求解完整的MIP，审计模式下统计筛选的命中率。
+    方法:
+    from_dict(options): 由字典构建。
+    screen(...): 求解各样本组的LP松弛并排序，返回需要求解MIP的样本组。
+    scoring_scenarios(D_eval, pr_eval): 评估取整候选解所用的场景子样本。
+    ranking(): 按relaxed与quality排序并选出top_k个样本组。
+    record(m): 记录最终解所在的样本组。
+    report(): 打印并记录筛选结果与命中率。
+    """
+    def __init__(self, top_k=3, rank='quality', audit=False, stats_path=SCREENING_STATS_PATH, quality_scenarios=200, seed=0):
+        """
+        参数:
+        top_k: 求解完整MIP的样本组数量。
+        rank: 排序依据，'quality'为取整候选解在评估场景子样本上的期望成本（相同时按松弛目标值），'relaxed'为LP松弛的目标值。
+        audit: 是否审计。审计时仍求解全部样本组，只记录最终解是否来自筛选集合，结果累计在stats_path中。
+        stats_path: 审计统计文件，为None时不保存。
+        quality_scenarios: rank为'quality'时评估取整候选解所用的评估场景数量，None为全部评估场景。
+        seed: 抽取评估场景子样本的随机种子，不影响solver的全局随机数。
+        """
+        if rank not in ('quality', 'relaxed'):
+            raise ValueError(f'未知的样本组排序依据: {rank}')
+        self.top_k = int(top_k)
+        self.rank = rank
+        self.quality_scenarios = None if quality_scenarios is None else int(quality_scenarios)
+        self.seed = seed
+        self.audit = audit
+        self.stats_path = stats_path
+        self.order = []
+        self.selected = []
+        self.relaxed = None
+        self.quality = None
+        self.screen_time = 0.0
+        self.final_rank = None
+        self.stats = {'runs': 0, 'hits': 0, 'ranks': []}
+        if audit and stats_path and os.path.exists(stats_path):
+            with open(stats_path, 'r', encoding='utf-8') as file:
+                self.stats = json.load(file)
+
+    @classmethod
+    def from_dict(cls, options):
+        options = dict(options or {})
+        for key in options:
+            if key not in ('top_k', 'rank', 'audit', 'stats_path', 'quality_scenarios', 'seed'):
+                raise ValueError(f'未知的样本组筛选选项: {key}')
+        return cls(**options)
+
+    def screen(self, IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_samples, pr_samples, D_eval, pr_eval, log_filename,
+               recourse_integrality='auto', arcs=None, formulation='standard', policy=None):
+        """
+        参数:
+        D_samples, pr_samples: 各样本组的需求数据与场景概率。
+        D_eval, pr_eval: 评估候选解质量所用的场景及其概率，只使用其中quality_scenarios个场景（见scoring_scenarios）。
+        其余参数同solver_model.getsol。
+
+        返回:
+        需要求解MIP的样本组序号列表（按排名），审计模式下为全部样本组。
+
+        功能:
+        样本数量相同的样本组共用一个LP模型，只更新需求与概率。LP松弛的目标值不超过对应MIP的最优值，可以作为下界的估计。
+        各样本组的取整候选解在同一个场景子样本上评估，取整后相同的候选解只评估一次。
+        """
+        tic = time.perf_counter()
+        MS = len(D_samples)
+        backend = policy.backend('replication') if policy is not None else 'gurobi'
+        self.relaxed = np.full(MS, np.inf)
+        self.quality = np.full(MS, np.inf)
+        models = {}
+        if self.rank == 'quality':
+            D_score, pr_score = self.scoring_scenarios(D_eval, pr_eval)
+        scores = {}
+        try:
+            for m in range(MS):
+                SS = len(D_samples[m])
+                if SS not in models:
+                    form = relax_form(build_saa_form(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_samples[m], pr_samples[m],
+                                                     recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation))
+                    models[SS] = create_pooled_model(form, "getsol_lp", backend, log_filename, 'screening')
+                else:
+                    models[SS].update_scenarios(D_samples[m], pr_samples[m])
+                handle = models[SS]
+                handle.optimize()
+                if handle.model.SolCount == 0:
+                    print(f'Screening LP of replication {m} failed, status {handle.model.status}')
+                    continue
+                self.relaxed[m] = handle.model.ObjVal
+                if self.rank == 'relaxed':
+                    continue
+                new_x, new_y = round_candidate(handle.values('x'), handle.values('y'), CF, U, V)
+                key = new_x.tobytes() + new_y.tobytes()
+                if key not in scores:
+                    scores[key] = candidate_costs(IS, AS, LS, len(D_score), CF, CP, CH, PU, CT, H, D_score, pr_score, new_x, new_y, arcs)[0]
+                self.quality[m] = scores[key]
+        finally:
+            for handle in models.values():
+                handle.model.dispose()
+
+        self.ranking()
+        self.screen_time = time.perf_counter() - tic
+        message = (f"Replication screening ({self.rank}): {MS} LP relaxations in {self.screen_time} seconds, "
+                   f"MIP for replications {self.selected}{' (audit: all replications solved)' if self.audit else ''}")
+        print(message)
+        logging.info(message)
+        return list(range(MS)) if self.audit else list(self.selected)
+
+    def scoring_scenarios(self, D_eval, pr_eval):
+        """
+        参数:
+        D_eval, pr_eval: 评估场景及其概率。
+
+        返回:
+        元组 (D_score, pr_score)。评估场景多于quality_scenarios时不放回地均匀抽取quality_scenarios个场景并将概率归一化，
+        再合并其中需求相同的场景。
+        """
+        D_eval = np.asarray(D_eval, dtype=float)
+        pr_eval = np.asarray(pr_eval, dtype=float)[:len(D_eval)]
+        if self.quality_scenarios is not None and len(D_eval) > self.quality_scenarios:
+            index = np.sort(np.random.default_rng(self.seed).choice(len(D_eval), self.quality_scenarios, replace=False))
+            D_eval, pr_eval = D_eval[index], pr_eval[index] / pr_eval[index].sum()
+        return compact_scenarios(D_eval, pr_eval, 'screening')[:2]
+
+    def ranking(self):
+        """
+        按relaxed与quality对样本组排序，结果保存在order中，并选出前top_k个样本组。
+        rank为'quality'时按quality升序、相同时按relaxed升序；为'relaxed'时只按relaxed升序。LP求解失败的样本组（inf）排在最后。
+
+        返回:
+        选出的样本组序号列表。
+        """
+        keys = (self.relaxed,) if self.rank == 'relaxed' else (self.relaxed, self.quality)
+        self.order = np.lexsort(keys).tolist()
+        self.selected = self.order[:max(min(self.top_k, len(self.order)), 1)]
+        return list(self.selected)
+
+    def record(self, m):
+        """
+        参数:
+        m: 最终解所在样本组的序号（筛选前的序号）。
+        """
+        self.final_rank = self.order.index(m) if m in self.order else None
+        if not self.audit:
+            return
+        self.stats['runs'] += 1
+        self.stats['hits'] += int(m in self.selected)
+        self.stats['ranks'].append(self.final_rank)
+        if self.stats_path:
+            tmp_path = f'{self.stats_path}.tmp{os.getpid()}'
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.stats, file)
+            os.replace(tmp_path, self.stats_path)
+
+    def hit_rate(self):
+        return self.stats['hits'] / self.stats['runs'] if self.stats['runs'] else None
+
+    def report(self):
+        message = f"Replication screening: final candidate ranked {self.final_rank} of {len(self.order)}, screening time {self.screen_time} seconds"
+        if self.stats['runs']:
+            message += (f", final candidate in top {self.top_k} for {self.stats['hits']} of {self.stats['runs']} audited runs "
+                        f"({self.hit_rate() * 100} %)")
+        print(message)
+        logging.info(message)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of SAA bounds.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为SAA统计界模块，由各样本组的最优值估计下界、由候选解在各评估场景上的成本（或独立的样本外场景）估计上界，给出最优性gap的置信区间，
+并提供样本组求解的序贯停止规则
+"""
+import logging
+import numpy as np
+from scipy import stats
+from plugins import calculate_gap
+from recourse_evaluator import evaluate_candidate
+
+def lower_bound_estimate(values, confidence=0.95):
+    """
+    SAA下界估计：各样本组最优值的均值及其单侧t区间。
+
+    参数:
+    values: 各样本组的最优值（或MIP下界），样本组之间相互独立。
+    confidence: 置信水平。
+
+    返回:
+    元组 (mean, half_width)，mean - half_width 为真实最优值在给定置信水平下的下界，少于两个样本组时half_width为inf。
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    if len(values) < 2:
+        return float(np.mean(values)) if len(values) else np.nan, np.inf
+    half_width = stats.t.ppf(confidence, len(values) - 1) * np.std(values, ddof=1) / np.sqrt(len(values))
+    return float(np.mean(values)), float(half_width)
+
+def upper_bound_estimate(costs, pr):
+    """
+    SAA上界估计：候选解在评估场景上的期望成本。评估场景是目标问题的全部NS个场景（合并重复场景后），
+    期望成本即候选解在目标问题上的精确成本，因此半宽为0；只有独立的样本外场景才给出t区间（见source_upper_bound）。
+
+    参数:
+    costs: 候选解在各评估场景下的总成本（第一阶段成本 + 该场景的第二阶段成本）。
+    pr: 评估场景的概率，合并重复场景后概率不相等。
+
+    返回:
+    元组 (mean, half_width)，mean + half_width 为候选解期望成本的上界。
+    """
+    costs = np.asarray(costs, dtype=float).ravel()
+    pr = np.asarray(pr, dtype=float).ravel()[:len(costs)]
+    return float(pr @ costs), 0.0
+
+def source_upper_bound(result, index=0, confidence=0.95):
+    """
+    由样本外评估的结果（见out_of_sample.evaluate_out_of_sample）计算候选解的上界估计及其单侧t区间。
+
+    返回:
+    元组 (mean, half_width)，同upper_bound_estimate。
+    """
+    n = result['n']
+    if n < 2:
+        return float(result['f'][index]), np.inf
+    return float(result['f'][index]), float(stats.t.ppf(confidence, n - 1) * np.sqrt(result['variance'][index] / n))
+
+def optimality_gap(lower_values, upper_costs=None, pr=None, confidence=0.95, upper=None):
+    """
+    估计候选解的最优性gap。
+
+    参数:
+    lower_values: 各样本组的最优值（或MIP下界）。
+    upper_costs: 候选解在各评估场景下的总成本（见candidate_costs）。
+    pr: 评估场景的概率。
+    confidence: 置信水平。
+    upper: 已计算的上界估计 (mean, half_width)（例如source_upper_bound的返回值），给定时忽略upper_costs与pr。
+
+    返回:
+    字典，包括下界估计lower与其半宽lower_half_width、上界估计upper与其半宽upper_half_width、
+    gap的点估计gap（百分比，由plugins.calculate_gap计算）与gap置信区间的上端gap_ci（百分比）。
+
+    功能:
+    gap_ci = (upper + upper_half_width - (lower - lower_half_width)) / upper * 100，
+    两个单侧区间分别以给定置信水平成立，gap_ci为保守的gap上界。
+    """
+    lower, lower_half_width = lower_bound_estimate(lower_values, confidence)
+    upper, upper_half_width = upper if upper is not None else upper_bound_estimate(upper_costs, pr)
+    lower_values = np.asarray(lower_values, dtype=float).ravel()
+    gap = calculate_gap(lower_values, len(lower_values), upper)
+    gap_ci = (upper + upper_half_width - (lower - lower_half_width)) / upper * 100
+    return {'lower': lower, 'lower_half_width': lower_half_width, 'upper': upper, 'upper_half_width': upper_half_width,
+            'gap': float(gap), 'gap_ci': float(gap_ci)}
+
+def report_bounds(bounds, replications, confidence=0.95):
+    """
+    打印并记录统计界。
+    """
+    message = (f"SAA bounds ({replications} replications, {confidence * 100} % confidence): "
+               f"lower {bounds['lower']} - {bounds['lower_half_width']}, upper {bounds['upper']} + {bounds['upper_half_width']}, "
+               f"gap {bounds['gap']} %, gap CI {bounds['gap_ci']} %")
+    print(message)
+    logging.info(message)
+
+def should_stop(bounds, replications, gap_tolerance, min_replications=3):
+    """
+    序贯停止规则：至少求解min_replications个样本组，且gap置信区间的上端不超过gap_tolerance（百分比）时停止。
+    """
+    return replications >= min_replications and bounds['gap_ci'] <= gap_tolerance
+
+def candidate_costs(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, new_x, new_y, arcs=None):
+    """
+    计算候选解在各评估场景下的总成本（见recourse_evaluator.evaluate_candidate），无需Gurobi许可证。
+
+    返回:
+    元组 (Vf2, costs)，Vf2为期望总成本，costs为各场景的总成本，形状为 (NS,)。
+    """
+    Vf2, Vfc2, Vpc2, _, _, _, scenario_costs = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, new_x, new_y, arcs)
+    return Vf2, Vfc2 + Vpc2 + scenario_costs['recourse']
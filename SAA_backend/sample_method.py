@@ -32,7 +32,23 @@ import numpy as np
 # stratified_demand_sample = demand[stratified_sample_indices, :]
 # simple_demand_sample = demand[simple_sample_indices, :]
 
-def stratified_random_sampling(demand, cluster_labels, cluster_num, IS):
+def cluster_members(cluster_labels):
+    """
+    按聚类标签分组场景索引。
+
+    参数：
+        cluster_labels (ndarray): 每个数据点对应的聚类标签。
+
+    返回：
+        labels (ndarray): 排序后的不同标签。
+        inverse (ndarray): 每个数据点的标签在labels中的位置。
+        members (list): 各类的场景索引数组，与labels顺序一致，类内索引递增。
+    """
+    labels, inverse, counts = np.unique(np.asarray(cluster_labels).ravel(), return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind='stable')
+    return labels, inverse, np.split(order, np.cumsum(counts)[:-1])
+
+def stratified_random_sampling(demand, cluster_labels, cluster_num, IS, size=None):
     """
     分层随机抽样方法。
     
@@ -41,6 +57,8 @@ def stratified_random_sampling(demand, cluster_labels, cluster_num, IS):
         cluster_labels (ndarray): 每个数据点对应的聚类标签。
         cluster_num (int): 聚类的数量。
         IS (int): 样本中具体需求的数量。
+        size (int): 样本数量，默认None为按cluster_num取整分配（原有方式）。给定时按相同的权重分配恰好size个场景
+                    （不超过场景数量），各类不超过其场景数量，取整后的差额按权重在各类之间调整。
 
     返回：
         sample (list): 抽取的样本索引列表。
@@ -49,58 +67,63 @@ def stratified_random_sampling(demand, cluster_labels, cluster_num, IS):
     #Stratified random sampling
     sample = []
 
-    standard = np.zeros((cluster_num, 1))
-    temp_num = np.zeros((cluster_num, 1))
-    for i in np.unique(cluster_labels):
-        cluster_each = np.argwhere(cluster_labels == i)
-        cluster_each = cluster_each.reshape(1, -1).squeeze(0).tolist()
-        demand_sample = np.zeros((len(cluster_each), IS))
-        for s in range(len(cluster_each)):
-            for j in range(IS):
-                demand_sample[s, j] = demand[int(cluster_each[s]), j]
-        # determine scenario number for each sample by standard deviation
-        mean_sample = np.mean(demand_sample, axis=0)
-        temp_std = 0
-        # calculate standard deviation
-        standard[i] = np.sqrt(sum(sum(np.square(demand_sample - mean_sample.T))) / len(cluster_each))
-        temp_num[i] = standard[i] * len(cluster_each)
-
-    for i in np.unique(cluster_labels):
-        cluster_each = np.argwhere(cluster_labels == i)
-        cluster_each = cluster_each.reshape(1, -1).squeeze(0).tolist()
-        pick_num = np.rint(cluster_num * len(cluster_each) * standard[i] / sum(temp_num))
-        pick_num = pick_num.astype(np.int32)[0]
-
-        if pick_num == 0:
+    labels, inverse, members = cluster_members(cluster_labels)
+    counts = np.array([len(cluster_each) for cluster_each in members])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # determine scenario number for each sample by standard deviation
+    demand = np.asarray(demand, dtype=float)[:, :IS]
+    mean_sample = np.add.reduceat(demand[np.concatenate(members)], starts, axis=0) / counts[:, None]
+    # calculate standard deviation
+    deviation = np.square(demand - mean_sample[inverse]).sum(axis=1)
+    standard = np.sqrt(np.bincount(inverse, weights=deviation, minlength=len(labels)) / counts)
+    temp_num = standard * counts
+    if size is None:
+        pick_num = np.rint(cluster_num * counts * standard / temp_num.sum()).astype(np.int32)
+    else:
+        size = int(min(size, counts.sum()))
+        weights = temp_num if temp_num.sum() > 0 else counts.astype(float)
+        pick_num = np.minimum(np.rint(size * weights / weights.sum()).astype(np.int32), counts)
+        # 取整或类的场景数量不足时，把剩余的样本数量分配给仍有剩余场景的类
+        while pick_num.sum() < size:
+            spare = np.flatnonzero(pick_num < counts)
+            pick_num[spare[np.argmax(weights[spare] / (pick_num[spare] + 1))]] += 1
+        while pick_num.sum() > size:
+            taken = np.flatnonzero(pick_num > 0)
+            pick_num[taken[np.argmin(weights[taken] / pick_num[taken])]] -= 1
+
+    for cluster_each, n in zip(members, pick_num):
+        if n == 0:
             continue
-        elif pick_num == 1:
+        elif n == 1:
             temp = np.random.choice(len(cluster_each), 1, replace=False)
-            sample.append(cluster_each[temp[0]])
+            sample.append(int(cluster_each[temp[0]]))
         else:
-            temp = np.random.choice(len(cluster_each), pick_num, replace=False)
-            for j in range(pick_num):
-                sample.append(cluster_each[temp[j]])
+            temp = np.random.choice(len(cluster_each), n, replace=False)
+            sample.extend(cluster_each[temp].tolist())
     return sample, "Stratified"
     
-def simple_random_sampling(cluster_labels):
+def simple_random_sampling(cluster_labels, size=None):
     """
     简单随机抽样方法。
 
     参数：
         cluster_labels (ndarray): 每个数据点对应的聚类标签。
+        size (int): 样本数量，默认None为每类抽取一个场景。给定时从全部场景中不放回地抽取size个场景（不超过场景数量）。
 
     返回：
         sample (list): 抽取的样本索引列表。
         "Simple" (str): 表示使用的抽样方法。
     """
+    if size is not None:
+        return np.random.choice(len(cluster_labels), int(min(size, len(cluster_labels))), replace=False).tolist(), "Simple"
+
     # randomly select one from each group
     sample = []
     
-    for i in np.unique(cluster_labels):
-        cluster_each = np.argwhere(cluster_labels == i)
-        cluster_each = cluster_each.reshape(1, -1).squeeze(0).tolist()
+    for cluster_each in cluster_members(cluster_labels)[2]:
         temp = np.random.choice(len(cluster_each), 1, replace=False)
-        sample.append(cluster_each[temp[0]]) 
+        sample.append(int(cluster_each[temp[0]]))
     return sample, "Simple"
 
 class SampleGenerator:
@@ -121,7 +144,7 @@ class SampleGenerator:
         self.method = method
         self.params = params
 
-    def generate(self, data, labels, cluster_num):
+    def generate(self, data, labels, cluster_num, size=None):
         """
         生成样本。
 
@@ -129,13 +152,14 @@ class SampleGenerator:
             data (ndarray): 包含数据的数组。
             labels (ndarray): 数据点的聚类标签。
             cluster_num (int): 聚类的数量。
+            size (int): 样本数量，默认None为抽样方法原有的样本数量，序贯抽样时给定。
 
         返回：
             根据指定抽样方法生成的样本。
         """
         if self.method == 'Simple':
-            return simple_random_sampling(labels)
+            return simple_random_sampling(labels, size)
         elif self.method == 'Stratified':
-            return stratified_random_sampling(data, labels, cluster_num, **self.params)
+            return stratified_random_sampling(data, labels, cluster_num, size=size, **self.params)
         else:
             raise ValueError('未知的样本生成方法: {}'.format(self.method))
\ No newline at end of file
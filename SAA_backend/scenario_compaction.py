@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Scenario compaction.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为场景压缩模块，在建模前合并需求完全相同的场景并累加其概率，模型的最优值不变
+"""
+import logging
+import hashlib
+import numpy as np
+
+def compact_scenarios(D, pr, name='scenarios'):
+    """
+    合并需求完全相同的场景。
+
+    参数:
+    D: 需求数据，形状为 (NS, AS, IS)。
+    pr: 场景概率，长度为NS。
+    name: 报告中使用的名称。
+
+    返回:
+    元组 (D_unique, pr_unique, inverse)。D_unique按各场景首次出现的顺序排列，pr_unique为合并后的概率，
+    inverse[s]为原场景s在D_unique中的下标。
+
+    功能:
+    对每个D[s]计算哈希值，哈希相同的场景合并为一个场景，概率相加。重复场景的第二阶段变量与约束完全相同，
+    合并后目标函数中的期望项不变，因此最优值与最优解不变。
+    """
+    D = np.asarray(D, dtype=float)
+    pr = np.asarray(pr, dtype=float)[:len(D)]
+    first = {}
+    inverse = np.empty(len(D), dtype=int)
+    for s in range(len(D)):
+        key = hashlib.sha1(np.ascontiguousarray(D[s]).tobytes()).digest()
+        inverse[s] = first.setdefault(key, len(first))
+
+    keep = np.unique(inverse, return_index=True)[1]
+    pr_unique = np.bincount(inverse, weights=pr, minlength=len(first))
+
+    ratio = len(first) / len(D) if len(D) else 1.0
+    message = f'Scenario compaction ({name}): {len(D)} -> {len(first)} scenarios, compression ratio {ratio}'
+    print(message)
+    logging.info(message)
+    return D[keep], pr_unique, inverse
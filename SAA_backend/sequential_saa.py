@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Sequential SAA.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为序贯抽样模块，getsol从较小的样本数量SS开始求解，每一步估计最优性gap，未达到目标时按几何级数增大SS，
+并以上一步的最好解作为初始解，直到gap估计满足目标或SS达到上限，同时记录每一步的SS与耗时
+"""
+import time
+import logging
+import numpy as np
+from scenario_compaction import compact_scenarios
+from saa_bounds import candidate_costs, optimality_gap, report_bounds, should_stop
+from progress_events import progress_bus
+from sample_method import SampleGenerator
+
+class PreviousSolutionStart:
+    """
+    功能: getsol的初始解来源，接口与warm_start.WarmStartEngine相同，在其初始解之外加入上一步的最好解。
+    方法:
+    apply(handle): 将初始解写入模型。
+    record(Vx, Vy, objective, timer, runtime): 转发给WarmStartEngine。
+    """
+    def __init__(self, previous=None, engine=None):
+        self.previous = previous
+        self.engine = engine
+
+    def apply(self, handle):
+        starts = self.engine.starts() if self.engine is not None else []
+        if self.previous is not None:
+            starts.append({'x': self.previous[0], 'y': self.previous[1]})
+        handle.set_starts(starts)
+
+    def record(self, Vx, Vy, objective, timer, runtime):
+        if self.engine is not None:
+            self.engine.record(Vx, Vy, objective, timer, runtime)
+
+class SampleSizeSchedule:
+    """
+    功能: 序贯抽样的样本数量序列 SS_k = initial_size * growth ** k（取整，不超过max_size），并记录每一步的结果。
+    方法:
+    from_dict(schedule): 由字典构建。
+    sizes(NS): 返回样本数量序列。
+    record(step): 记录一步的结果。
+    describe(): 返回用于日志的样本数量轨迹描述。
+    """
+    def __init__(self, initial_size=None, growth=2.0, max_size=None):
+        if growth <= 1:
+            raise ValueError(f'样本数量的增长倍数须大于1: {growth}')
+        self.initial_size = initial_size
+        self.growth = growth
+        self.max_size = max_size
+        self.trajectory = []
+
+    @classmethod
+    def from_dict(cls, schedule):
+        schedule = dict(schedule or {})
+        for key in schedule:
+            if key not in ('initial_size', 'growth', 'max_size'):
+                raise ValueError(f'未知的序贯抽样选项: {key}')
+        return cls(**schedule)
+
+    def sizes(self, NS, default_initial=2):
+        """
+        参数:
+        NS: 场景数量，样本数量不超过NS。
+        default_initial: initial_size为None时的初始样本数量，solver中为聚类数量（即原抽样方法的样本数量）。
+        """
+        max_size = min(self.max_size or NS, NS)
+        size = max(min(int(self.initial_size or default_initial), max_size), 1)
+        sizes = [size]
+        while size < max_size:
+            size = min(max(int(round(size * self.growth)), size + 1), max_size)
+            sizes.append(size)
+        return sizes
+
+    def record(self, step):
+        self.trajectory.append(step)
+        message = f"Sequential SAA step {len(self.trajectory)}: SS {step['SS']}, time {step['time']} seconds, gap CI {step['gap_ci']} %"
+        print(message)
+        logging.info(message)
+
+    def describe(self):
+        return ', '.join(f"SS {step['SS']} ({step['time']:.2f} s, gap CI {step['gap_ci']:.3g} %)" for step in self.trajectory)
+
+def sequential_saa(solve, schedule, IS, AS, LS, NS, MS, CF, U, V, H, CP, CH, PU, CT, D, demand, cluster_labels, cluster_num, sample_method,
+                   D_eval, pr_eval, log_filename, max_attempts, recourse_integrality='auto', warm_start=None, arcs=None, formulation='standard',
+                   policy=None, scenario_compaction=True, gap_tolerance=None, min_replications=3, confidence=0.95, template_factory=None):
+    """
+    序贯抽样求解样本组。
+
+    参数:
+    solve: 样本组求解函数，即solver_model.getsol。
+    schedule: SampleSizeSchedule对象。
+    MS: 每一步求解的样本组数量。
+    D, demand, cluster_labels, cluster_num, sample_method: 全部场景的需求数据、聚类结果与抽样方法。
+    D_eval, pr_eval: 选择最好候选解并估计上界所用的评估场景及其概率。
+    warm_start: WarmStartEngine对象，其初始解与上一步的最好解一起写入模型。
+    gap_tolerance: gap目标（百分比），gap置信区间的上端不超过该值时停止；为None时求解到最大样本数量。
+    template_factory: 函数，参数为 (SS, D_sample, pr_sample)，返回可复用的getsol模型，为None时每个样本组单独建模。
+    其余参数同solver_model.solver。
+
+    返回:
+    元组 (getsol_results, samples, bounds)，为最后一步MS个样本组的getsol结果、抽样索引与统计界（见saa_bounds.optimality_gap）。
+    每一步的结果记录在schedule.trajectory中。
+    """
+    previous = None
+    bounds = None
+    sample_generator = SampleGenerator(sample_method, {'IS': IS} if sample_method == 'Stratified' else {})
+    for SS in schedule.sizes(NS, cluster_num):
+        tic = time.perf_counter()
+        warm = PreviousSolutionStart(previous, warm_start)
+
+        D_samples, pr_samples, samples = [], [], []
+        for m in range(MS):
+            sample, _ = sample_generator.generate(demand, cluster_labels, cluster_num, SS)
+            D_sample = D[sample]
+            pr_sample = np.ones(len(sample)) / len(sample)
+            if scenario_compaction:
+                D_sample, pr_sample, _ = compact_scenarios(D_sample, pr_sample, f'SS {SS} sample {m}')
+            D_samples.append(D_sample)
+            pr_samples.append(pr_sample)
+            samples.append(sample)
+
+        getsol_results = []
+        templates = {}
+        for m in range(MS):
+            n = len(D_samples[m])
+            if template_factory is not None and n not in templates:
+                templates[n] = template_factory(n, D_samples[m], pr_samples[m])
+            with progress_bus().tag(replication=m, sample_size=SS):
+                getsol_results.append(solve(IS, AS, LS, n, CF, U, V, H, CP, CH, PU, CT, D_samples[m], pr_samples[m], log_filename, max_attempts,
+                                            recourse_integrality, templates.get(n), warm, arcs, formulation, policy))
+            if policy is not None:
+                policy.adapt([result[0] for result in getsol_results])
+        for template in templates.values():
+            template.model.dispose()
+
+        # 本步期望成本最小的候选解在评估场景上的总成本估计上界，该候选解作为下一步的初始解
+        evaluated = [candidate_costs(IS, AS, LS, len(D_eval), CF, CP, CH, PU, CT, H, D_eval, pr_eval, np.round(result[4]), np.round(result[5]), arcs)
+                     for result in getsol_results]
+        best = int(np.argmin([Vf2 for Vf2, _ in evaluated]))
+        previous = (np.round(getsol_results[best][4]), np.round(getsol_results[best][5]))
+        # 下界由各样本组MIP的最优值下界（getsol返回值的最后一项）估计，MIPGap不为0时ObjVal不是有效的下界
+        bounds = optimality_gap([result[6] for result in getsol_results], evaluated[best][1], pr_eval, confidence)
+        report_bounds(bounds, MS, confidence)
+        schedule.record({'SS': SS, 'time': time.perf_counter() - tic, **bounds})
+
+        if gap_tolerance is not None and should_stop(bounds, MS, gap_tolerance, min_replications):
+            break
+
+    return getsol_results, samples, bounds
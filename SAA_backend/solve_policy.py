@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Solve policy.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为求解策略模块，按求解阶段（样本组求解、候选解评估、精确解求解）分别设置Gurobi的MIPGap、TimeLimit与MIPFocus，
+并可根据各样本组最优值的离散程度自动调整样本组求解的MIPGap
+"""
+import logging
+import numpy as np
+from gurobipy import GRB
+
+# 求解阶段：replication为getsol，evaluation为renew与renew_batch，exact为two_stage_sp_model
+SOLVE_STAGES = ('replication', 'evaluation', 'exact')
+
+# 各阶段可设置的Gurobi参数
+POLICY_PARAMS = ('MIPGap', 'TimeLimit', 'MIPFocus')
+
+# 默认策略，值为None的参数使用Gurobi默认值，与原求解流程一致（精确解求解保留原有的6000秒TimeLimit），
+# 放宽样本组求解的MIPGap须通过solve_policy显式设置
+DEFAULT_SOLVE_POLICY = {
+    'replication': {'MIPGap': None, 'TimeLimit': None, 'MIPFocus': None},
+    'evaluation': {'MIPGap': None, 'TimeLimit': None, 'MIPFocus': None},
+    'exact': {'MIPGap': None, 'TimeLimit': 6000, 'MIPFocus': None},
+}
+
+def has_solution(m):
+    """
+    判断模型的求解结果是否可用：最优，或因达到TimeLimit停止但已有可行解。
+    """
+    return m.status == GRB.OPTIMAL or (m.status == GRB.TIME_LIMIT and m.SolCount > 0)
+
+class SolvePolicy:
+    """
+    功能: 保存各求解阶段的Gurobi参数，并在求解前设置到模型上。
+          样本组最优值ff本身含有抽样误差，其离散程度远大于MIPGap时，继续证明更小的gap对结果没有意义。
+          adaptive_gap为True时（默认为False），每求解完一个样本组，按 spread_fraction * std(ff) / |mean(ff)| 更新样本组求解的MIPGap，
+          并限制在 [min_gap, max_gap] 之间。
+    方法:
+    from_dict(policy): 由字典（例如ParameterModel中的solve_policy）构建策略。
+    to_dict(): 返回可序列化的策略字典。
+    apply(m, stage): 将stage阶段的参数设置到模型m上。
+    adapt(ff): 根据已求解样本组的最优值调整样本组求解的MIPGap。
+    threads: 全部模型的Gurobi线程数，None时使用环境池的设置（顺序求解为Gurobi默认值，并行求解为 cores // workers）。
+             Gurobi只在线程数相同时结果确定，并行求解要与顺序求解逐位一致时，两者须设置相同的threads。
+    reproducible: 为True时复用的getsol模型在每个样本组求解前清除上一次求解的信息（预处理、基与已有解），
+                  结果与新建的模型（例如并行求解）逐位一致；默认False，保留这些信息加快后续样本组的求解。
+    backend(stage): 返回stage阶段使用的求解器后端。
+    describe(): 返回用于日志的策略描述。
+    """
+    def __init__(self, replication=None, evaluation=None, exact=None, adaptive_gap=False, spread_fraction=0.1, min_gap=1e-4, max_gap=0.02, backends=None, threads=None, reproducible=False):
+        self.stages = {}
+        for stage, params in zip(SOLVE_STAGES, (replication, evaluation, exact)):
+            params = dict(params or {})
+            for param in params:
+                if param not in POLICY_PARAMS:
+                    raise ValueError(f'未知的求解参数: {param}')
+            self.stages[stage] = {**DEFAULT_SOLVE_POLICY[stage], **params}
+        self.adaptive_gap = adaptive_gap
+        self.spread_fraction = spread_fraction
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.threads = threads
+        self.reproducible = reproducible
+        # 各阶段的求解器后端（见solver_backend），默认均为'gurobi'
+        self.backends = {stage: 'gurobi' for stage in SOLVE_STAGES}
+        for stage, backend in (backends or {}).items():
+            if stage not in SOLVE_STAGES:
+                raise ValueError(f'未知的求解阶段: {stage}')
+            self.backends[stage] = backend
+
+    @classmethod
+    def from_dict(cls, policy):
+        """
+        参数:
+        policy: 字典，键为求解阶段名称或adaptive_gap、spread_fraction、min_gap、max_gap、backends、threads、reproducible，为None时使用默认策略。
+        """
+        policy = dict(policy or {})
+        for key in policy:
+            if key not in SOLVE_STAGES + ('adaptive_gap', 'spread_fraction', 'min_gap', 'max_gap', 'backends', 'threads', 'reproducible'):
+                raise ValueError(f'未知的求解策略选项: {key}')
+        return cls(**policy)
+
+    def to_dict(self):
+        return {**{stage: dict(params) for stage, params in self.stages.items()},
+                'adaptive_gap': self.adaptive_gap, 'spread_fraction': self.spread_fraction,
+                'min_gap': self.min_gap, 'max_gap': self.max_gap, 'backends': dict(self.backends), 'threads': self.threads,
+                'reproducible': self.reproducible}
+
+    def apply(self, m, stage):
+        """
+        参数:
+        m: Gurobi模型。
+        stage: 求解阶段，见SOLVE_STAGES。
+        """
+        if stage not in SOLVE_STAGES:
+            raise ValueError(f'未知的求解阶段: {stage}')
+        for param, value in self.stages[stage].items():
+            if value is None:
+                # 恢复Gurobi默认值
+                m.setParam(param, m.getParamInfo(param)[5])
+            else:
+                m.setParam(param, value)
+        if self.threads is not None:
+            m.setParam('Threads', self.threads)
+
+    def adapt(self, ff):
+        """
+        参数:
+        ff: 已求解样本组的最优值。
+
+        返回:
+        调整后样本组求解的MIPGap，少于两个样本组或adaptive_gap为False时不调整。
+        """
+        ff = np.asarray(ff, dtype=float).ravel()
+        if not self.adaptive_gap or len(ff) < 2 or np.mean(ff) == 0:
+            return self.stages['replication']['MIPGap']
+        spread = float(np.std(ff, ddof=1) / abs(np.mean(ff)))
+        gap = float(np.clip(self.spread_fraction * spread, self.min_gap, self.max_gap))
+        self.stages['replication']['MIPGap'] = gap
+        print(f'Replication spread {spread}, MIPGap set to {gap}')
+        logging.info(f'Replication spread {spread}, MIPGap set to {gap}')
+        return gap
+
+    def backend(self, stage):
+        return self.backends[stage]
+
+    def describe(self):
+        parts = []
+        for stage, params in self.stages.items():
+            values = ', '.join(f'{param}={value}' for param, value in params.items() if value is not None)
+            parts.append(f"{stage}[{self.backends[stage]}]({values or 'default'})")
+        if self.adaptive_gap:
+            parts.append(f'adaptive gap {self.spread_fraction} * spread in [{self.min_gap}, {self.max_gap}]')
+        if self.threads is not None:
+            parts.append(f'threads {self.threads}')
+        if self.reproducible:
+            parts.append('reproducible')
+        return '; '.join(parts)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Solver backend.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为求解器后端模块，除Gurobi外提供基于scipy.optimize.milp（HiGHS）的后端，无需Gurobi许可证即可求解getsol、renew等模型，
+可按求解阶段分别选择后端
+"""
+import time
+import numpy as np
+from scipy.optimize import milp, Bounds, LinearConstraint
+from gurobipy import GRB
+from model_builder import SAAGurobiModel, RECOURSE_BLOCKS, resolve_recourse_vtype, lean_objective
+
+# 可用的求解器后端
+SOLVER_BACKENDS = ('gurobi', 'highs')
+
+# HiGHS后端支持的参数及其默认值，其余参数（LogFile、MIPFocus等）被忽略
+HIGHS_PARAM_DEFAULTS = {'MIPGap': 1e-4, 'TimeLimit': np.inf, 'MIPFocus': 0, 'OutputFlag': 1}
+
+# scipy.optimize.milp的返回状态与Gurobi状态码的对应关系
+HIGHS_STATUS = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}
+
+class HighsModel:
+    """
+    功能: 以数组保存一个线性模型并用scipy.optimize.milp求解，提供getsol、renew等函数用到的部分gurobipy.Model接口
+          （setParam、getParamInfo、status、SolCount、ObjVal、ObjBound、MIPGap、Runtime、reset、dispose），求解流程无需区分后端。
+    方法:
+    setParam(name, value): 设置参数。
+    getParamInfo(name): 返回参数信息，第6项为默认值。
+    optimize(callback): 求解模型，callback被忽略。
+    """
+    def __init__(self, form, name):
+        self.ModelName = name
+        self.c = form.obj.copy()
+        self.lb = form.lb.copy()
+        self.ub = form.ub.copy()
+        self.integrality = (form.vtype != GRB.CONTINUOUS).astype(int)
+        self.A = form.A.tocsr(copy=True)
+        self.row_lb = np.where(form.sense == '<', -np.inf, form.rhs)
+        self.row_ub = np.where(form.sense == '>', np.inf, form.rhs)
+        self.ObjCon = form.obj_con
+        self.params = dict(HIGHS_PARAM_DEFAULTS)
+        self.status = GRB.LOADED
+        self.SolCount = 0
+        self.x = None
+        self.ObjVal = self.ObjBound = self.MIPGap = np.nan
+        self.Runtime = 0.0
+
+    def setParam(self, name, value):
+        self.params[name] = value
+
+    def getParamInfo(self, name):
+        default = HIGHS_PARAM_DEFAULTS.get(name)
+        return name, type(default), self.params.get(name, default), None, None, default
+
+    def update(self):
+        pass
+
+    def reset(self, clearall=0):
+        # 每次求解均从头开始，无需清除之前的解
+        pass
+
+    def dispose(self):
+        self.A = None
+
+    def optimize(self, callback=None):
+        options = {'disp': bool(self.params['OutputFlag']), 'mip_rel_gap': self.params['MIPGap']}
+        if np.isfinite(self.params['TimeLimit']):
+            options['time_limit'] = self.params['TimeLimit']
+        tic = time.perf_counter()
+        result = milp(self.c, integrality=self.integrality, bounds=Bounds(self.lb, self.ub),
+                      constraints=LinearConstraint(self.A, self.row_lb, self.row_ub), options=options)
+        self.Runtime = time.perf_counter() - tic
+        self.status = HIGHS_STATUS.get(result.status, GRB.INTERRUPTED)
+        self.x = result.x
+        self.SolCount = int(result.x is not None)
+        if result.x is not None:
+            self.ObjVal = float(result.fun) + self.ObjCon
+            bound = getattr(result, 'mip_dual_bound', None)
+            self.ObjBound = self.ObjVal if bound is None else float(bound) + self.ObjCon
+            gap = getattr(result, 'mip_gap', None)
+            self.MIPGap = 0.0 if gap is None else float(gap)
+
+class _HighsBlock:
+    """
+    功能: 变量块在HighsModel解向量中的视图，提供与MVar相同的X属性。
+    """
+    def __init__(self, model, start, shape):
+        self.model = model
+        self.start = start
+        self.shape = shape
+
+    @property
+    def X(self):
+        return self.model.x[self.start:self.start + int(np.prod(self.shape))].reshape(self.shape)
+
+class HighsSAAModel(SAAGurobiModel):
+    """
+    功能: 与SAAGurobiModel接口相同、使用HighsModel求解的模型，values与精简模型中成本的计算均沿用SAAGurobiModel。
+          HiGHS不支持MIP初始解与回调，set_starts与callback被忽略。
+    方法:
+    set_starts(starts): 不做任何操作。
+    update_scenarios(D, pr): 原地更新场景需求与场景概率。
+    update_fixed_y(new_y): 原地更新renew模型中固定的库存。
+    """
+    def __init__(self, form, name):
+        self.form = form
+        self.recourse_relaxed = form.recourse_relaxed
+        if form.formulation == 'lean':
+            self.D, self.pr, self.fixed_y = form.D, form.pr, form.fixed_y
+        self.model = HighsModel(form, name)
+        self.vars = {block: _HighsBlock(self.model, start, shape) for block, (start, shape) in form.cols.items()}
+        self.constrs = {}
+
+    def set_starts(self, starts):
+        pass
+
+    def _columns(self, block):
+        start, shape = self.form.cols[block]
+        return np.arange(start, start + int(np.prod(shape)))
+
+    def _rows(self, block):
+        start, stop = self.form.rows[block]
+        return slice(start, stop)
+
+    def _restore_recourse_integrality(self):
+        for block in RECOURSE_BLOCKS:
+            if block in self.form.cols:
+                self.model.integrality[self._columns(block)] = 1
+        self.recourse_relaxed = False
+
+    def _set_rhs(self, block, rhs):
+        rows = self._rows(block)
+        sense = self.form.sense[rows]
+        self.model.row_lb[rows] = np.where(sense == '<', -np.inf, rhs)
+        self.model.row_ub[rows] = np.where(sense == '>', np.inf, rhs)
+
+    def update_scenarios(self, D, pr):
+        D = np.asarray(D, dtype=float)
+        pr = np.asarray(pr, dtype=float)
+        self._set_rhs('Constraint (4)', D.ravel())
+        if (self.recourse_relaxed and self.form.recourse_integrality == 'auto'
+                and resolve_recourse_vtype('auto', D) != GRB.CONTINUOUS):
+            self._restore_recourse_integrality()
+
+        if self.form.formulation == 'lean':
+            self.D, self.pr = D, pr
+            q_obj, y_obj, self.model.ObjCon = lean_objective(self.form, D, pr, self.fixed_y)
+            self.model.c[self._columns('q')] = q_obj.ravel()
+            if y_obj is not None:
+                self.model.c[self._columns('y')] = y_obj.ravel()
+            return
+
+        row = self.form.rows['Objective Function'][0]
+        for block in ('tc', 'hc', 'wc'):
+            self.model.A[row, self._columns(block)] = -pr
+
+    def update_fixed_y(self, new_y):
+        new_y = np.asarray(new_y, dtype=float)
+        rows = self._rows('Constraint (3)')
+        self._set_rhs('Constraint (3)', np.tile(new_y.ravel(), (rows.stop - rows.start) // new_y.size))
+        if (self.recourse_relaxed and self.form.recourse_integrality == 'auto'
+                and not np.all(new_y == np.round(new_y))):
+            self._restore_recourse_integrality()
+        if self.form.formulation == 'lean':
+            self.fixed_y = new_y
+            self.model.ObjCon = lean_objective(self.form, self.D, self.pr, new_y)[2]
+
+def create_model(form, name, backend='gurobi', env=None):
+    """
+    按后端加载模型。
+
+    参数:
+    form: SAAModelForm对象。
+    name: 模型名称。
+    backend: 'gurobi'或'highs'。
+    env: Gurobi环境，只用于'gurobi'后端。
+
+    返回:
+    SAAGurobiModel或HighsSAAModel对象，两者接口相同。
+    """
+    if backend == 'gurobi':
+        return SAAGurobiModel(form, name, env)
+    if backend == 'highs':
+        return HighsSAAModel(form, name)
+    raise ValueError(f'未知的求解器后端: {backend}')
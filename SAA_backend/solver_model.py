@@ -14,14 +14,34 @@ Description:
 此部分为SAA近似算法与Gurobi精确算法框架
 """
 import numpy as np
+import scipy.sparse as sp
 import time, logging
 from plugins import *
 from data_preprocess import *
 from sample_method import *
 from cluster_models import *
+from model_builder import *
+from recourse_evaluator import *
+from warm_start import *
+from parallel_executor import *
+from benders import *
+from progressive_hedging import *
+from arc_pruning import *
+from scenario_compaction import *
+from solve_policy import *
+from model_cache import *
+from solver_backend import *
+from saa_bounds import *
+from sequential_saa import *
+from candidate_cache import *
+from out_of_sample import *
+from env_pool import *
+from progress_events import *
+from replication_screening import *
+from first_stage_search import *
 from gurobipy import Model, GRB, GurobiError
 
-def getsol(IS,AS,LS,SS,CF,U,V,H,CP,CH,PU,CT,D_sample,pr_sample, log_filename, max_attempts):
+def getsol(IS,AS,LS,SS,CF,U,V,H,CP,CH,PU,CT,D_sample,pr_sample, log_filename, max_attempts, recourse_integrality='auto', template=None, warm_start=None, arcs=None, formulation='standard', policy=None):
     """
     尝试解决给定的优化模型。如果在优化过程中出现异常，会尝试重新执行，最多重试 max_attempts 次。
 
@@ -42,122 +62,72 @@ def getsol(IS,AS,LS,SS,CF,U,V,H,CP,CH,PU,CT,D_sample,pr_sample, log_filename, ma
     pr_sample: 样本概率。
     log_filename: 日志文件名。
     max_attempts: 最大尝试次数。
+    recourse_integrality: 第二阶段变量q、z、w的整数性选项，默认'auto'在需求与库存均为整数时使用连续变量（结果不变），'integer'保留整数变量。
+    template: 已构建的相同规模getsol模型(SAAGurobiModel)，给定时只更新样本需求与样本概率后重新求解，不再重新建模。
+    warm_start: WarmStartEngine对象，给定时为x、y设置初始解，并记录找到第一个可行解的时间。
+    arcs: 保留的运输弧（见arc_pruning.build_arc_set），默认保留全部弧。
+    formulation: 'standard'为原模型，'lean'为不含成本变量与松弛变量z、w的精简模型（见model_builder.build_lean_form），结果相同。
+    policy: SolvePolicy对象，给定时按其'replication'阶段设置MIPGap、TimeLimit与MIPFocus，并使用该阶段的求解器后端（见solver_backend）。
 
     返回:
-    元组，包含优化结果的各种参数和决策变量值，例如最优解、成本详情、分配决策等。
+    元组 (Vf1, Vec1, Vpc1, Vwc1, Vx1, Vy1, Vb1)，包含优化结果的各种参数和决策变量值，例如最优解、成本详情、分配决策等，
+    Vb1为MIP的最优值下界（ObjBound），MIPGap不为0或达到TimeLimit时小于Vf1，用于估计SAA下界。
 
     功能:
     构建用于第一阶段求解样本最优解的优化模型。
     """
     # 配置日志以追加模式
     logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s', encoding='utf-8')
+    # 构建矩阵形式的模型，重试时无需重新构建
+    if template is None:
+        print('define model ...\n')
+        form = build_saa_form(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_sample, pr_sample, recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation)
     attempt = 0
     while attempt < max_attempts:
+        handle = None
         try:
-            # 创建新模型
-            m = Model("getsol")
-            m.setParam('LogFile', log_filename)
-            # m.setParam('Threads', 12) 
-                
-            # create sets
-            IS = range(IS)
-            AS = range(AS)
-            LS = range(LS)
-            SS = range(SS)
-            
-            # create variables
-            print('define variables ...\n')
-            x = m.addVars(IS,LS,vtype=GRB.BINARY, name="x")
-            y = m.addVars(AS,IS,vtype=GRB.INTEGER, name="y")
-            q = m.addVars(SS,AS,IS,IS,vtype=GRB.INTEGER, name="q")   
-            z = m.addVars(SS,AS,IS,vtype=GRB.INTEGER, name="z")
-            w = m.addVars(SS,AS,IS,vtype=GRB.INTEGER, name="w")
-            hc = m.addVars(SS,vtype=GRB.CONTINUOUS, name="hc")
-            tc = m.addVars(SS,vtype=GRB.CONTINUOUS, name="tc")
-            wc = m.addVars(SS,vtype=GRB.CONTINUOUS, name="wc")
-            
-            # Non-negativity constraints
-            m.addConstrs((y[a,i] >= 0 for a in AS for i in IS), "y non-negative")
-            m.addConstrs((q[s,a,i,j] >= 0 for s in SS for a in AS for i in IS for j in IS), "q non-negative")
-            m.addConstrs((z[s,a,i] >= 0 for s in SS for a in AS for i in IS), "z non-negative")
-            m.addConstrs((w[s,a,j] >= 0 for s in SS for a in AS for j in IS), "w non-negative")
-            
-            f = m.addVar(vtype=GRB.CONTINUOUS,name='f')
-            fc = m.addVar(vtype=GRB.CONTINUOUS,name='fc')
-            pc = m.addVar(vtype=GRB.CONTINUOUS,name='pc')
-            
-            # Non-negativity constraints
-            m.addConstr((f >= 0),"f non-negative")
-            m.addConstr((fc >= 0),"fc non-negative")
-            m.addConstr((pc >= 0),"pc non-negative")
-            m.addConstrs((hc[s] >= 0 for s in SS),"hc non-negative")
-            m.addConstrs((tc[s] >= 0 for s in SS),"tc non-negative")
-            m.addConstrs((wc[s] >= 0 for s in SS),"wc non-negative")
-            
-            print('define Constraint (2) ...\n')
-            m.addConstrs((sum(y[a,i] * V[a] for a in AS) <= sum(x[i,l] * U[l] for l in LS) for i in IS), 
-                        "Constraint (2)")
-            
-            print('define Constraint (3) ...\n')
-            m.addConstrs((z[s,a,i] == y[a,i] - sum(q[s,a,i,j] for j in IS) for a in AS for i in IS for s in SS), 
-                        "Constraint (3)")
-            
-            print('define Constraint (4) ...\n')
-            # C03
-            m.addConstrs((w[s,a,j] == D_sample[s,a,j] - sum(q[s,a,i,j] for i in IS) for a in AS for j in IS for s in SS), 
-                        "Constraint (4)")
-            
-            print('define Constraint (5) ...\n')
-            # C04
-            m.addConstrs((sum(x[i,l] for l in LS) <= 1 for i in IS), "Constraint (5)")
-            
-            
-            print('objective functions')
-            # C05
-            m.addConstrs((wc[s] == sum(PU[a] * w[s,a,j] 
-                                    for a in AS for j in IS) for s in SS), "Shortage Costs")
-                
-            m.addConstrs((hc[s] == sum(CH[a] * z[s,a,i] 
-                                    for a in AS for i in IS) for s in SS), "Surplus Costs")
-            
-            m.addConstrs((tc[s] == sum(CT[a] * H[i,j] * q[s,a,i,j] 
-                                    for a in AS for i in IS for j in IS) for s in SS), "Transportation Costs")
-            
-            print('define objective ...\n')
-            
-            # Objective
-            m.addConstr((fc == sum(CF[l] * x[i,l] for i in IS for l in LS)), "Fixed Facility Costs")
-            
-            m.addConstr((pc == sum(CP[a] * y[a,i] for a in AS for i in IS)), "Procurement Costs")
-            
-            m.addConstr((f == fc + pc + sum(pr_sample[s] * (tc[s] + hc[s] + wc[s]) for s in SS)), "Objective Function")
-            
-            m.setObjective((f), GRB.MINIMIZE)
-            
+            if template is not None:
+                # 复用模板模型，只更新样本需求与样本概率，Gurobi保留上一个样本组的求解信息；
+                # 要求与新建的模型逐位一致时先清除这些信息
+                print('update model ...\n')
+                handle = template
+                handle.update_scenarios(D_sample, pr_sample)
+                if policy is not None and policy.reproducible:
+                    handle.model.reset(1)
+            else:
+                # 在共享的Gurobi环境上创建新模型，LogFile与Threads已在环境中设置
+                handle = create_pooled_model(form, "getsol", policy.backend('replication') if policy is not None else 'gurobi', log_filename, 'replication')
+            m = handle.model
+            if policy is not None:
+                policy.apply(m, 'replication')
+
+            timer = None
+            if warm_start is not None:
+                warm_start.apply(handle)
+                timer = IncumbentTimer()
+
             print('solving ...\n')
             
-            m.optimize()
+            optimize_with_progress(handle, 'replication', timer)
             
-            if m.status == GRB.OPTIMAL:
+            if has_solution(m):
                 print('solved!')
                 
-                Vx1 = np.zeros((IS[-1]+1,LS[-1]+1))
-                Vy1 = np.zeros((AS[-1]+1,IS[-1]+1))
-                for i in IS:
-                    for l in LS:
-                        Vx1[i,l] = x[(i,l)].x
-                    for a in AS:
-                        Vy1[a,i] = y[(a,i)].x
-
-                Vf1 = m.getObjective().getValue()
-                Vfc1 = sum(CF[l] * Vx1[i,l] for i in IS for l in LS)
-                Vpc1 = sum(CP[a] * Vy1[a,i] for a in AS for i in IS)
-                Vtc1 = sum(pr_sample[s] * tc[s].x for s in SS)
-                Vhc1 = sum(pr_sample[s] * hc[s].x for s in SS)
-                Vwc1 = sum(pr_sample[s] * wc[s].x for s in SS)        
+                Vx1 = handle.values('x')
+                Vy1 = handle.values('y')
+
+                Vf1 = m.ObjVal
+                Vb1 = m.ObjBound
+                Vfc1 = float(np.sum(np.asarray(CF, dtype=float)[None, :] * Vx1))
+                Vpc1 = float(np.sum(np.asarray(CP, dtype=float)[:, None] * Vy1))
+                Vtc1 = float(pr_sample @ handle.values('tc'))
+                Vhc1 = float(pr_sample @ handle.values('hc'))
+                Vwc1 = float(pr_sample @ handle.values('wc'))
                 Vec1 = Vfc1+Vpc1+Vtc1+Vhc1
+                if warm_start is not None:
+                    warm_start.record(Vx1, Vy1, Vf1, timer, m.Runtime)
                 
-                return Vf1, Vec1, Vpc1, Vwc1, Vx1, Vy1  
+                return Vf1, Vec1, Vpc1, Vwc1, Vx1, Vy1, Vb1
                   
             
             else:
@@ -170,10 +140,15 @@ def getsol(IS,AS,LS,SS,CF,U,V,H,CP,CH,PU,CT,D_sample,pr_sample, log_filename, ma
             print('Error code ' + str(e.errno) + ": " + str(e))
             logging.error('Error code ' + str(e.errno) + ": " + str(e))
             attempt += 1
+
+        finally:
+            # 模板模型由调用者释放，其余模型在取得结果后立即释放
+            if template is None and handle is not None:
+                handle.model.dispose()
             
     print(f"Try to find an optimal solution for {attempt + 1} attempts.")
 
-def renew(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,new_x,new_y, log_filename, max_attempts):
+def renew(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,new_x,new_y, log_filename, max_attempts, recourse_integrality='auto', arcs=None, formulation='standard', policy=None):
     """
     重新解决优化模型。如果在优化过程中出现异常，会尝试重新执行，最多重试 max_attempts 次。
 
@@ -196,6 +171,10 @@ def renew(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,new_x,new_y, log_filename, max_a
     new_y: 新的y决策变量。
     log_filename: 日志文件名。
     max_attempts: 最大尝试次数。
+    recourse_integrality: 第二阶段变量q、z、w的整数性选项，默认'auto'在需求与库存均为整数时使用连续变量（结果不变），'integer'保留整数变量。
+    arcs: 保留的运输弧（见arc_pruning.build_arc_set），默认保留全部弧。
+    formulation: 'standard'为原模型，'lean'为不含成本变量与松弛变量z、w的精简模型（见model_builder.build_lean_form），结果相同。
+    policy: SolvePolicy对象，给定时按其'evaluation'阶段设置求解参数与求解器后端。
 
     返回:
     元组，包含优化后的成本和决策变量。
@@ -205,81 +184,32 @@ def renew(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,new_x,new_y, log_filename, max_a
     """
     # 配置日志以追加模式
     logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s', encoding='utf-8')
+    # 构建矩阵形式的模型，y固定为new_y
+    print('define model ...\n')
+    form = build_saa_form(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y=new_y, recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation)
     attempt = 0
     while attempt < max_attempts:
+        handle = None
         try:
-            # 创建新模型
-            m = Model("renew")
-            m.setParam('LogFile', log_filename)
-                
-            # create sets
-            IS = range(IS)
-            AS = range(AS)
-            LS = range(LS)
-            NS = range(NS)
-            
-            # create variables
-            print('define variables ...\n')
-            q = m.addVars(NS,AS,IS,IS,vtype=GRB.INTEGER, name="q")   
-            z = m.addVars(NS,AS,IS,vtype=GRB.INTEGER, name="z")
-            w = m.addVars(NS,AS,IS,vtype=GRB.INTEGER, name="w")
-            hc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="hc")
-            tc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="tc")
-            wc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="wc")
-            
-            # Non-negativity constraints
-            m.addConstrs((q[s,a,i,j] >= 0 for s in NS for a in AS for i in IS for j in IS), "q non-negative")
-            m.addConstrs((z[s,a,i] >= 0 for s in NS for a in AS for i in IS), "z non-negative")
-            m.addConstrs((w[s,a,j] >= 0 for s in NS for a in AS for j in IS), "w non-negative")
-            
-            f = m.addVar(vtype=GRB.CONTINUOUS,name='f')
-            
-            # Non-negativity constraints
-            m.addConstr((f >= 0),"f non-negative")
-            m.addConstrs((hc[s] >= 0 for s in NS),"hc non-negative")
-            m.addConstrs((tc[s] >= 0 for s in NS),"tc non-negative")
-            m.addConstrs((wc[s] >= 0 for s in NS),"wc non-negative")
-
-            print('define Constraint (3) ...\n')
-            m.addConstrs((z[s,a,i] == new_y[a,i] - sum(q[s,a,i,j] for j in IS) for a in AS for i in IS for s in NS), 
-                        "Constraint (3)")
-            
-            print('define Constraint (4) ...\n')
-            # C03
-            m.addConstrs((w[s,a,j] == D[s,a,j] - sum(q[s,a,i,j] for i in IS) for a in AS for j in IS for s in NS), 
-                        "Constraint (4)")
-            
-            print('objective functions')
-            # C05
-            m.addConstrs((wc[s] == sum(PU[a] * w[s,a,j] 
-                                    for a in AS for j in IS) for s in NS), "Shortage Costs")
-                
-            m.addConstrs((hc[s] == sum(CH[a] * z[s,a,i] 
-                                    for a in AS for i in IS) for s in NS), "Surplus Costs")
-            
-            m.addConstrs((tc[s] == sum(CT[a] * H[i,j] * q[s,a,i,j] 
-                                    for a in AS for i in IS for j in IS) for s in NS), "Transportation Costs")
-            
-            print('define objective ...\n')
-            
-            # Objective
-            
-            m.addConstr((f == sum(pr[s] * (tc[s] + hc[s] + wc[s]) for s in NS)), "Objective Function")
-            
-            m.setObjective((f), GRB.MINIMIZE)
-            
+            # 在共享的Gurobi环境上创建新模型
+            handle = create_pooled_model(form, "renew", policy.backend('evaluation') if policy is not None else 'gurobi', log_filename, 'evaluation')
+            m = handle.model
+            if policy is not None:
+                policy.apply(m, 'evaluation')
+
             print('solving ...\n')
             
-            m.optimize()
+            optimize_with_progress(handle, 'evaluation')
     
-            if m.status == GRB.OPTIMAL:
+            if has_solution(m):
                 print('solved!')
 
-                Vfc2 = sum(CF[l] * new_x[i,l] for i in IS for l in LS)
-                Vpc2 = sum(CP[a] * new_y[a,i] for a in AS for i in IS)
-                Vtc2 = sum(pr[s] * tc[s].x for s in NS)
-                Vhc2 = sum(pr[s] * hc[s].x for s in NS)
-                Vwc2 = sum(pr[s] * wc[s].x for s in NS)        
+                pr = np.asarray(pr, dtype=float)[:NS]
+                Vfc2 = float(np.sum(np.asarray(CF, dtype=float)[None, :] * new_x))
+                Vpc2 = float(np.sum(np.asarray(CP, dtype=float)[:, None] * new_y))
+                Vtc2 = float(pr @ handle.values('tc'))
+                Vhc2 = float(pr @ handle.values('hc'))
+                Vwc2 = float(pr @ handle.values('wc'))
                 Vf2 = Vfc2+Vpc2+Vtc2+Vhc2+Vwc2
                 
                 return Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2
@@ -295,9 +225,85 @@ def renew(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,new_x,new_y, log_filename, max_a
             logging.error('Error code ' + str(e.errno) + ": " + str(e))
             attempt += 1
 
+        finally:
+            if handle is not None:
+                handle.model.dispose()
+
     print(f"Try to find an optimal solution for {attempt} attempts.")
 
-def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index):
+def renew_batch(IS,AS,LS,NS,CF,U,V,H,CP,CH,PU,CT,D,pr,xx,yy, log_filename, max_attempts, recourse_integrality='auto', arcs=None, formulation='standard', policy=None):
+    """
+    在同一个renew模型上依次评估全部候选解，返回值与逐个调用renew的结果一致。
+
+    参数:
+    xx: 候选设施选址，形状为 (IS, LS, MS)。
+    yy: 候选库存，形状为 (AS, IS, MS)。
+    其余参数同renew。
+
+    返回:
+    元组 (new_f, new_fc, new_pc, new_tc, new_hc, new_wc)，形状均为 (MS, 1)，与solver中的同名数组一致。
+
+    功能:
+    各候选解的renew模型只有Constraint (3)右端项中的new_y不同。模型只构建一次，之后每个候选解只更新该右端项并重新求解，
+    Gurobi以上一次的最优基为起点求解，省去了MS次重复建模的开销。
+    """
+    # 配置日志以追加模式
+    logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s', encoding='utf-8')
+    MS = xx.shape[2]
+    results = np.zeros((6, MS, 1))
+    pr = np.asarray(pr, dtype=float)[:NS]
+
+    print('define model ...\n')
+    form = build_saa_form(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, fixed_y=yy[:, :, 0], recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation)
+    handle = create_pooled_model(form, "renew", policy.backend('evaluation') if policy is not None else 'gurobi', log_filename, 'evaluation')
+    m = handle.model
+    if policy is not None:
+        policy.apply(m, 'evaluation')
+
+    try:
+        for k in range(MS):
+            new_x = xx[:, :, k]
+            new_y = yy[:, :, k]
+            attempt = 0
+            while attempt < max_attempts:
+                try:
+                    handle.update_fixed_y(new_y)
+                    print(f'solving candidate {k} ...\n')
+
+                    with progress_bus().tag(candidate=k):
+                        optimize_with_progress(handle, 'evaluation')
+
+                    if has_solution(m):
+                        print('solved!')
+
+                        Vfc2 = float(np.sum(np.asarray(CF, dtype=float)[None, :] * new_x))
+                        Vpc2 = float(np.sum(np.asarray(CP, dtype=float)[:, None] * new_y))
+                        Vtc2 = float(pr @ handle.values('tc'))
+                        Vhc2 = float(pr @ handle.values('hc'))
+                        Vwc2 = float(pr @ handle.values('wc'))
+                        Vf2 = Vfc2+Vpc2+Vtc2+Vhc2+Vwc2
+                        results[:, k, 0] = [Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2]
+                        break
+
+                    else:
+                        print('Hmm, something went wrong! Status code:', m.status)
+                        attempt += 1
+
+                except GurobiError as e:
+                    print('Encountered a Gurobi error. Please check the Gurobi log for more details.')
+                    print('Error code ' + str(e.errno) + ": " + str(e))
+                    logging.error('Error code ' + str(e.errno) + ": " + str(e))
+                    attempt += 1
+
+            if attempt == max_attempts:
+                print(f"Try to find an optimal solution for {attempt} attempts.")
+    finally:
+        m.dispose()
+
+    new_f, new_fc, new_pc, new_tc, new_hc, new_wc = results
+    return new_f, new_fc, new_pc, new_tc, new_hc, new_wc
+
+def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index, recourse_integrality='auto', method='extensive', benders_cut_type='multi', arc_pruning=None, arc_radius=None, scenario_compaction=True, formulation='standard', policy=None, model_cache=None, flows_file=None):
     """
     执行Gurobi两阶段随机规划模型的精确解求解。
 
@@ -313,6 +319,18 @@ def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag,
     LS_init: 初始化的存储位置数量。
     Food_index: 食品类资源索引。
     Medicine_index: 药品类资源索引。
+    recourse_integrality: 第二阶段变量q、z、w的整数性选项，默认'auto'在需求与库存均为整数时使用连续变量（结果不变），'integer'保留整数变量。
+    method: 求解方式，'extensive'为直接求解完整模型，'benders'为使用benders_sp_model进行L-shaped分解求解，
+            'ph'为使用ph_sp_model进行渐进对冲求解（启发式，返回最好候选解的期望成本）。
+    benders_cut_type: L-shaped分解的割类型，'multi'或'single'。
+    arc_pruning: 运输弧裁剪方式，None为不裁剪，'exact'删除被支配的弧，'radius'另外只保留距离不超过arc_radius的弧。
+    arc_radius: 'radius'方式下的距离半径。
+    scenario_compaction: 是否在建模前合并需求相同的场景并累加概率，最优值不变。
+    formulation: 扩展式模型的形式，'standard'或'lean'，见getsol。
+    policy: SolvePolicy对象，按其'exact'阶段设置求解参数与求解器后端，默认TimeLimit为6000秒。
+    model_cache: ModelCache对象或缓存目录，给定时扩展式模型按输入数据与建模选项缓存在磁盘上，再次求解相同模型时直接读取模型文件。
+    flows_file: 第二阶段解的保存路径（.npz），默认None为不读取第二阶段变量q、z、w。给定时q以稀疏矩阵（见SAAGurobiModel.flows）
+                保存为flows_file，z、w保存在同名的 _zw.npz 文件中，场景为合并后的场景。
 
     返回:
     返回一个元组，包括精确解最优解、花费的时间、决策变量Vx和Vy。
@@ -320,11 +338,20 @@ def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag,
     功能:
     读取数据，构建模型并求解，最终将结果输出到文件。
     """
+    policy = policy or SolvePolicy()
+    if method == 'benders':
+        return benders_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index, benders_cut_type, policy)
+    if method == 'ph':
+        return ph_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag, log_filename, max_attempts, AS_init, LS_init, Food_index, Medicine_index, policy=policy)
+    if method != 'extensive':
+        raise ValueError(f'未知的精确解求解方式: {method}')
     # 配置日志以追加模式
     logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s')
     attempt = 0
     tic = time.perf_counter()
+    env_pool().reset_stats()
     while attempt < max_attempts:
+        handle = None
         try:
             print('define parameters ...\n')
             # CF, U, H, V, CP, CH, PU, CT, D, pr, demand = read_data(Input_file, IS_init, NS_init, AS_init, Food_index, Medicine_index, Raw_data_flag)
@@ -333,122 +360,66 @@ def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag,
             
             CF, U, H, V, CP, CH, PU, CT, D, pr, demand = read_data_from_redis(IS_init, NS_init, AS_init, Food_index, Medicine_index)
 
-            # create a new model
-            m = Model("two-stage_SP")
-            m.setParam('LogFile', log_filename)
-
-            # create sets
-            IS = range(IS_init)
-            NS = range(NS_init)
-            AS = range(AS_init)
-            LS = range(LS_init)
-
-            # create variables
-            print('define variables ...\n')
-            x = m.addVars(IS,LS,vtype=GRB.BINARY, name="x")
-            y = m.addVars(AS,IS,vtype=GRB.INTEGER, name="y")
-            q = m.addVars(NS,AS,IS,IS,vtype=GRB.INTEGER, name="q")   
-            z = m.addVars(NS,AS,IS,vtype=GRB.INTEGER, name="z")
-            w = m.addVars(NS,AS,IS,vtype=GRB.INTEGER, name="w")
-            hc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="hc")
-            tc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="tc")
-            wc = m.addVars(NS,vtype=GRB.CONTINUOUS, name="wc")
-
-            # Non-negativity constraints
-            m.addConstrs((y[a,i] >= 0 for a in AS for i in IS), "y non-negative")
-            m.addConstrs((q[s,a,i,j] >= 0 for s in NS for a in AS for i in IS for j in IS), "q non-negative")
-            m.addConstrs((z[s,a,i] >= 0 for s in NS for a in AS for i in IS), "z non-negative")
-            m.addConstrs((w[s,a,j] >= 0 for s in NS for a in AS for j in IS), "w non-negative")
-
-            f = m.addVar(vtype=GRB.CONTINUOUS,name='f')
-            fc = m.addVar(vtype=GRB.CONTINUOUS,name='fc')
-            pc = m.addVar(vtype=GRB.CONTINUOUS,name='pc')
-
-            # Non-negativity constraints
-            m.addConstr((f >= 0),"f non-negative")
-            m.addConstr((fc >= 0),"fc non-negative")
-            m.addConstr((pc >= 0),"pc non-negative")
-            m.addConstrs((hc[s] >= 0 for s in NS),"hc non-negative")
-            m.addConstrs((tc[s] >= 0 for s in NS),"tc non-negative")
-            m.addConstrs((wc[s] >= 0 for s in NS),"wc non-negative")
-
-            print('define Constraint (2) ...\n')
-            m.addConstrs((sum(y[a,i] * V[a] for a in AS) <= sum(x[i,l] * U[l] for l in LS) for i in IS), 
-                        "Constraint (2)")
-
-            print('define Constraint (3) ...\n')
-            m.addConstrs((z[s,a,i] == y[a,i] - sum(q[s,a,i,j] for j in IS) for a in AS for i in IS for s in NS), 
-                        "Constraint (3)")
-
-            print('define Constraint (4) ...\n')
-            # C03
-            m.addConstrs((w[s,a,j] == D[s,a,j] - sum(q[s,a,i,j] for i in IS) for a in AS for j in IS for s in NS), 
-                        "Constraint (4)")
-
-            print('define Constraint (5) ...\n')
-            # C04
-            m.addConstrs((sum(x[i,l] for l in LS) <= 1 for i in IS), "Constraint (5)")
-
-
-            print('objective functions')
-            # C05
-            m.addConstrs((wc[s] == sum(PU[a] * w[s,a,j] 
-                                    for a in AS for j in IS) for s in NS), "Shortage Costs")
-                
-            m.addConstrs((hc[s] == sum(CH[a] * z[s,a,i] 
-                                    for a in AS for i in IS) for s in NS), "Surplus Costs")
-
-            m.addConstrs((tc[s] == sum(CT[a] * H[i,j] * q[s,a,i,j] 
-                                    for a in AS for i in IS for j in IS) for s in NS), "Transportation Costs")
-
-            print('define objective ...\n')
-
-            # Objective
-            m.addConstr((fc == sum(CF[l] * x[i,l] for i in IS for l in LS)), "Fixed Facility Costs")
-
-            m.addConstr((pc == sum(CP[a] * y[a,i] for a in AS for i in IS)), "Procurement Costs")
-
-            m.addConstr((f == fc + pc + sum(pr[s] * (tc[s] + hc[s] + wc[s]) for s in NS)), "Objective Function")
-
-            m.setObjective((f), GRB.MINIMIZE)
+            NS_model = NS_init
+            if scenario_compaction:
+                D, pr, _ = compact_scenarios(D[:NS_init], pr, 'two-stage_SP')
+                NS_model = len(D)
+
+            arcs = None
+            if arc_pruning:
+                arcs, _ = build_arc_set(IS_init, AS_init, CH, PU, CT, H, arc_pruning, arc_radius)
+
+            # 模型缓存只用于Gurobi后端
+            use_cache = model_cache and policy.backend('exact') == 'gurobi'
+            if use_cache:
+                cache = model_cache if isinstance(model_cache, ModelCache) else ModelCache(model_cache)
+                cache_key = ModelCache.key("two-stage_SP", [CF, U, V, H[:IS_init, :IS_init], CP, CH, PU, CT, D, pr],
+                                           {'IS': IS_init, 'AS': AS_init, 'LS': LS_init, 'NS': NS_model, 'formulation': formulation,
+                                            'recourse_integrality': recourse_integrality,
+                                            'arcs': None if arcs is None else dataset_fingerprint(arcs)})
+                load_tic = time.perf_counter()
+                handle = cache.load(cache_key, env_pool().get(log_filename))
+                if handle is not None:
+                    env_pool().record('exact', time.perf_counter() - load_tic)
+
+            if handle is None:
+                # create a new model
+                print('define model ...\n')
+                form = build_saa_form(IS_init, AS_init, LS_init, NS_model, CF, U, V, H, CP, CH, PU, CT, D, pr, recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation)
+                handle = create_pooled_model(form, "two-stage_SP", policy.backend('exact'), log_filename, 'exact')
+                if use_cache:
+                    cache.store(cache_key, handle)
+            form = handle.form
+            m = handle.model
 
             #output result within given time
-            m.setParam('TimeLimit', 6000)
+            policy.apply(m, 'exact')
 
             print('solving ...\n')
 
-            m.optimize()
+            optimize_with_progress(handle, 'exact')
 
             # Work in progress
-            if m.status == GRB.OPTIMAL:
-
-                Vx = np.zeros((IS[-1]+1,LS[-1]+1))
-                Vy = np.zeros((AS[-1]+1,IS[-1]+1))
-                Vq = np.zeros((NS[-1]+1,AS[-1]+1,IS[-1]+1,IS[-1]+1))
-                Vz = np.zeros((NS[-1]+1,AS[-1]+1,IS[-1]+1))
-                Vw = np.zeros((NS[-1]+1,AS[-1]+1,IS[-1]+1))
-                #Vtc = np.zeros((NS[-1]+1,1))
-                #Vhc = np.zeros((NS[-1]+1,1))
-                #Vwc = np.zeros((NS[-1]+1,1))
-                for i in IS:
-                    for l in LS:
-                        Vx[i,l] = x[(i,l)].x
-                    for a in AS:
-                        Vy[a,i] = y[(a,i)].x
-                        for s in NS:
-                            for j in IS:
-                                Vq[s,a,i,j] = q[(s,a,i,j)].x
-                            Vz[s,a,i] = z[(s,a,i)].x
-                            Vw[s,a,i] = w[(s,a,i)].x
-                            #Vtc[s,1] = tc[s].x
-                            #Vhc[s,1] = w[s].x
-                            #Vwc[s,1] = w[s].x
-                Vfc = fc.x
-                Vpc = pc.x
-                Vtc = sum(pr[s] * tc[s].x for s in NS)
-                Vhc = sum(pr[s] * hc[s].x for s in NS)
-                Vwc = sum(pr[s] * wc[s].x for s in NS)        
-                Vf = m.getObjective().getValue()
+            if has_solution(m):
+
+                Vx = handle.values('x')
+                Vy = handle.values('y')
+                if flows_file:
+                    extract_tic = time.perf_counter()
+                    Vq = handle.flows()
+                    Vz = handle.values('z')
+                    Vw = handle.values('w')
+                    sp.save_npz(flows_file, Vq)
+                    np.savez_compressed(flows_file.replace('.npz', '') + '_zw.npz', z=Vz, w=Vw, pr=pr)
+                    extract_time = time.perf_counter() - extract_tic
+                    print(f"Second-stage solution ({Vq.nnz} nonzero flows) saved to {flows_file} in {extract_time} seconds")
+                    logging.info(f"Second-stage solution ({Vq.nnz} nonzero flows) saved to {flows_file} in {extract_time} seconds")
+                Vfc = float(handle.values('fc')[0])
+                Vpc = float(handle.values('pc')[0])
+                Vtc = float(pr @ handle.values('tc'))
+                Vhc = float(pr @ handle.values('hc'))
+                Vwc = float(pr @ handle.values('wc'))
+                Vf = m.ObjVal
                 
                 toc = time.perf_counter()
                 elapsed_time = toc - tic
@@ -456,15 +427,18 @@ def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag,
                 save_and_print_results('gurobi_Original', Output_file, Vx, Vy, IS_init, NS_init, 0, 0, Vf, elapsed_time, 0, 0)
                 # 打印结果
                 print(f"Method: gurobi_Original")
-                print(f"I: {max(IS)+1}, S: {max(NS)+1}")    
+                print(f"I: {IS_init}, S: {NS_init}")    
                 print(f"Costs: {float(Vf)}, gap: 0 %")
                 print(f"Elapsed time: {elapsed_time} seconds.")
+                print(f"Solve policy: {policy.describe()}, MIP gap: {m.MIPGap}")
                 # 记录结果
                 logging.info('--------------------------------------------')
                 logging.info(f"Method: gurobi_Original")
-                logging.info(f"I: {max(IS)+1}, S: {max(NS)+1}")     
+                logging.info(f"I: {IS_init}, S: {NS_init}")     
                 logging.info(f"Costs: {float(Vf)}, gap: 0 %")
                 logging.info(f"Elapsed time: {elapsed_time} seconds.")
+                logging.info(f"Solve policy: {policy.describe()}, MIP gap: {m.MIPGap}")
+                env_pool().report()
                 logging.info('--------------------------------------------')
 
                 return Vf,elapsed_time,Vx,Vy.T
@@ -480,9 +454,13 @@ def two_stage_sp_model(IS_init, NS_init, Input_file, Output_file, Raw_data_flag,
             print('Encountered a Gurobi error. Please check the Gurobi log for more details.')
             attempt += 1
 
+        finally:
+            if handle is not None:
+                handle.model.dispose()
+
     print(f"Try to find an optimal solution for {attempt} attempts.")
 
-def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_METHOD, IS, NS, MS, SS_SAA, Graphs_sample_save_directory, Graphs_cluster_save_directory, Input_file, Output_file, gurobi_opt, Raw_data_flag, log_filename, max_attempts, AS, LS, Food_index, Medicine_index, DATA_PROCESS_PARAMS, CLUSTER_PARAMS, GRAPH_CONFIG):
+def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_METHOD, IS, NS, MS, SS_SAA, Graphs_sample_save_directory, Graphs_cluster_save_directory, Input_file, Output_file, gurobi_opt, Raw_data_flag, log_filename, max_attempts, AS, LS, Food_index, Medicine_index, DATA_PROCESS_PARAMS, CLUSTER_PARAMS, GRAPH_CONFIG, evaluation_method='gurobi', recourse_integrality='auto', reuse_getsol_model=True, warm_start=None, warm_start_store='warm_start.json', parallel_workers=None, arc_pruning=None, arc_radius=None, scenario_compaction=True, formulation='standard', solve_policy=None, gap_tolerance=None, min_replications=3, confidence=0.95, sample_growth=None, candidate_cache=None, out_of_sample=None, out_of_sample_chunk=10000, screening=None, first_stage_search=None, upper_bound_source=None):
     """
     SAA算法核心框架，整合数据处理、聚类分析、样本生成、图表生成和近似解求解过程。
 
@@ -510,6 +488,44 @@ def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_ME
     DATA_PROCESS_PARAMS: 数据处理参数。
     CLUSTER_PARAMS: 聚类参数。
     GRAPH_CONFIG: 图表配置参数。
+    evaluation_method: 候选解评估方式，'gurobi'为逐个调用renew，'batched'为在同一个renew模型上依次更新new_y求解，
+                       'vectorized'为使用recourse_evaluator批量求解，无需Gurobi许可证。
+    recourse_integrality: getsol与renew中第二阶段变量的整数性选项。
+    reuse_getsol_model: 是否对样本数量相同的样本组复用同一个getsol模型，只更新样本需求与样本概率后重新求解。
+    warm_start: getsol初始解来源的列表，可选'ev'（期望值问题）、'incumbent'（之前样本组中最好的解）与'store'（历史求解结果），默认不设置初始解。
+    warm_start_store: 保存历史求解结果的文件路径。
+    parallel_workers: 并行求解getsol与renew的进程数，默认为None即顺序求解；并行时每个样本组单独建模，
+                      solve_policy中的threads相同时结果与顺序求解逐位一致（复用的getsol模型在求解前清除之前的解）。
+                      依赖样本组求解顺序的选项（'incumbent'初始解、adaptive_gap、gap_tolerance与sample_growth）不能与并行求解同时使用。
+    arc_pruning: 运输弧裁剪方式，None为不裁剪，'exact'删除被支配的弧（结果不变），'radius'另外只保留距离不超过arc_radius的弧（近似）。
+    arc_radius: 'radius'方式下的距离半径。
+    scenario_compaction: 是否合并每个样本组以及候选解评估所用的全部场景中需求相同的场景并累加概率，结果不变。
+    formulation: getsol、renew与renew_batch中模型的形式，'standard'或'lean'，见getsol。
+    solve_policy: SolvePolicy对象或字典（见SolvePolicy.from_dict），设置getsol与renew的求解参数，默认使用SolvePolicy()。
+                  adaptive_gap为True时每完成一个样本组按ff的离散程度调整样本组求解的MIPGap。
+    gap_tolerance: 序贯停止的gap容差（百分比），默认None为求解全部MS个样本组。顺序求解时，至少完成min_replications个样本组后，
+                   若最优性gap置信区间的上端（见saa_bounds.optimality_gap）不超过gap_tolerance，则不再求解剩余的样本组。
+    min_replications: 序贯停止前至少求解的样本组数量。
+    confidence: 统计界的置信水平。
+    sample_growth: 序贯抽样选项，SampleSizeSchedule对象或字典（见SampleSizeSchedule.from_dict），默认None为使用抽样方法返回的样本数量。
+                   给定时每一步抽取MS个样本数量为SS的样本组并顺序求解，SS从initial_size（默认为聚类数量）开始按growth倍增长，
+                   以上一步的最好解为初始解，gap置信区间的上端不超过gap_tolerance时停止，最后一步的样本组用于候选解评估，
+                   每一步的SS、耗时与统计界记录在schedule.trajectory中。
+    candidate_cache: CandidateCache对象或缓存文件路径，给定时以取整后的x、y与评估数据的指纹为键缓存候选解的评估结果，
+                     重复的候选解只评估一次，缓存文件在多次求解之间复用。
+    out_of_sample: 样本外场景来源（.npy文件路径、'redis'或场景来源对象，见out_of_sample.scenario_source），默认None为不进行样本外评估。
+                   给定时在候选解评估之后，按块读取样本外场景重新评估各个不同的候选解，并按样本外期望成本选择最终解。
+    out_of_sample_chunk: 样本外评估每块的场景数量。
+    screening: 样本组筛选选项，ReplicationScreening对象或字典（见ReplicationScreening.from_dict），默认None为求解全部样本组的MIP。
+               给定时先求解各样本组的LP松弛并按取整候选解的质量排序，只对前top_k个样本组求解MIP，统计下界改用全部样本组的LP松弛目标值；
+               审计模式下仍求解全部样本组并统计最终解来自筛选集合的比例。不能与sample_growth同时使用。
+    first_stage_search: 启发式搜索选项，FirstStageSearch对象或字典（见FirstStageSearch.from_dict），默认None为用getsol求解样本组。
+                        给定时各样本组改用模拟退火搜索，不求解MIP，每个样本组的最好解作为该样本组的结果，候选解池中的其余解追加为候选解，
+                        一起进行候选解评估；此时ff为启发式解的目标值估计，不是统计下界，因此不计算与报告SAA统计界。
+                        不能与sample_growth、screening、gap_tolerance或upper_bound_source同时使用。
+    upper_bound_source: 估计SAA上界所用的独立场景来源（同out_of_sample），默认None时使用out_of_sample给定的样本外场景，
+                        两者均未给定时上界为最终解在全部NS个评估场景上的期望成本，即目标问题上的精确成本，不附加置信区间；
+                        只有独立的样本外场景才给出上界的t区间。序贯停止时的上界总是使用评估场景。
 
     返回:
     返回一个元组，包括脚本名、最优解、花费的时间、gap值、决策变量Vx和Vy以及输出文件路径。
@@ -521,6 +537,8 @@ def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_ME
     logging.basicConfig(filename=log_filename, filemode='a', level=logging.INFO, format='%(message)s', encoding='utf-8')
     
     tic = time.perf_counter()
+    # 模型创建耗时按本次求解统计
+    env_pool().reset_stats()
     
     # CF, U, H, V, CP, CH, PU, CT, D, pr, demand = read_data_old(Input_file, IS, NS, AS, Food_index, Medicine_index)
 
@@ -530,6 +548,8 @@ def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_ME
 
     # 保存变量
     ff = np.zeros((MS, 1))
+    # 各样本组MIP的最优值下界，用于估计SAA下界
+    fb = np.zeros((MS, 1))
     ec = np.zeros((MS, 1))
     pc = np.zeros((MS, 1))
     wc = np.zeros((MS, 1))
@@ -578,64 +598,275 @@ def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_ME
         # 如果Graphs_cluster_save_directory是空字符串或None，则跳过执行
         print("Cluster plots generation skipped due to empty or None Graphs_cluster_save_directory.")
 
-    for m in range(MS):
-
-        sample, sample_methods = sample_generator.generate(demand, cluster_labels, cluster_num)
-
-        SS = len(sample)
-        pr_sample = np.ones(SS) / SS
-
-        D_sample = np.zeros((SS, AS, IS))
-        for s in range(SS):
-            for a in range(AS):
-                for j in range(IS):
-                    D_sample[s, a, j] = D[sample[s], a, j]
-
-        demand_sample = np.zeros((SS, IS))
-        for s in range(SS):
-            for j in range(IS):
-                demand_sample[s, j] = demand[sample[s], j]
-        for j in range(IS):
-            sum_sample[m, j] = sum(demand_sample)[j]
-
-        [Vf1, Vec1, Vpc1, Vwc1, Vx1, Vy1] = getsol(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_sample, pr_sample, log_filename, max_attempts)
-
-        # obtain variables
-        ff[m] = Vf1
-        ec[m] = Vec1
-        pc[m] = Vpc1
-        wc[m] = Vwc1
-        xx[:, :, m] = np.round(Vx1)
-        yy[:, :, m] = np.round(Vy1)
-
-        samples_info.append((sample, script_name, m))
-
-
-    for m in range(MS):
-        new_x = xx[:, :, m]
-        new_y = yy[:, :, m]
-        [Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2] = renew(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, new_x, new_y, log_filename, max_attempts)
+    # 运输弧预处理
+    arcs = None
+    if arc_pruning:
+        arcs, _ = build_arc_set(IS, AS, CH, PU, CT, H, arc_pruning, arc_radius)
+
+    # 求解策略
+    policy = solve_policy if isinstance(solve_policy, SolvePolicy) else SolvePolicy.from_dict(solve_policy)
+    if parallel_workers:
+        # 并行求解的结果须与顺序求解一致，不支持依赖样本组求解顺序的选项
+        if warm_start and 'incumbent' in warm_start:
+            raise ValueError("并行求解不能使用'incumbent'初始解")
+        if policy.adaptive_gap:
+            raise ValueError('并行求解不能与adaptive_gap同时使用')
+        if gap_tolerance is not None:
+            raise ValueError('并行求解不能与序贯停止同时使用')
+        if sample_growth is not None:
+            raise ValueError('并行求解不能与序贯抽样同时使用')
+
+    # 初始解
+    warm_start_engine = None
+    if warm_start:
+        warm_start_engine = WarmStartEngine(warm_start, IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, warm_start_store, recourse_integrality)
+
+    # 先生成全部样本组，再按样本数量SS分组求解
+    D_samples = []
+    pr_samples = []
+    if sample_growth is None:
+        for m in range(MS):
+
+            sample, sample_methods = sample_generator.generate(demand, cluster_labels, cluster_num)
+
+            SS = len(sample)
+
+            D_sample = D[sample]
+            sum_sample[m] = demand[sample, :IS].sum(axis=0)
+
+            pr_sample = np.ones(SS) / SS
+            if scenario_compaction:
+                D_sample, pr_sample, _ = compact_scenarios(D_sample, pr_sample, f'sample {m}')
+
+            D_samples.append(D_sample)
+            pr_samples.append(pr_sample)
+            samples_info.append((sample, script_name, m))
+
+    # 候选解评估所用的全部场景
+    NS_eval, D_eval, pr_eval = NS, D, pr
+    if scenario_compaction:
+        D_eval, pr_eval, _ = compact_scenarios(D[:NS], pr, 'evaluation')
+        NS_eval = len(D_eval)
+
+    # 上界估计所用的场景，与候选解的选择相互独立
+
+    # 样本组筛选：只对LP松弛排名靠前的样本组求解MIP
+    screen = None
+    active = list(range(MS))
+    if screening is not None:
+        if sample_growth is not None:
+            raise ValueError('样本组筛选不能与序贯抽样同时使用')
+        screen = screening if isinstance(screening, ReplicationScreening) else ReplicationScreening.from_dict(screening)
+        active = screen.screen(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_samples, pr_samples, D_eval, pr_eval, log_filename,
+                               recourse_integrality, arcs, formulation, policy)
+
+    search = None
+    if first_stage_search is not None:
+        if sample_growth is not None or screening is not None:
+            raise ValueError('启发式搜索不能与序贯抽样或样本组筛选同时使用')
+        if gap_tolerance is not None or upper_bound_source is not None:
+            raise ValueError('启发式搜索不能与依赖SAA统计界的gap_tolerance或upper_bound_source同时使用')
+        search = first_stage_search if isinstance(first_stage_search, FirstStageSearch) else FirstStageSearch.from_dict(first_stage_search)
+    # 启发式搜索的候选解池中各样本组最好解之外的候选解
+    pool_candidates = []
+
+    getsol_results = [None] * MS
+    # 序贯停止时各样本组候选解在评估场景下的期望成本（用于选择）与各场景的总成本（用于上界）
+    candidate_scenario_costs = {}
+    schedule = None
+    if sample_growth is not None:
+        schedule = sample_growth if isinstance(sample_growth, SampleSizeSchedule) else SampleSizeSchedule.from_dict(sample_growth)
+        template_factory = None
+        if reuse_getsol_model:
+            template_factory = lambda SS, D_sample, pr_sample: create_pooled_model(
+                build_saa_form(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_sample, pr_sample, recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation),
+                "getsol", policy.backend('replication'), log_filename, 'replication')
+        getsol_results, samples, _ = sequential_saa(getsol, schedule, IS, AS, LS, NS, MS, CF, U, V, H, CP, CH, PU, CT, D, demand, cluster_labels, cluster_num, SAMPLE_GENERATE_METHOD,
+                                                    D_eval, pr_eval, log_filename, max_attempts, recourse_integrality, warm_start_engine, arcs, formulation,
+                                                    policy, scenario_compaction, gap_tolerance, min_replications, confidence, template_factory)
+        samples_info = [(sample, script_name, m) for m, sample in enumerate(samples)]
+    elif search is not None:
+        for m in range(MS):
+            pool = search.search(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_samples[m], pr_samples[m], arcs, m)
+            best = pool[0]
+            getsol_results[m] = (best['f'], best['fc'] + best['pc'] + best['tc'] + best['hc'], best['pc'], best['wc'], best['x'], best['y'], np.nan)
+            pool_candidates.extend((candidate['x'], candidate['y']) for candidate in pool[1:])
+    elif parallel_workers:
+        # 各样本组互相独立，分配到多个进程中求解
+        tasks = [(IS, AS, LS, len(D_samples[m]), CF, U, V, H, CP, CH, PU, CT, D_samples[m], pr_samples[m],
+                  log_filename, max_attempts, recourse_integrality, None, warm_start_engine, arcs, formulation, policy) for m in active]
+        for m, result in zip(active, run_parallel(getsol, tasks, parallel_workers, threads=policy.threads)):
+            getsol_results[m] = result
+    else:
+        buckets = {}
+        for m in active:
+            buckets.setdefault(len(D_samples[m]), []).append(m)
+
+        for SS, members in buckets.items():
+            # 同一SS的样本组共用一个getsol模型，模型只构建一次
+            template = None
+            if reuse_getsol_model:
+                form = build_saa_form(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_samples[members[0]], pr_samples[members[0]], recourse_integrality=recourse_integrality, arcs=arcs, formulation=formulation)
+                template = create_pooled_model(form, "getsol", policy.backend('replication'), log_filename, 'replication')
+
+            stopped = False
+            for m in members:
+                with progress_bus().tag(replication=m):
+                    getsol_results[m] = getsol(IS, AS, LS, SS, CF, U, V, H, CP, CH, PU, CT, D_samples[m], pr_samples[m], log_filename, max_attempts, recourse_integrality, template, warm_start_engine, arcs, formulation, policy)
+                solved_values = [result[0] for result in getsol_results if result is not None]
+                policy.adapt(solved_values)
+                # 下界由各样本组MIP的ObjBound估计，MIPGap不为0时ObjVal不是有效的下界
+                solved_bounds = [result[6] for result in getsol_results if result is not None]
+
+                if gap_tolerance is not None:
+                    # 以已求解样本组中期望成本最小的候选解在各评估场景上的总成本估计上界
+                    new_x, new_y = np.round(getsol_results[m][4]), np.round(getsol_results[m][5])
+                    candidate_scenario_costs[m] = candidate_costs(IS, AS, LS, NS_eval, CF, CP, CH, PU, CT, H, D_eval, pr_eval, new_x, new_y, arcs)
+                    best = min(candidate_scenario_costs, key=lambda k: candidate_scenario_costs[k][0])
+                    bounds = optimality_gap(solved_bounds, candidate_scenario_costs[best][1], pr_eval, confidence)
+                    report_bounds(bounds, len(solved_values), confidence)
+                    if should_stop(bounds, len(solved_values), gap_tolerance, min_replications):
+                        stopped = True
+                        break
+
+            if template is not None:
+                template.model.dispose()
+            if stopped:
+                print(f"Gap CI below {gap_tolerance} %, stopped after {len(solved_values)} of {MS} replications")
+                logging.info(f"Gap CI below {gap_tolerance} %, stopped after {len(solved_values)} of {MS} replications")
+                break
+
+    # 序贯停止或样本组筛选时只保留已求解的样本组
+    solved = [m for m in range(MS) if getsol_results[m] is not None]
+    if len(solved) < MS:
+        MS = len(solved)
+        ff, fb, ec, pc, wc = ff[:MS], fb[:MS], ec[:MS], pc[:MS], wc[:MS]
+        xx, yy, sum_sample = xx[:, :, :MS], yy[:, :, :MS], sum_sample[solved]
+        new_f, new_fc, new_pc, new_tc, new_hc, new_wc = new_f[:MS], new_fc[:MS], new_pc[:MS], new_tc[:MS], new_hc[:MS], new_wc[:MS]
+        samples_info = [samples_info[m] for m in solved]
+
+    for k, m in enumerate(solved):
+        [Vf1, Vec1, Vpc1, Vwc1, Vx1, Vy1, Vb1] = getsol_results[m]
 
         # obtain variables
-        new_f[m] = Vf2
-        new_fc[m] = Vfc2
-        new_pc[m] = Vpc2
-        new_tc[m] = Vtc2
-        new_hc[m] = Vhc2
-        new_wc[m] = Vwc2
+        ff[k] = Vf1
+        fb[k] = Vb1
+        ec[k] = Vec1
+        pc[k] = Vpc1
+        wc[k] = Vwc1
+        xx[:, :, k] = np.round(Vx1)
+        yy[:, :, k] = np.round(Vy1)
+
+    if pool_candidates:
+        # 候选解池中的其余候选解追加在各样本组的候选解之后
+        xx = np.concatenate([xx, np.stack([x for x, _ in pool_candidates], axis=2)], axis=2)
+        yy = np.concatenate([yy, np.stack([y for _, y in pool_candidates], axis=2)], axis=2)
+        new_f, new_fc, new_pc, new_tc, new_hc, new_wc = (np.zeros((xx.shape[2], 1)) for _ in range(6))
+    n_candidates = xx.shape[2]
+
+    # 候选解评估缓存：重复的候选解与之前求解中评估过的候选解无需重新评估
+    cache = None
+    eval_index = list(range(n_candidates))
+    if candidate_cache:
+        cache = candidate_cache if isinstance(candidate_cache, CandidateCache) else CandidateCache(candidate_cache)
+        # 评估方式、后端、模型形式与评估阶段的求解参数不同时结果可能不同（例如放宽的MIPGap），不共用缓存
+        evaluation_params = ','.join(f'{param}={value}' for param, value in policy.stages['evaluation'].items())
+        fingerprint = (f"{dataset_fingerprint(CF, U, V, H, CP, CH, PU, CT, D_eval, pr_eval, arcs if arcs is not None else [])}_{recourse_integrality}"
+                       f"_{evaluation_method}_{policy.backend('evaluation')}_{formulation}_{evaluation_params}")
+        cached, pending = cache.plan([cache.key(fingerprint, xx[:, :, m], yy[:, :, m]) for m in range(n_candidates)])
+        eval_index = [members[0] for members in pending.values()]
+    xx_eval = xx[:, :, eval_index]
+    yy_eval = yy[:, :, eval_index]
+
+    if not eval_index:
+        # 全部候选解均已缓存
+        pass
+    elif evaluation_method == 'vectorized':
+        new_f[eval_index], new_fc[eval_index], new_pc[eval_index], new_tc[eval_index], new_hc[eval_index], new_wc[eval_index], _ = evaluate_candidates(IS, AS, LS, NS_eval, CF, CP, CH, PU, CT, H, D_eval, pr_eval, xx_eval, yy_eval, arcs)
+    elif evaluation_method == 'batched':
+        new_f[eval_index], new_fc[eval_index], new_pc[eval_index], new_tc[eval_index], new_hc[eval_index], new_wc[eval_index] = renew_batch(IS, AS, LS, NS_eval, CF, U, V, H, CP, CH, PU, CT, D_eval, pr_eval, xx_eval, yy_eval, log_filename, max_attempts, recourse_integrality, arcs, formulation, policy)
+    elif evaluation_method == 'gurobi':
+        if parallel_workers:
+            tasks = [(IS, AS, LS, NS_eval, CF, U, V, H, CP, CH, PU, CT, D_eval, pr_eval, xx[:, :, m], yy[:, :, m], log_filename, max_attempts, recourse_integrality, arcs, formulation, policy) for m in eval_index]
+            renew_results = run_parallel(renew, tasks, parallel_workers, threads=policy.threads)
+        for k, m in enumerate(eval_index):
+            new_x = xx[:, :, m]
+            new_y = yy[:, :, m]
+            if parallel_workers:
+                [Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2] = renew_results[k]
+            else:
+                with progress_bus().tag(candidate=m):
+                    [Vf2, Vfc2, Vpc2, Vtc2, Vhc2, Vwc2] = renew(IS, AS, LS, NS_eval, CF, U, V, H, CP, CH, PU, CT, D_eval, pr_eval, new_x, new_y, log_filename, max_attempts, recourse_integrality, arcs, formulation, policy)
+
+            # obtain variables
+            new_f[m] = Vf2
+            new_fc[m] = Vfc2
+            new_pc[m] = Vpc2
+            new_tc[m] = Vtc2
+            new_hc[m] = Vhc2
+            new_wc[m] = Vwc2
+    else:
+        raise ValueError(f'未知的候选解评估方式: {evaluation_method}')
+
+    if cache is not None:
+        new_results = [new_f, new_fc, new_pc, new_tc, new_hc, new_wc]
+        for key, members in pending.items():
+            result = [float(values[members[0], 0]) for values in new_results]
+            cache.put(key, result)
+            cached.update({m: result for m in members[1:]})
+        for m, result in cached.items():
+            for values, value in zip(new_results, result):
+                values[m] = value
+        cache.save()
+        cache.report()
 
     # finding optimal solution
     opt_f = min(new_f)
     min_m = np.where(new_f == opt_f)
 
     costs = pd.DataFrame([new_f[min_m], new_fc[min_m], new_pc[min_m], new_tc[min_m], new_hc[min_m], new_wc[min_m]]).T
-    Vx = np.zeros((IS, LS))
-    Vy = np.zeros((AS, IS))
-    for i in range(IS):
-        for l in range(LS):
-            Vx[i, l] = xx[i, l, min_m[0]]
-        for a in range(AS):
-            Vy[a, i] = yy[a, i, min_m[0]]
+    Vx = xx[:, :, min_m[0][0]].copy()
+    Vy = yy[:, :, min_m[0][0]].copy()
+
+    if out_of_sample is not None:
+        # 样本外评估：在独立的大规模场景集上重新评估各个不同的候选解，按样本外期望成本选择最终解
+        candidates = np.unique(np.concatenate([xx.reshape(-1, n_candidates), yy.reshape(-1, n_candidates)]).T, axis=0, return_index=True)[1]
+        oos = evaluate_out_of_sample(IS, AS, CF, CP, CH, PU, CT, H, out_of_sample, xx[:, :, candidates], yy[:, :, candidates], Food_index, Medicine_index, out_of_sample_chunk, arcs, confidence)
+        report_out_of_sample(oos, confidence, candidates)
+        best = int(np.argmin(oos['f']))
+        oos_upper = source_upper_bound(oos, best, confidence)
+        min_m = (np.array([candidates[best]]),)
+        opt_f = np.array([oos['f'][best]])
+        Vx = xx[:, :, candidates[best]].copy()
+        Vy = yy[:, :, candidates[best]].copy()
+
+    if warm_start_engine is not None:
+        warm_start_engine.save(Vx, Vy, float(opt_f[0]))
+
+    if screen is not None:
+        screen.record(solved[min_m[0][0]])
+    # 最终解的SAA统计界：下界由各样本组MIP的最优值下界fb估计，上界为最终解在评估场景上的期望成本，给定独立的样本外场景时改用其t区间
+    # 启发式搜索的样本组目标值不是样本组问题的最优值或其下界，此时不计算统计界
+    bounds = None
+    if search is None:
+        # 评估场景是目标问题的全部场景，最终解的评估结果即其精确成本
+        upper = (float(new_f[min_m[0][0], 0]), 0.0)
+        if upper_bound_source is not None:
+            upper = source_upper_bound(evaluate_out_of_sample(IS, AS, CF, CP, CH, PU, CT, H, upper_bound_source, Vx[:, :, None], Vy[:, :, None],
+                                                              Food_index, Medicine_index, out_of_sample_chunk, arcs, confidence), 0, confidence)
+        elif out_of_sample is not None:
+            upper = oos_upper
+        lower_values = fb
+        if screen is not None and not screen.audit:
+            # 只求解了部分样本组的MIP，以全部样本组的LP松弛目标值估计下界
+            lower_values = screen.relaxed[np.isfinite(screen.relaxed)]
+        bounds = optimality_gap(lower_values, confidence=confidence, upper=upper)
+
+    if arc_pruning == 'radius':
+        # 近似裁剪：比较最终解在裁剪前后的期望第二阶段成本
+        deviation, relative = arc_cost_deviation(IS, AS, NS_eval, CH, PU, CT, H, D_eval, pr_eval, Vy, arcs)
+        print(f"Arc pruning (radius {arc_radius}): cost deviation {deviation} ({relative * 100} %)")
+        logging.info(f"Arc pruning (radius {arc_radius}): cost deviation {deviation} ({relative * 100} %)")
 
     toc = time.perf_counter()
     elapsed_time = toc - tic
@@ -648,19 +879,31 @@ def solver(DATA_PROCESS_METHOD, CLUSTER_METHOD, SAMPLE_GENERATE_METHOD, GRAPH_ME
         # 如果Graphs_sample_save_directory是空字符串或None，则跳过执行
         print("Sample plots generation skipped due to empty or None Graphs_sample_save_directory.")
 
-    # gap_percentage = calculate_gap(ff, MS, gurobi_opt)
-    gap = float((opt_f - gurobi_opt) / gurobi_opt * 100)
+    gap = float((opt_f[0] - gurobi_opt) / gurobi_opt * 100)
     save_and_print_results(script_name, Output_file, Vx, Vy, IS, NS, MS, SS_SAA, opt_f, elapsed_time, cluster_num, gap)
     # 打印结果
     print(f"Method: {script_name}")
     print(f"I: {IS}, S: {NS}, M: {MS}, N: {SS_SAA}, clustering_num: {cluster_num}")    
     print(f"Costs: {float(opt_f[0])}, gap: {gap} %")
     print(f"Elapsed time: {elapsed_time} seconds.")
+    print(f"Solve policy: {policy.describe()}")
     logging.info('--------------------------------------------')
     logging.info(f"Method: {script_name}")
     logging.info(f"I: {IS}, S: {NS}, M: {MS}, N: {SS_SAA}, clustering_num: {cluster_num}")    
     logging.info(f"Costs: {float(opt_f[0])}, gap: {gap} %")
     logging.info(f"Elapsed time: {elapsed_time} seconds.")
+    logging.info(f"Solve policy: {policy.describe()}")
+    if bounds is not None:
+        report_bounds(bounds, len(lower_values), confidence)
+    if schedule is not None:
+        print(f"Sample size trajectory: {schedule.describe()}")
+        logging.info(f"Sample size trajectory: {schedule.describe()}")
+    if screen is not None:
+        screen.report()
+    if search is not None:
+        print(f"First-stage search: {n_candidates} candidates, replication objectives are heuristic estimates, SAA bounds are not reported")
+        logging.info(f"First-stage search: {n_candidates} candidates, replication objectives are heuristic estimates, SAA bounds are not reported")
+    env_pool().report()
     logging.info('--------------------------------------------')
     return script_name, opt_f, elapsed_time, gap, Vx, Vy.T, Output_file
 
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+运输弧裁剪的一致性测试：arc_pruning='exact'只删除被支配的弧，扩展式模型的最优值、x与候选解的评估结果应与不裁剪时相同。
+需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from arc_pruning import build_arc_set
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index
+from recourse_evaluator import evaluate_candidate
+from solve_policy import SolvePolicy
+
+IS, NS = 4, 8
+EXACT = SolvePolicy(exact={'MIPGap': 0})
+
+def long_distance_instance(seed):
+    # 生成的距离不超过3000，运输成本总低于缺货成本，没有被支配的弧；放大距离使部分弧被支配
+    CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+    return CF, U, H * 20, V, CP, CH, PU, CT, D, pr, demand
+
+@pytest.mark.parametrize('seed', range(3))
+def test_exact_pruning_keeps_the_optimum(tmp_path, monkeypatch, seed):
+    instance = long_distance_instance(seed)
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = instance
+    arcs, report = build_arc_set(IS, AS, CH, PU, CT, H, 'exact')
+    assert report['dominated'] > 0
+
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    full, pruned = (solver_model.two_stage_sp_model(IS, NS, '', str(tmp_path / 'result.xlsx'), True, str(tmp_path / 'app.log'), 1,
+                                                    AS, LS, Food_index, Medicine_index, arc_pruning=arc_pruning, formulation='lean', policy=EXACT)
+                    for arc_pruning in (None, 'exact'))
+    assert pruned[0] == pytest.approx(full[0], rel=1e-9)
+    assert np.array_equal(pruned[2], full[2])
+
+@pytest.mark.parametrize('seed', range(3))
+def test_exact_pruning_keeps_candidate_costs(seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = long_distance_instance(seed)
+    arcs, _ = build_arc_set(IS, AS, CH, PU, CT, H, 'exact')
+    rng = np.random.default_rng(seed)
+    y = np.rint(D.mean(axis=0) * rng.uniform(0, 2, size=(AS, IS)))
+    x = np.zeros((IS, LS))
+    x[np.arange(IS), rng.integers(LS, size=IS)] = 1
+    full = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, x, y)[:6]
+    pruned = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, x, y, arcs)[:6]
+    np.testing.assert_allclose(np.ravel(pruned), np.ravel(full), rtol=1e-9)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+L-shaped分解与扩展式模型的一致性测试：多割与单割两种方式的最优值应在MIPGap范围内与two_stage_sp_model的扩展式求解一致。
+需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import benders
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index
+
+IS, NS = 4, 8
+# Gurobi默认的相对MIPGap
+MIP_GAP = 1e-4
+
+def solve_exact(tmp_path, monkeypatch, **options):
+    instance = generate_instance(IS, NS, 1)
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    monkeypatch.setattr(benders, 'read_data_from_redis', lambda *args: instance)
+    return solver_model.two_stage_sp_model(IS, NS, '', str(tmp_path / 'result.xlsx'), True, str(tmp_path / 'app.log'), 1,
+                                           AS, LS, Food_index, Medicine_index, **options)[0]
+
+@pytest.mark.parametrize('cut_type', ['multi', 'single'])
+def test_benders_matches_extensive_form(tmp_path, monkeypatch, cut_type):
+    extensive = solve_exact(tmp_path, monkeypatch, formulation='lean')
+    decomposed = solve_exact(tmp_path, monkeypatch, method='benders', benders_cut_type=cut_type)
+    assert abs(decomposed - extensive) <= MIP_GAP * abs(extensive)
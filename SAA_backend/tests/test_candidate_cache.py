@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+候选解评估缓存的测试：两个缓存对象（例如两个并发的求解）先后写入同一文件时，双方的条目都应保留。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candidate_cache import CandidateCache
+
+def test_save_merges_entries_written_by_other_runs(tmp_path):
+    path = str(tmp_path / 'candidate_cache.json')
+    first, second = CandidateCache(path), CandidateCache(path)
+    first.put('a', [1] * 6)
+    second.put('b', [2] * 6)
+    first.save()
+    second.save()
+    assert set(CandidateCache(path).entries) == {'a', 'b'}
+
+    # 本进程的结果覆盖文件中的同键条目，并计为最近使用
+    first.put('b', [3] * 6)
+    first.save()
+    entries = CandidateCache(path).entries
+    assert list(entries) == ['a', 'b'] and entries['b'] == [3.0] * 6
+
+def test_save_keeps_the_entry_limit(tmp_path):
+    path = str(tmp_path / 'candidate_cache.json')
+    first, second = CandidateCache(path, max_entries=2), CandidateCache(path, max_entries=2)
+    first.put('a', [1] * 6)
+    first.save()
+    second.put('b', [2] * 6)
+    second.put('c', [3] * 6)
+    second.save()
+    assert list(CandidateCache(path).entries) == ['b', 'c']
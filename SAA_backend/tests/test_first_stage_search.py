@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+第一阶段启发式搜索的测试：返回的候选解满足Constraint (2)与(5)，RecourseScorer不因忽略供应点的库存上限而低估第二阶段成本，
+最好的候选解的精确期望成本接近样本组问题的最优值。需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS
+from first_stage_search import FirstStageSearch, RecourseScorer
+from recourse_evaluator import evaluate_candidate, solve_recourse
+from solve_policy import SolvePolicy
+
+IS, NS = 5, 20
+
+@pytest.mark.parametrize('seed', range(3))
+def test_candidates_satisfy_first_stage_constraints(seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, seed)
+    pool = FirstStageSearch(chains=2, iterations=1000, seed=seed).search(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr)
+    for candidate in pool:
+        x, y = candidate['x'], candidate['y']
+        assert np.array_equal(x, np.round(x)) and np.all((x == 0) | (x == 1))
+        assert np.array_equal(y, np.round(y)) and np.all(y >= 0)
+        # Constraint (5)与Constraint (2)
+        assert np.all(x.sum(axis=1) <= 1)
+        assert np.all(np.asarray(V) @ y <= x @ np.asarray(U) + 1e-6)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_scorer_does_not_underestimate_recourse(seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, seed)
+    scorer = RecourseScorer(IS, AS, CH, PU, CT, H, D, pr, rounds=None)
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        y = np.rint(D.mean(axis=0) * rng.uniform(0, 3, size=(AS, IS)))
+        y[:, rng.random(IS) < 0.4] = 0
+        costs = solve_recourse(IS, AS, NS, CH, PU, CT, H, D, y)
+        exact = float(pr @ (costs['tc'] + costs['hc'] + costs['wc']))
+        # 贪心分配得到的是可行的运输方案
+        assert sum(sum(scorer.resource_costs(a, y[a])) for a in range(AS)) >= exact * (1 - 1e-9)
+
+def test_best_candidate_is_close_to_the_replication_optimum(tmp_path):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, 3)
+    Vf, _, _, _, Vx, Vy, _ = solver_model.getsol(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, str(tmp_path / 'app.log'), 1,
+                                                  formulation='lean', policy=SolvePolicy(replication={'MIPGap': 0}))
+    optimum = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, np.round(Vx), np.round(Vy))[0]
+    best = FirstStageSearch().search(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr)[0]
+    assert evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, best['x'], best['y'])[0] <= optimum * 1.01
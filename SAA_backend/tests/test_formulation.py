@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+精简模型与原模型的一致性测试：formulation='lean'消去z、w与成本变量后，扩展式模型与getsol的最优值应与'standard'相同，
+x相同，y可能取不同的最优解，但在全部场景上的期望成本相同。需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index
+from recourse_evaluator import evaluate_candidate
+from solve_policy import SolvePolicy
+
+IS, NS = 4, 8
+EXACT = SolvePolicy(replication={'MIPGap': 0}, exact={'MIPGap': 0})
+
+def solve_exact(tmp_path, monkeypatch, instance, **options):
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    Vf, _, Vx, Vy = solver_model.two_stage_sp_model(IS, NS, '', str(tmp_path / 'result.xlsx'), True, str(tmp_path / 'app.log'), 1,
+                                                    AS, LS, Food_index, Medicine_index, policy=EXACT, **options)
+    return Vf, Vx, Vy.T
+
+def expected_cost(instance, Vx, Vy):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = instance
+    return evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, Vx, Vy)[0]
+
+@pytest.mark.parametrize('seed', range(3))
+def test_lean_matches_standard_extensive_form(tmp_path, monkeypatch, seed):
+    instance = generate_instance(IS, NS, seed)
+    standard = solve_exact(tmp_path, monkeypatch, instance, formulation='standard')
+    lean = solve_exact(tmp_path, monkeypatch, instance, formulation='lean')
+    assert lean[0] == pytest.approx(standard[0], rel=1e-9)
+    assert np.array_equal(lean[1], standard[1])
+    assert expected_cost(instance, *lean[1:]) == pytest.approx(expected_cost(instance, *standard[1:]), rel=1e-9)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_lean_matches_standard_replication(tmp_path, seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, seed)
+    results = [solver_model.getsol(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, str(tmp_path / 'app.log'), 1,
+                                   formulation=formulation, policy=EXACT) for formulation in ('standard', 'lean')]
+    (f_standard, *_, x_standard, _, _), (f_lean, *_, x_lean, _, _) = results
+    assert f_lean == pytest.approx(f_standard, rel=1e-9)
+    assert np.array_equal(np.round(x_lean), np.round(x_standard))
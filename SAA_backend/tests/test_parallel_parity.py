@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+并行求解与顺序求解的一致性测试。数据由benchmark.generate_instance生成，无需Redis；需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index, DATA_PROCESS_PARAMS
+
+CLUSTER_PARAMS = {'kmeans': {'n_clusters': 4, 'init': 'k-means++', 'random_state': 0}}
+GRAPH_CONFIG = {'3d': {'method': 'pca', 'params': {'pca': {'n_components': 3}}}}
+
+def run_solver(tmp_path, monkeypatch, seed=3, **options):
+    instance = generate_instance(5, 20, seed)
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    np.random.seed(seed)
+    options = {'formulation': 'lean', 'solve_policy': {'threads': 1, 'reproducible': True}, **options}
+    _, opt_f, _, _, Vx, Vy, _ = solver_model.solver(
+        'pca', 'kmeans', 'Stratified', '3d', 5, 20, 6, 4, '', '', '', str(tmp_path / 'result.xlsx'), 1.0, True,
+        str(tmp_path / 'app.log'), 2, AS, LS, Food_index, Medicine_index, DATA_PROCESS_PARAMS, CLUSTER_PARAMS, GRAPH_CONFIG, **options)
+    return opt_f, Vx, Vy
+
+def test_parallel_matches_sequential(tmp_path, monkeypatch):
+    sequential = run_solver(tmp_path, monkeypatch, evaluation_method='gurobi')
+    parallel = run_solver(tmp_path, monkeypatch, evaluation_method='gurobi', parallel_workers=2)
+    for expected, actual in zip(sequential, parallel):
+        assert np.array_equal(expected, actual)
+
+@pytest.mark.parametrize('options', [
+    {'gap_tolerance': 1.0},
+    {'warm_start': ['incumbent']},
+    {'solve_policy': {'adaptive_gap': True}},
+    {'sample_growth': {'growth': 2}},
+])
+def test_parallel_rejects_order_dependent_options(tmp_path, monkeypatch, options):
+    with pytest.raises(ValueError):
+        run_solver(tmp_path, monkeypatch, parallel_workers=2, **options)
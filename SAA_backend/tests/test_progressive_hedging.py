@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+渐进对冲的可行性与上下界测试：候选解满足Constraint (2)与(5)，拉格朗日下界不超过扩展式模型的最优值，
+候选解的期望成本不低于该最优值。需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index
+from progressive_hedging import ProgressiveHedgingSolver
+from solve_policy import SolvePolicy
+
+IS, NS = 4, 8
+# Gurobi默认的相对MIPGap
+MIP_GAP = 1e-4
+
+def test_progressive_hedging_bounds(tmp_path, monkeypatch):
+    instance = generate_instance(IS, NS, 1)
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = instance
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    optimum = solver_model.two_stage_sp_model(IS, NS, '', str(tmp_path / 'result.xlsx'), True, str(tmp_path / 'app.log'), 1,
+                                              AS, LS, Food_index, Medicine_index, formulation='lean')[0]
+
+    ph = ProgressiveHedgingSolver(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, str(tmp_path / 'app.log'), bundle_size=1,
+                                  policy=SolvePolicy(threads=1))
+    Vf, Vx, Vy = ph.solve()
+
+    assert np.all(Vx.sum(axis=1) <= 1)
+    assert np.all(np.asarray(V) @ Vy <= Vx @ np.asarray(U) + 1e-6)
+    assert ph.lower_bound <= optimum * (1 + MIP_GAP)
+    assert Vf >= optimum * (1 - MIP_GAP)
+    # 拉格朗日下界应随乘子改进，而不只是第0轮的wait-and-see下界
+    assert ph.lower_bound > ph.history[0][1]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+recourse_evaluator与renew的一致性测试：在随机算例与随机候选解上比较总成本及各成本分项。需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+from benchmark import generate_instance
+from config import AS, LS
+from recourse_evaluator import evaluate_candidate
+from solver_model import renew
+
+IS, NS = 5, 12
+
+def random_candidate(rng, D):
+    # 库存在平均需求附近随机取值，部分城市不设库存，使短缺、剩余与运输三类成本都会出现
+    y = np.rint(D.mean(axis=0) * rng.uniform(0, 2, size=(AS, IS)))
+    y[:, rng.random(IS) < 0.3] = 0
+    x = np.zeros((IS, LS))
+    x[np.arange(IS), rng.integers(LS, size=IS)] = 1
+    return x, y
+
+@pytest.mark.parametrize('seed', range(4))
+def test_evaluate_candidate_matches_renew(tmp_path, seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, seed)
+    x, y = random_candidate(np.random.default_rng(seed), D)
+    expected = renew(IS, AS, LS, NS, CF, U, V, H, CP, CH, PU, CT, D, pr, x, y, str(tmp_path / 'app.log'), 1, formulation='lean')
+    actual = evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, x, y)[:6]
+    # 依次为总成本与fc、pc、tc、hc、wc
+    np.testing.assert_allclose(np.ravel(actual), np.ravel(expected), rtol=1e-6, atol=1e-4)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+样本组筛选的测试：round_candidate的容量修复满足Constraint (2)与(5)，样本组按quality与relaxed的排序顺序，
+以及在评估场景子样本上的筛选。需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import replication_screening
+from benchmark import generate_instance
+from config import AS, LS
+from replication_screening import ReplicationScreening, round_candidate
+from saa_bounds import candidate_costs
+
+CF = np.array([100.0, 300.0, 500.0])
+U = np.array([10.0, 40.0, 100.0])
+V = np.array([1.0, 2.0])
+
+def test_round_candidate_picks_the_cheapest_sufficient_facility():
+    y_relaxed = np.array([[3.4, 0.2, 10.0, -1.0],
+                          [1.6, 0.3, 20.0, 0.0]])
+    new_x, new_y = round_candidate(np.full((4, 3), 0.5), y_relaxed, CF, U, V)
+    assert np.array_equal(new_y, [[3, 0, 10, 0], [2, 0, 20, 0]])
+    # 体积为7与50的城市分别选择容量10与100的设施，没有库存的城市不开放设施
+    assert np.array_equal(new_x, [[1, 0, 0], [0, 0, 0], [0, 0, 1], [0, 0, 0]])
+
+def test_round_candidate_scales_down_stock_above_the_largest_capacity():
+    y_relaxed = np.array([[60.0, 5.0],
+                          [45.0, 2.0]])
+    new_x, new_y = round_candidate(np.zeros((2, 3)), y_relaxed, CF, U, V)
+    assert np.array_equal(new_x[0], [0, 0, 1])
+    assert np.array_equal(new_y[:, 0], np.floor(y_relaxed[:, 0] * 100 / 150))
+    assert np.array_equal(new_y[:, 1], [5, 2])
+    assert np.all(new_x.sum(axis=1) <= 1)
+    assert np.all(V @ new_y <= new_x @ U)
+
+@pytest.mark.parametrize('rank, order', [('quality', [2, 0, 3, 1]), ('relaxed', [3, 2, 0, 1])])
+def test_ranking_order(rank, order):
+    screen = ReplicationScreening(top_k=2, rank=rank, stats_path=None)
+    # 样本组0与2的quality相同，按relaxed排序；样本组1的LP求解失败，排在最后
+    screen.relaxed = np.array([2.0, np.inf, 1.5, 1.0])
+    screen.quality = np.array([10.0, np.inf, 10.0, 12.0])
+    assert screen.ranking() == order[:2]
+    assert screen.order == order
+
+def test_quality_is_scored_on_a_subsample(tmp_path, monkeypatch):
+    IS, NS, MS = 4, 8, 4
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = generate_instance(IS, NS, 1)
+    rng = np.random.default_rng(1)
+    samples = [np.sort(rng.choice(NS, 4, replace=False)) for _ in range(MS)]
+    D_samples, pr_samples = [D[sample] for sample in samples], [np.full(4, 0.25)] * MS
+
+    screen = ReplicationScreening(top_k=2, stats_path=None, quality_scenarios=5)
+    D_score, pr_score = screen.scoring_scenarios(D, pr)
+    assert len(D_score) <= 5 and pr_score.sum() == pytest.approx(1)
+
+    # 记录每次评估使用的场景数量与候选解
+    calls = []
+    def recording_costs(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, new_x, new_y, arcs=None):
+        calls.append((NS, new_x.tobytes() + new_y.tobytes()))
+        return candidate_costs(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, new_x, new_y, arcs)
+    monkeypatch.setattr(replication_screening, 'candidate_costs', recording_costs)
+
+    selected = screen.screen(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D_samples, pr_samples, D, pr, str(tmp_path / 'app.log'),
+                             formulation='lean')
+    assert selected == screen.order[:2]
+    assert np.all(np.isfinite(screen.quality)) and np.all(np.diff(screen.quality[screen.order]) >= 0)
+    # 只在子样本上评估，取整后相同的候选解只评估一次
+    assert all(NS_score == len(D_score) for NS_score, _ in calls)
+    assert 1 <= len(calls) == len({key for _, key in calls}) <= MS
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+场景合并的一致性测试：合并需求相同的场景并累加概率后，扩展式模型、getsol的最优值与x，以及候选解的评估结果应与不合并时相同。
+需要Gurobi，规模在受限许可证的范围内。
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip('gurobipy')
+
+import solver_model
+from benchmark import generate_instance
+from config import AS, LS, Food_index, Medicine_index
+from recourse_evaluator import evaluate_candidate
+from scenario_compaction import compact_scenarios
+from solve_policy import SolvePolicy
+
+IS, NS = 4, 8
+EXACT = SolvePolicy(replication={'MIPGap': 0}, exact={'MIPGap': 0})
+
+def duplicated_instance(seed):
+    # 前5个场景之后重复其中的3个，合并后至多剩下5个场景
+    CF, U, H, V, CP, CH, PU, CT, D, pr, demand = generate_instance(IS, NS, seed)
+    D = np.concatenate([D[:5], D[[0, 2, 2]]])
+    return CF, U, H, V, CP, CH, PU, CT, D, pr, demand
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compaction_keeps_the_extensive_form_optimum(tmp_path, monkeypatch, seed):
+    instance = duplicated_instance(seed)
+    monkeypatch.setattr(solver_model, 'read_data_from_redis', lambda *args: instance)
+    full, compacted = (solver_model.two_stage_sp_model(IS, NS, '', str(tmp_path / 'result.xlsx'), True, str(tmp_path / 'app.log'), 1,
+                                                       AS, LS, Food_index, Medicine_index, scenario_compaction=scenario_compaction,
+                                                       formulation='lean', policy=EXACT)
+                       for scenario_compaction in (False, True))
+    assert compacted[0] == pytest.approx(full[0], rel=1e-9)
+    assert np.array_equal(compacted[2], full[2])
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compaction_keeps_replications_and_evaluation(tmp_path, seed):
+    CF, U, H, V, CP, CH, PU, CT, D, pr, _ = duplicated_instance(seed)
+    D_unique, pr_unique, _ = compact_scenarios(D, pr)
+    assert len(D_unique) <= 5 and pr_unique.sum() == pytest.approx(1)
+
+    full, compacted = (solver_model.getsol(IS, AS, LS, len(D_s), CF, U, V, H, CP, CH, PU, CT, D_s, pr_s, str(tmp_path / 'app.log'), 1,
+                                           formulation='lean', policy=EXACT) for D_s, pr_s in ((D, pr), (D_unique, pr_unique)))
+    assert compacted[0] == pytest.approx(full[0], rel=1e-9)
+    assert np.array_equal(np.round(compacted[4]), np.round(full[4]))
+
+    Vx, Vy = np.round(full[4]), np.round(full[5])
+    np.testing.assert_allclose(np.ravel(evaluate_candidate(IS, AS, LS, len(D_unique), CF, CP, CH, PU, CT, H, D_unique, pr_unique, Vx, Vy)[:6]),
+                               np.ravel(evaluate_candidate(IS, AS, LS, NS, CF, CP, CH, PU, CT, H, D, pr, Vx, Vy)[:6]), rtol=1e-9)
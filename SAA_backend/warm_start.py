@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+SAA_Solver
+==========
+
+This module is part of the SAA_Solver project and contains the implementation of Warm start.
+
+Author: cessarr
+Date Created: 2024-04-20
+License: MIT License
+
+Description:
+------------
+此部分为第一阶段变量x、y的初始解模块，初始解可来自期望值问题、同一次求解中之前的样本组以及历史求解结果
+"""
+import os
+import json
+import logging
+import numpy as np
+from gurobipy import GRB
+from plugins import dataset_fingerprint
+from model_builder import build_saa_form
+from env_pool import create_pooled_model
+
+# 可用的初始解来源
+WARM_START_SOURCES = ('ev', 'incumbent', 'store')
+
+def solve_expected_value(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, recourse_integrality='auto'):
+    """
+    求解期望值问题（将所有场景替换为一个平均需求场景），作为第一阶段变量的初始解。
+
+    参数:
+    IS, AS, LS: 城市、资源种类与存储位置的数量。
+    CF, U, V, H, CP, CH, PU, CT: 成本参数与距离矩阵。
+    D: 需求数据，形状为 (NS, AS, IS)。
+    pr: 场景概率。
+    log_filename: 日志文件名。
+    recourse_integrality: 第二阶段变量的整数性选项。
+
+    返回:
+    元组 (Vx, Vy, Vf)，求解失败时返回None。
+    """
+    D = np.asarray(D, dtype=float)
+    pr = np.asarray(pr, dtype=float)[:len(D)]
+    D_mean = np.rint(np.tensordot(pr / pr.sum(), D, axes=1))[None, :, :]
+
+    form = build_saa_form(IS, AS, LS, 1, CF, U, V, H, CP, CH, PU, CT, D_mean, np.ones(1), recourse_integrality=recourse_integrality)
+    handle = create_pooled_model(form, "expected_value", 'gurobi', log_filename, 'warm_start')
+    m = handle.model
+    try:
+        handle.optimize()
+        result = None
+        if m.SolCount > 0:
+            result = np.round(handle.values('x')), np.round(handle.values('y')), m.ObjVal
+    finally:
+        m.dispose()
+    return result
+
+class WarmStartStore:
+    """
+    功能: 以JSON文件保存历史求解得到的第一阶段解，按数据集指纹与问题规模区分，每个键只保留目标值最小的解。
+    方法:
+    get(fingerprint, IS, AS, LS): 读取已保存的解。
+    put(fingerprint, IS, AS, LS, Vx, Vy, objective): 保存一个解。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.records = json.load(file)
+
+    @staticmethod
+    def key(fingerprint, IS, AS, LS):
+        return f'{fingerprint}_{IS}_{AS}_{LS}'
+
+    def get(self, fingerprint, IS, AS, LS):
+        record = self.records.get(self.key(fingerprint, IS, AS, LS))
+        if record is None:
+            return None
+        return np.array(record['x']), np.array(record['y']), record['objective']
+
+    def put(self, fingerprint, IS, AS, LS, Vx, Vy, objective):
+        key = self.key(fingerprint, IS, AS, LS)
+        record = self.records.get(key)
+        if record is not None and record['objective'] <= objective:
+            return
+        self.records[key] = {
+            'x': np.asarray(Vx, dtype=float).tolist(),
+            'y': np.asarray(Vy, dtype=float).tolist(),
+            'objective': float(objective),
+        }
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(self.records, file)
+
+class IncumbentTimer:
+    """
+    功能: Gurobi回调，记录找到第一个可行解的时间。
+    """
+    def __init__(self):
+        self.first_incumbent = None
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.MIPSOL and self.first_incumbent is None:
+            self.first_incumbent = model.cbGet(GRB.Callback.RUNTIME)
+
+class WarmStartEngine:
+    """
+    功能: 汇总各来源的初始解并写入getsol模型，同时记录每次求解找到第一个可行解的时间与总求解时间。
+    方法:
+    starts(): 当前可用的初始解列表。
+    apply(handle): 将初始解写入模型。
+    record(Vx, Vy, objective, timer, runtime): 记录一次样本组求解的结果。
+    save(Vx, Vy, objective): 将最终解保存到历史记录。
+    """
+    def __init__(self, sources, IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename,
+                 store_path='warm_start.json', recourse_integrality='auto'):
+        for source in sources:
+            if source not in WARM_START_SOURCES:
+                raise ValueError(f'未知的初始解来源: {source}')
+        self.sources = tuple(sources)
+        self.IS, self.AS, self.LS = IS, AS, LS
+        self.fingerprint = dataset_fingerprint(CF, U, V, H, CP, CH, PU, CT, D)
+        self.fixed = {}
+        self.incumbent = None
+        self.stats = []
+
+        if 'ev' in self.sources:
+            print('solving expected value problem ...\n')
+            result = solve_expected_value(IS, AS, LS, CF, U, V, H, CP, CH, PU, CT, D, pr, log_filename, recourse_integrality)
+            if result is not None:
+                self.fixed['ev'] = result[:2]
+
+        self.store = None
+        if 'store' in self.sources and store_path:
+            self.store = WarmStartStore(store_path)
+            result = self.store.get(self.fingerprint, IS, AS, LS)
+            if result is not None:
+                self.fixed['store'] = result[:2]
+
+    def starts(self):
+        starts = [{'x': Vx, 'y': Vy} for Vx, Vy in self.fixed.values()]
+        if 'incumbent' in self.sources and self.incumbent is not None:
+            starts.append({'x': self.incumbent[0], 'y': self.incumbent[1]})
+        return starts
+
+    def apply(self, handle):
+        handle.set_starts(self.starts())
+
+    def record(self, Vx, Vy, objective, timer, runtime):
+        if self.incumbent is None or objective < self.incumbent[2]:
+            self.incumbent = (np.round(Vx), np.round(Vy), objective)
+        self.stats.append((timer.first_incumbent, runtime))
+        logging.info(f"Warm start ({', '.join(self.sources)}): first incumbent {timer.first_incumbent} s, solve time {runtime} s")
+
+    def save(self, Vx, Vy, objective):
+        if self.store is not None:
+            self.store.put(self.fingerprint, self.IS, self.AS, self.LS, Vx, Vy, objective)